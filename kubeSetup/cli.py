@@ -11,6 +11,9 @@ def cli() -> None:
 cli.add_command(simple_cluster_setup)
 cli.add_command(complex_cluster_setup)
 cli.add_command(cluster_cleanup)
+cli.add_command(build_image)
+cli.add_command(add_nodes)
+cli.add_command(remove_nodes)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,15 @@
 from ._simpleCluster import simple_cluster_setup
 from ._complexCluster import complex_cluster_setup
 from ._cluster_cleanup import cluster_cleanup
+from ._build_image import build_image
+from ._add_nodes import add_nodes
+from ._remove_nodes import remove_nodes
 
-__all__ = ["simple_cluster_setup", "complex_cluster_setup", "cluster_cleanup"]
+__all__ = [
+    "simple_cluster_setup",
+    "complex_cluster_setup",
+    "cluster_cleanup",
+    "build_image",
+    "add_nodes",
+    "remove_nodes",
+]
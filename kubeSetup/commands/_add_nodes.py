@@ -0,0 +1,188 @@
+import click
+from typing import Optional
+from contextlib import nullcontext
+from .utils import (
+    parse_proxmox_config_file,
+    parse_simple_vm_config_file,
+    SimpleVmConf,
+    VmType,
+    ProxmoxCommands,
+    PreconfigureCluster,
+    ProxmoxConnection,
+    ClusterSetup,
+    setup_logger,
+    SSHConnectionPool,
+    ExecutionPlan,
+    DryRun,
+)
+
+
+@click.command()
+@click.option(
+    "--proxmox-config",
+    required=True,
+    type=click.Path(exists=True),
+    callback=parse_proxmox_config_file,
+    help="Path to the configuration file for the proxmox cluster.",
+)
+@click.option(
+    "--vm-config",
+    required=True,
+    type=click.Path(exists=True),
+    callback=parse_simple_vm_config_file,
+    help="Path to the configuration file of the cluster, which contains the new vms too.",
+)
+@click.option(
+    "--nodes",
+    required=True,
+    type=click.STRING,
+    help="Comma separated vm_names of the new workers in the config.",
+)
+@click.option(
+    "--kube-version",
+    required=False,
+    type=click.STRING,
+    default="1.30",
+    help="Kubernetes version of the running cluster.",
+)
+@click.option(
+    "--golden-image/--no-golden-image",
+    default=True,
+    help="Clone from the golden image of the kubernetes version, if one was built with build-image.",
+)
+@click.option(
+    "--max-parallel",
+    required=False,
+    type=click.IntRange(min=1),
+    default=10,
+    help="Number of vms, which are preconfigured and joined at the same time.",
+)
+@click.option(
+    "--bundle-scripts",
+    is_flag=True,
+    default=False,
+    help="Run every preconfiguration phase as one remote script instead of one command after another.",
+)
+@click.option(
+    "--apt-cache",
+    required=False,
+    type=click.STRING,
+    default=None,
+    help="vm_name of a vm of the cluster, which hosts an apt cache, or the address of a running apt-cacher-ng.",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Run against an in-process fake of proxmox and the vms and print the timed execution plan.",
+)
+def add_nodes(
+    proxmox_config: ProxmoxConnection,
+    vm_config: list[SimpleVmConf],
+    nodes: str,
+    kube_version: str,
+    golden_image: bool,
+    max_parallel: int,
+    bundle_scripts: bool,
+    apt_cache: Optional[str],
+    dry_run: bool,
+) -> None:
+    """
+    Command, which adds workers to a running simple kubernetes cluster. Only the new vms are cloned
+    and preconfigured, afterward they join with a new join command of the master at the same time.
+    """
+    names = [name.strip() for name in nodes.split(",") if name.strip()]
+    new_vms = [vm for vm in vm_config if vm.vm_name in names]
+    unknown = sorted(set(names) - {vm.vm_name for vm in new_vms})
+    if unknown:
+        raise click.UsageError(
+            f"The nodes {', '.join(unknown)} are not in the vm config!"
+        )
+    if any(vm.vm_type != VmType.WORKER for vm in new_vms):
+        raise click.UsageError("Only workers can be added to a running cluster!")
+    master_vm = next((vm for vm in vm_config if vm.vm_type == VmType.MASTER), None)
+    if master_vm is None:
+        raise click.UsageError("The vm config must contain the master of the cluster!")
+
+    # the apt cache runs on a vm of the cluster, which is not set up again
+    cache_vm = next((vm for vm in vm_config if vm.vm_name == apt_cache), None)
+    if cache_vm is not None and cache_vm not in new_vms:
+        apt_cache = cache_vm.ip_address
+
+    # setup logger
+    logger = setup_logger(name="AddNodes")
+
+    # phases of the run, a dry run also plans every api call and remote command
+    plan = ExecutionPlan(logger=logger)
+    dry = (
+        DryRun(proxmox_conf=proxmox_config, vm_infos=new_vms, plan=plan)
+        if dry_run
+        else None
+    )
+
+    with dry.simulate() if dry else nullcontext():
+        # setup SSH connection pool manager
+        ssh_pool_manager = dry.ssh_pool() if dry else SSHConnectionPool(logger=logger)
+
+        # only the new vms are preconfigured
+        preconf = PreconfigureCluster(
+            vm_infos=new_vms,
+            logger=logger,
+            kube_version=kube_version,
+            max_parallel=max_parallel,
+            bundle_scripts=bundle_scripts,
+            apt_cache=apt_cache,
+        )
+
+        # all proxmox calls for cloning from a template
+        proxmox = ProxmoxCommands(
+            proxmox_conf=proxmox_config,
+            logger=logger,
+            api=dry.api if dry else None,
+            ssh_check=dry.ssh_reachable if dry else None,
+        )
+
+        with plan.phase("preflight"):
+            uses_image = golden_image and proxmox.use_golden_image(
+                kube_version=kube_version
+            )
+            proxmox.preflight(
+                vm_infos=new_vms,
+                address_check=dry.address_in_use if dry else None,
+            )
+
+        with plan.phase("placement"):
+            proxmox.place_vms(vm_infos=new_vms)
+
+        with plan.phase("clone"):
+            proxmox.clone_vm(vm_infos=new_vms)
+        with plan.phase("boot"):
+            proxmox.make_required_restarts(
+                vm_infos=new_vms, ssh_pool_manager=ssh_pool_manager
+            )
+        proxmox.log_api_stats()
+
+        with plan.phase("preconfigure"):
+            if uses_image:
+                preconf.preconfigured_by_image(ssh_pool_manager=ssh_pool_manager)
+            else:
+                preconf.preconfigure_vms(ssh_pool_manager=ssh_pool_manager)
+
+        # join the new workers with a new join command of the running master
+        with plan.phase("join"):
+            ClusterSetup.join_nodes(
+                master_vm=master_vm,
+                vms=new_vms,
+                logger=logger,
+                ssh_pool_manager=ssh_pool_manager,
+                max_parallel=max_parallel,
+            )
+
+        # close all connections
+        ssh_pool_manager.close_all_connections()
+
+    plan.report(detailed=dry_run)
+
+
+if __name__ == "__main__":
+    add_nodes()
@@ -0,0 +1,83 @@
+import click
+from .utils import (
+    parse_proxmox_config_file,
+    parse_build_vm_config_file,
+    SimpleVmConf,
+    ProxmoxCommands,
+    PreconfigureCluster,
+    ProxmoxConnection,
+    setup_logger,
+    SSHConnectionPool,
+    generalize_vm,
+)
+
+
+@click.command()
+@click.option(
+    "--proxmox-config",
+    required=True,
+    type=click.Path(exists=True),
+    callback=parse_proxmox_config_file,
+    help="Path to the configuration file for the proxmox cluster.",
+)
+@click.option(
+    "--vm-config",
+    required=True,
+    type=click.Path(exists=True),
+    callback=parse_build_vm_config_file,
+    help="Path to the configuration file for the vm, which is used to build the image.",
+)
+@click.option(
+    "--kube-version",
+    required=False,
+    type=click.STRING,
+    default="1.30",
+    help="Kubernetes version, which will be installed in the image.",
+)
+def build_image(
+    proxmox_config: ProxmoxConnection, vm_config: SimpleVmConf, kube_version: str
+) -> None:
+    """
+    Command, which builds a golden image for a kubernetes version. The template from the proxmox config
+    is cloned, preconfigured once and converted into a versioned template. Later cluster setups with the
+    same kubernetes version pick that image automatically and skip the preconfiguration.
+    """
+    # setup logger
+    logger = setup_logger(name="BuildImage")
+
+    # setup SSH connection pool manager
+    ssh_pool_manager = SSHConnectionPool(logger=logger)
+
+    # clone the build vm from the base template
+    proxmox = ProxmoxCommands(proxmox_conf=proxmox_config, logger=logger)
+    proxmox.preflight(vm_infos=[vm_config])
+    proxmox.place_vms(vm_infos=[vm_config])
+    proxmox.clone_vm(vm_infos=[vm_config])
+    proxmox.make_required_restarts(
+        vm_infos=[vm_config], ssh_pool_manager=ssh_pool_manager
+    )
+
+    # preconfigure the build vm
+    preconf = PreconfigureCluster(
+        vm_infos=[vm_config], logger=logger, kube_version=kube_version
+    )
+    _, ssh_pool_manager = preconf.preconfigure_vms(ssh_pool_manager=ssh_pool_manager)
+
+    # reset the identity of the vm, so every clone is a new instance
+    generalize_vm(
+        client=ssh_pool_manager.get_connection(ip_address=vm_config.ip_address),
+        logger=logger,
+    )
+    ssh_pool_manager.close_all_connections()
+
+    # convert the vm into the golden image
+    proxmox.convert_to_golden_image(
+        vm=vm_config,
+        kube_version=kube_version,
+        base_template_id=proxmox_config.template_id,
+    )
+    proxmox.log_api_stats()
+
+
+if __name__ == "__main__":
+    build_image()
@@ -1,4 +1,5 @@
 import click
+from typing import Optional
 from .utils import (
     parse_proxmox_config_file,
     parse_config_file,
@@ -19,22 +20,50 @@ from .utils import (
 )
 @click.option(
     "--vm-config",
-    required=True,
+    required=False,
     type=click.Path(exists=True),
     callback=parse_config_file,
     help="Path to the configuration file for the cleanup.",
 )
-def cluster_cleanup(proxmox_config: ProxmoxConnection, vm_config: list[VmConf]) -> None:
+@click.option(
+    "--tags",
+    required=False,
+    type=click.STRING,
+    default=None,
+    help="Comma separated tags, all vms carrying every one of them will be removed.",
+)
+@click.option(
+    "--hard-stop",
+    is_flag=True,
+    default=False,
+    help="Stop the vms immediately instead of shutting them down.",
+)
+def cluster_cleanup(
+    proxmox_config: ProxmoxConnection,
+    vm_config: list[VmConf],
+    tags: Optional[str],
+    hard_stop: bool,
+) -> None:
     """
     Command, which cleans up the vms from the previous cluster setup. So all vms will be removed
-    from the proxmox cluster.
+    from the proxmox cluster. The vms are either taken from the config file or found by their tags.
     """
+    if not vm_config and not tags:
+        raise click.UsageError("Either --vm-config or --tags must be specified!")
+
     # setup logger
     logger = setup_logger(name="Cluster - cleanup")
 
     # setup connection to proxmox and cleanup
     proxmox = ProxmoxCommands(proxmox_conf=proxmox_config, logger=logger)
-    proxmox.cleanup_vm(vm_infos=vm_config)
+    if tags:
+        vm_config = vm_config + [
+            vm
+            for vm in proxmox.discover_vms(tags=tags.split(","))
+            if vm.vm_id not in {conf.vm_id for conf in vm_config}
+        ]
+    proxmox.cleanup_vm(vm_infos=vm_config, hard_stop=hard_stop)
+    proxmox.log_api_stats()
 
 
 if __name__ == "__main__":
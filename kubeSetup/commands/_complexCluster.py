@@ -9,11 +9,12 @@ from .utils import (
     HAProxySetup,
     ProxmoxConnection,
     PreconfigureCluster,
-    ClusterSetup,
+    ClusterBuild,
     ClusterType,
     VmType,
     setup_logger,
     SSHConnectionPool,
+    BuildState,
 )
 
 
@@ -39,10 +40,33 @@ from .utils import (
     default="1.32",
     help="Kubernetes version, which will be used for the cluster setup.",
 )
+@click.option(
+    "--state-file",
+    required=False,
+    type=click.Path(dir_okay=False),
+    default="kube-setup-state.json",
+    help="Path to the file, which records the phases every vm finished.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Continue the build of the state file, every vm skips the phases it already finished.",
+)
+@click.option(
+    "--max-parallel",
+    required=False,
+    type=click.IntRange(min=1),
+    default=10,
+    help="Number of vms, which are preconfigured at the same time.",
+)
 def complex_cluster_setup(
     proxmox_config: ProxmoxConnection,
     vm_config: list[ComplexVmConf],
     kube_version: str = "1.32",
+    state_file: str = "kube-setup-state.json",
+    resume: bool = False,
+    max_parallel: int = 10,
 ) -> None:
     """
     Command, which sets up a complex HA kubernetes cluster, which can be seen in the image below.
@@ -53,46 +77,47 @@ def complex_cluster_setup(
     logger = setup_logger(name="ComplexClusterSetup")
 
     # setup SSH connection pool manager
-    ssh_pool_manager = SSHConnectionPool()
+    ssh_pool_manager = SSHConnectionPool(logger=logger)
+
+    # the phases every vm finished
+    state = BuildState(path=state_file, logger=logger, resume=resume)
+    state.restore(vm_infos=vm_config)
 
     # proxmox = ProxmoxCommands(proxmox_conf=proxmox_config, logger=logger)
     # # proxmox.clone_vm(vm_infos=vm_config)  # type: ignore
     # proxmox.make_required_restarts(vm_infos=vm_config)  # type: ignore
-    #
-    # # set up keepalived and haproxy for HA
-    # keepalived = KeepaLivedSetup(vm_infos=vm_config, logger=logger)
-    # ssh_pool_manager = keepalived.configure_keepalived(
-    #     ssh_pool_manager=ssh_pool_manager
-    # )
-    #
-    # haproxy = HAProxySetup(vm_infos=vm_config, logger=logger)
-    # ssh_pool_manager = haproxy.configure_haproxy(ssh_pool_manager=ssh_pool_manager)
-    #
-    # # close connections to load balancer
-    # ssh_pool_manager.close_connections(
-    #     ip_addresses=[
-    #         vm.ip_address for vm in vm_config if vm.vm_type == VmType.LOADBALANCER
-    #     ]
-    # )
 
     # preconfigure the cluster
     preconf = PreconfigureCluster(
-        vm_infos=vm_config, logger=logger, kube_version=kube_version  # type: ignore
+        vm_infos=vm_config,  # type: ignore
+        logger=logger,
+        kube_version=kube_version,
+        state=state,
+        max_parallel=max_parallel,
     )
-    grouped_vms, ssh_pool_manager = preconf.preconfigure_vms(
-        ssh_pool_manager=ssh_pool_manager
+
+    # the load balancers are set up, while the other vms are preconfigured
+    build = ClusterBuild(
+        vm_infos=vm_config,
+        preconf=preconf,
+        logger=logger,
+        ssh_pool_manager=ssh_pool_manager,
+        state=state,
+        max_parallel=max_parallel,
     )
+    build.load_balancers(vm_infos=vm_config)
+    build.preconfigure()
 
     # set up the cluster in HA Mode with stacked ectd
-    ClusterSetup.setup_cluster(
-        group_vms=grouped_vms,
+    build.setup_cluster(
         cluster_type=ClusterType.COMPLEX,
-        control_plane_endpoint=grouped_vms[VmType.LOADBALANCER.value][  # type: ignore
-            0
-        ].virtual_ip_address,
-        logger=logger,
-        ssh_pool_manager=ssh_pool_manager,
+        control_plane_endpoint=next(
+            vm.virtual_ip_address
+            for vm in vm_config
+            if vm.vm_type == VmType.LOADBALANCER
+        ),
     )
+    build.run()
 
     # close all connections
     ssh_pool_manager.close_all_connections()
@@ -0,0 +1,104 @@
+import click
+from .utils import (
+    parse_proxmox_config_file,
+    parse_simple_vm_config_file,
+    SimpleVmConf,
+    VmType,
+    ProxmoxCommands,
+    ProxmoxConnection,
+    ClusterSetup,
+    setup_logger,
+    SSHConnectionPool,
+)
+
+
+@click.command()
+@click.option(
+    "--proxmox-config",
+    required=True,
+    type=click.Path(exists=True),
+    callback=parse_proxmox_config_file,
+    help="Path to the configuration file for the proxmox cluster.",
+)
+@click.option(
+    "--vm-config",
+    required=True,
+    type=click.Path(exists=True),
+    callback=parse_simple_vm_config_file,
+    help="Path to the configuration file of the cluster.",
+)
+@click.option(
+    "--nodes",
+    required=True,
+    type=click.STRING,
+    help="Comma separated vm_names of the workers, which are removed.",
+)
+@click.option(
+    "--max-parallel",
+    required=False,
+    type=click.IntRange(min=1),
+    default=3,
+    help="Number of workers, which are drained at the same time.",
+)
+@click.option(
+    "--drain-timeout",
+    required=False,
+    type=click.IntRange(min=1),
+    default=300,
+    help="Seconds, a worker may take to drain, before its removal fails.",
+)
+def remove_nodes(
+    proxmox_config: ProxmoxConnection,
+    vm_config: list[SimpleVmConf],
+    nodes: str,
+    max_parallel: int,
+    drain_timeout: int,
+) -> None:
+    """
+    Command, which removes workers from a running simple kubernetes cluster. The workers are cordoned,
+    drained and deleted from the cluster, afterward their vms are removed from the proxmox cluster.
+    """
+    names = [name.strip() for name in nodes.split(",") if name.strip()]
+    vms = [vm for vm in vm_config if vm.vm_name in names]
+    unknown = sorted(set(names) - {vm.vm_name for vm in vms})
+    if unknown:
+        raise click.UsageError(
+            f"The nodes {', '.join(unknown)} are not in the vm config!"
+        )
+    if any(vm.vm_type != VmType.WORKER for vm in vms):
+        raise click.UsageError("Only workers can be removed from a running cluster!")
+    master_vm = next((vm for vm in vm_config if vm.vm_type == VmType.MASTER), None)
+    if master_vm is None:
+        raise click.UsageError("The vm config must contain the master of the cluster!")
+
+    # setup logger
+    logger = setup_logger(name="RemoveNodes")
+
+    # setup SSH connection pool manager
+    ssh_pool_manager = SSHConnectionPool(logger=logger)
+
+    # move the workloads away and delete the nodes from the cluster
+    removed = ClusterSetup.remove_nodes(
+        master_vm=master_vm,
+        vms=vms,
+        logger=logger,
+        ssh_pool_manager=ssh_pool_manager,
+        max_parallel=max_parallel,
+        drain_timeout=drain_timeout,
+    )
+    ssh_pool_manager.close_all_connections()
+
+    # only the vms of the removed nodes are deleted
+    proxmox = ProxmoxCommands(proxmox_conf=proxmox_config, logger=logger)
+    proxmox.cleanup_vm(vm_infos=proxmox.locate_vms(vm_infos=removed))
+    proxmox.log_api_stats()
+
+    kept = [vm.vm_name for vm in vms if vm not in removed]
+    if kept:
+        raise click.ClickException(
+            f"The nodes {', '.join(kept)} could not be drained and stay in the cluster!"
+        )
+
+
+if __name__ == "__main__":
+    remove_nodes()
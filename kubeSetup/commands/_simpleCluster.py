@@ -1,4 +1,6 @@
 import click
+from typing import Optional
+from contextlib import nullcontext
 from .utils import (
     parse_proxmox_config_file,
     parse_simple_vm_config_file,
@@ -6,10 +8,16 @@ from .utils import (
     ProxmoxCommands,
     PreconfigureCluster,
     ProxmoxConnection,
-    ClusterSetup,
     ClusterType,
+    ImageDistribution,
     setup_logger,
     SSHConnectionPool,
+    CloudInitSnippets,
+    ExecutionPlan,
+    DryRun,
+    BuildState,
+    BuildPhase,
+    ClusterBuild,
 )
 
 
@@ -35,42 +43,203 @@ from .utils import (
     default="1.30",
     help="Kubernetes version, which will be used for the cluster setup.",
 )
+@click.option(
+    "--provisioning",
+    required=False,
+    type=click.Choice(["ssh", "cloud-init"]),
+    default="ssh",
+    help="Preconfigure the vms via SSH after the boot or via a cloud-init snippet during the first boot.",
+)
+@click.option(
+    "--golden-image/--no-golden-image",
+    default=True,
+    help="Clone from the golden image of the kubernetes version, if one was built with build-image.",
+)
+@click.option(
+    "--max-parallel",
+    required=False,
+    type=click.IntRange(min=1),
+    default=10,
+    help="Number of vms, which are preconfigured at the same time.",
+)
+@click.option(
+    "--bundle-scripts",
+    is_flag=True,
+    default=False,
+    help="Run every preconfiguration phase as one remote script instead of one command after another.",
+)
+@click.option(
+    "--apt-cache",
+    required=False,
+    type=click.STRING,
+    default=None,
+    help="vm_name of a vm, which hosts an apt cache for all vms, or the address of a running apt-cacher-ng.",
+)
+@click.option(
+    "--distribute-images",
+    is_flag=True,
+    default=False,
+    help="Pull the container images once and pass them from vm to vm instead of pulling them on every vm.",
+)
+@click.option(
+    "--state-file",
+    required=False,
+    type=click.Path(dir_okay=False),
+    default="kube-setup-state.json",
+    help="Path to the file, which records the phases every vm finished.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Continue the build of the state file, every vm skips the phases it already finished.",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Run against an in-process fake of proxmox and the vms and print the timed execution plan.",
+)
 def simple_cluster_setup(
-    proxmox_config: ProxmoxConnection, vm_config: list[SimpleVmConf], kube_version: str
+    proxmox_config: ProxmoxConnection,
+    vm_config: list[SimpleVmConf],
+    kube_version: str,
+    provisioning: str,
+    golden_image: bool,
+    max_parallel: int,
+    bundle_scripts: bool,
+    apt_cache: Optional[str],
+    distribute_images: bool,
+    state_file: str,
+    resume: bool,
+    dry_run: bool,
 ) -> None:
     """
     Command, which sets up a simple kubernetes cluster, which can be seen in the image below.
     With the config, you can set the number of workers, cpu, ram and storage specs and the ip addresses.
     """
+    if provisioning == "cloud-init" and not (
+        proxmox_config.node_user and proxmox_config.node_ssh_key
+    ):
+        raise click.UsageError(
+            "For the cloud-init provisioning node_user and node_ssh_key must be set in the proxmox config!"
+        )
+
     # setup logger
     logger = setup_logger(name="SimpleClusterSetup")
 
-    # setup SSH connection pool manager
-    ssh_pool_manager = SSHConnectionPool()
-
-    # all proxmox calls for cloning from a template
-    proxmox = ProxmoxCommands(proxmox_conf=proxmox_config, logger=logger)
-    proxmox.clone_vm(vm_infos=vm_config)
-    proxmox.make_required_restarts(vm_infos=vm_config)
-
-    # preconfigure the cluster
-    preconf = PreconfigureCluster(
-        vm_infos=vm_config, logger=logger, kube_version=kube_version
-    )
-    grouped_vms, ssh_pool_manager = preconf.preconfigure_vms(
-        ssh_pool_manager=ssh_pool_manager
+    # phases of the run, a dry run also plans every api call and remote command
+    plan = ExecutionPlan(logger=logger)
+    dry = (
+        DryRun(proxmox_conf=proxmox_config, vm_infos=vm_config, plan=plan)
+        if dry_run
+        else None
     )
 
-    # set up the simple cluster
-    ClusterSetup.setup_cluster(
-        group_vms=grouped_vms,
-        cluster_type=ClusterType.SIMPLE,
+    # the phases every vm finished, a dry run keeps them in memory only
+    state = BuildState(
+        path=None if dry_run else state_file,
         logger=logger,
-        ssh_pool_manager=ssh_pool_manager,
+        resume=resume and not dry_run,
     )
+    state.restore(vm_infos=vm_config)
+
+    with dry.simulate() if dry else nullcontext():
+        # setup SSH connection pool manager
+        ssh_pool_manager = dry.ssh_pool() if dry else SSHConnectionPool(logger=logger)
+
+        # preconfigure the cluster
+        preconf = PreconfigureCluster(
+            vm_infos=vm_config,
+            logger=logger,
+            kube_version=kube_version,
+            max_parallel=max_parallel,
+            bundle_scripts=bundle_scripts,
+            apt_cache=apt_cache,
+            pull_images=not distribute_images,
+            state=state,
+        )
+
+        # all proxmox calls for cloning from a template
+        proxmox = ProxmoxCommands(
+            proxmox_conf=proxmox_config,
+            logger=logger,
+            api=dry.api if dry else None,
+            ssh_check=dry.ssh_reachable if dry else None,
+            state=state,
+        )
+
+        with plan.phase("preflight"):
+            uses_image = golden_image and proxmox.use_golden_image(
+                kube_version=kube_version
+            )
+
+            # check the whole config against the cluster and the network before any clone,
+            # the vms of a resumed build, which are already cloned, exist and answer
+            proxmox.preflight(
+                vm_infos=state.pending(vm_infos=vm_config, phase=BuildPhase.CLONE),
+                address_check=dry.address_in_use if dry else None,
+            )
+
+        with plan.phase("placement"):
+            # vms without a target name are placed on the nodes with the most fitting headroom
+            proxmox.place_vms(vm_infos=vm_config)
+
+        # every vm runs through its tasks on its own, without waiting for the other vms
+        build = ClusterBuild(
+            vm_infos=vm_config,
+            preconf=preconf,
+            logger=logger,
+            ssh_pool_manager=ssh_pool_manager,
+            state=state,
+            plan=plan,
+            max_parallel=max_parallel,
+        )
+        cicustom = None
+        if provisioning == "cloud-init" and not uses_image:
+            # the vms configure themselves during the first boot, no restarts are required
+            with plan.phase("snippets"):
+                snippets = CloudInitSnippets(
+                    kube_version=kube_version,
+                    snippets_storage=proxmox_config.snippets_storage,
+                    snippets_dir=proxmox.snippets_dir(
+                        storage=proxmox_config.snippets_storage
+                    ),
+                    logger=logger,
+                )
+                cicustom = snippets.upload(
+                    vm_infos=vm_config,
+                    node_addresses=proxmox.node_addresses(),
+                    node_user=proxmox_config.node_user,  # type: ignore
+                    node_ssh_key=proxmox_config.node_ssh_key,  # type: ignore
+                    ssh_pool_manager=ssh_pool_manager,
+                )
+        build.clone(proxmox=proxmox, cicustom=cicustom, first_boot=cicustom is not None)
+
+        # the golden image is already preconfigured
+        build.preconfigure(provisioning="image" if uses_image else provisioning)
+
+        if distribute_images:
+            # the registry is hit once, the vms pass the images on to each other
+            build.distribute_images(
+                distribution=ImageDistribution(
+                    vm_infos=vm_config,
+                    logger=logger,
+                    cluster_type=ClusterType.SIMPLE,
+                    max_parallel=max_parallel,
+                )
+            )
+
+        # set up the simple cluster
+        build.setup_cluster(cluster_type=ClusterType.SIMPLE)
+        with plan.phase("build"):
+            build.run()
+        proxmox.log_api_stats()
+
+        # close all connections
+        ssh_pool_manager.close_all_connections()
 
-    # close all connections
-    ssh_pool_manager.close_all_connections()
+    plan.report(detailed=dry_run)
 
 
 if __name__ == "__main__":
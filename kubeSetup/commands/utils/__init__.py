@@ -18,10 +18,20 @@ __all__ = [
     "ProxmoxConnection",
     "ClusterSetup",
     "ClusterType",
+    "ImageDistribution",
     "setup_logger",
     "SSHConnectionPool",
     "VmConf",
     "parse_config_file",
+    "CloudInitSnippets",
+    "parse_build_vm_config_file",
+    "generalize_vm",
+    "ExecutionPlan",
+    "DryRun",
+    "BuildState",
+    "BuildPhase",
+    "TaskGraph",
+    "ClusterBuild",
 ]
 
 from ._setup import (
@@ -34,11 +44,15 @@ from ._setup import (
     NodeType,
     VmConf,
     parse_config_file,
+    parse_build_vm_config_file,
 )
 from ._proxmox import ProxmoxCommands
 from ._setup import ProxmoxConnection
-from ._clusterSetup import ClusterSetup, ClusterType
+from ._clusterSetup import ClusterSetup, ClusterType, ImageDistribution
 from ._complexCluster import KeepaLivedSetup, HAProxySetup
+from ._cloudInit import CloudInitSnippets
+from ._dryRun import ExecutionPlan, DryRun
+from ._checkpoint import BuildState, BuildPhase
 from ._setupUtils import (
     execute_command,
     execute_commands,
@@ -48,4 +62,6 @@ from ._setupUtils import (
     PreconfigureCluster,
     setup_logger,
     SSHConnectionPool,
+    generalize_vm,
 )
+from ._orchestration import TaskGraph, ClusterBuild
@@ -0,0 +1,5 @@
+__all__ = ["BuildState", "BuildPhase"]
+
+
+from ._state import BuildState
+from ._schemas import BuildPhase
@@ -0,0 +1,11 @@
+from enum import Enum
+
+
+class BuildPhase(Enum):
+    """The phases of a vm in the order, in which a cluster build runs them."""
+
+    CLONE = "clone"
+    CONFIG = "config"
+    RESTART = "restart"
+    PRECONFIGURE = "preconfigure"
+    JOIN = "join"
@@ -0,0 +1,147 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Sequence, TypeVar
+from ._schemas import BuildPhase
+from .._setup import SimpleVmConf, ComplexVmConf
+
+VmT = TypeVar("VmT", SimpleVmConf, ComplexVmConf)
+
+STATE_VERSION = 1
+
+
+class BuildState:
+    """
+    Records in a local json file, which phases every vm finished. A resumed build skips the
+    finished phases of every vm, so only the vms, which failed or never got there, run them again.
+    Without a path the state is only kept in memory.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        logger: Optional[logging.Logger] = None,
+        resume: bool = False,
+    ) -> None:
+        self.path = path
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._vms: dict[str, dict[str, Any]] = {}
+
+        if resume and path and os.path.exists(path):
+            self._vms = self._load(path=path)
+            self.logger.info(f"Resume the build from {path}")
+        elif resume:
+            self.logger.warning(f"No state file {path} found, start a new build")
+
+        # a new build overwrites the state of the previous one
+        self._save()
+
+    @staticmethod
+    def _load(path: str) -> dict[str, dict[str, Any]]:
+        with open(path) as file:
+            state = json.load(file)
+        if state.get("version") != STATE_VERSION:
+            raise Exception(
+                f"The state file {path} has the unknown version {state.get('version')}!"
+            )
+        vms: dict[str, dict[str, Any]] = state["vms"]
+        return vms
+
+    def _save(self) -> None:
+        """Replaces the file at once, so an interrupted build never leaves half a state behind."""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"version": STATE_VERSION, "vms": self._vms}, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _entry(self, vm: SimpleVmConf | ComplexVmConf) -> dict[str, Any]:
+        return self._vms.setdefault(str(vm.vm_id), {"vm_name": vm.vm_name, "done": []})
+
+    def restore(self, vm_infos: Sequence[SimpleVmConf | ComplexVmConf]) -> None:
+        """
+        Checks, that the state belongs to the config, and puts the vms, which are already cloned,
+        back on the node, they were cloned to.
+        """
+        with self._lock:
+            for vm in vm_infos:
+                entry = self._vms.get(str(vm.vm_id))
+                if entry is None:
+                    continue
+                if entry["vm_name"] != vm.vm_name:
+                    raise Exception(
+                        f"The state file {self.path} belongs to another config, "
+                        f"{vm.vm_id} is {entry['vm_name']} there and {vm.vm_name} in the config!"
+                    )
+                if BuildPhase.CLONE.value in entry["done"] and entry.get("target_name"):
+                    vm.target_name = entry["target_name"]
+
+                next_phase = next(
+                    (
+                        phase.value
+                        for phase in BuildPhase
+                        if phase.value not in entry["done"]
+                    ),
+                    "nothing",
+                )
+                failed = entry.get("failed")
+                self.logger.info(
+                    f"{vm.vm_id} - {vm.vm_name} continues with {next_phase}"
+                    + (
+                        f", its {failed['phase']} failed with: {failed['error']}"
+                        if failed
+                        else ""
+                    )
+                )
+
+    def is_done(self, vm: SimpleVmConf | ComplexVmConf, phase: BuildPhase) -> bool:
+        with self._lock:
+            entry = self._vms.get(str(vm.vm_id))
+            return entry is not None and phase.value in entry["done"]
+
+    def failed_phase(self, vm: SimpleVmConf | ComplexVmConf) -> Optional[BuildPhase]:
+        """The phase, which failed on the vm in the previous build, if one failed."""
+        with self._lock:
+            failed = self._vms.get(str(vm.vm_id), {}).get("failed")
+            return BuildPhase(failed["phase"]) if failed else None
+
+    def pending(self, vm_infos: Sequence[VmT], phase: BuildPhase) -> list[VmT]:
+        """The vms, which did not finish the phase yet."""
+        return [vm for vm in vm_infos if not self.is_done(vm=vm, phase=phase)]
+
+    def done(self, vm: SimpleVmConf | ComplexVmConf, phase: BuildPhase) -> None:
+        with self._lock:
+            entry = self._entry(vm=vm)
+            if phase.value not in entry["done"]:
+                entry["done"].append(phase.value)
+            entry["target_name"] = vm.target_name
+            # a resumed build marks the earlier phases done again, the failure of a later one stays
+            if entry.get("failed", {}).get("phase") == phase.value:
+                entry.pop("failed")
+            self._save()
+
+    def failed(
+        self,
+        vm: SimpleVmConf | ComplexVmConf,
+        phase: BuildPhase,
+        error: BaseException,
+    ) -> None:
+        with self._lock:
+            self._entry(vm=vm)["failed"] = {"phase": phase.value, "error": str(error)}
+            self._save()
+
+    @contextmanager
+    def track(
+        self, vm: SimpleVmConf | ComplexVmConf, phase: BuildPhase
+    ) -> Iterator[None]:
+        """Records the phase of the vm as done, or as failed, if the block raises."""
+        try:
+            yield
+        except BaseException as error:
+            self.failed(vm=vm, phase=phase, error=error)
+            raise
+        self.done(vm=vm, phase=phase)
@@ -0,0 +1,111 @@
+import json
+import logging
+import pytest
+from kubeSetup.commands.utils import (
+    BuildPhase,
+    BuildState,
+    ClusterBuild,
+    ClusterType,
+    ExecutionPlan,
+    PreconfigureCluster,
+    SimpleVmConf,
+    VmType,
+)
+from kubeSetup.commands.utils._dryRun._fake_ssh import FakeSSHConnectionPool
+
+logger = logging.getLogger("test")
+
+
+def _vm(vm_id, vm_type=VmType.WORKER, target_name="auto"):
+    return SimpleVmConf(
+        vm_name=f"vm-{vm_id}",
+        vm_type=vm_type,
+        target_name=target_name,
+        vm_id=vm_id,
+        tags="kubernetes",
+        clone_type=1,
+        ip_address=f"10.10.10.{vm_id - 90}",
+        ip_gw="10.10.10.1",
+        user="tom",
+        ssh_key="/not/needed",
+        pw="secret",
+    )
+
+
+def test_a_resumed_build_skips_the_finished_phases(tmp_path):
+    path = str(tmp_path / "state.json")
+    state = BuildState(path=path, logger=logger)
+    cloned = _vm(101, target_name="pve2")
+    state.done(vm=cloned, phase=BuildPhase.CLONE)
+    with pytest.raises(Exception):
+        with state.track(vm=cloned, phase=BuildPhase.CONFIG):
+            raise Exception("config failed")
+
+    vms = [_vm(101), _vm(102)]
+    resumed = BuildState(path=path, logger=logger, resume=True)
+    resumed.restore(vm_infos=vms)
+    # the vm stays on the node, it was cloned to
+    assert vms[0].target_name == "pve2"
+    assert resumed.pending(vm_infos=vms, phase=BuildPhase.CLONE) == [vms[1]]
+    assert resumed.pending(vm_infos=vms, phase=BuildPhase.CONFIG) == vms
+    assert resumed.failed_phase(vm=vms[0]) == BuildPhase.CONFIG
+
+    # without resume the build starts over
+    BuildState(path=path, logger=logger)
+    with open(path) as file:
+        assert json.load(file)["vms"] == {}
+
+
+def test_a_state_of_another_config_is_rejected(tmp_path):
+    path = str(tmp_path / "state.json")
+    BuildState(path=path, logger=logger).done(vm=_vm(101), phase=BuildPhase.CLONE)
+    renamed = _vm(101)
+    renamed.vm_name = "other"
+    with pytest.raises(Exception, match="another config"):
+        BuildState(path=path, logger=logger, resume=True).restore(vm_infos=[renamed])
+
+
+def test_only_the_failed_nodes_join_again():
+    master, joined, failed = (
+        _vm(101, VmType.MASTER),
+        _vm(102),
+        _vm(103),
+    )
+    state = BuildState(logger=logger)
+    for vm in (master, joined):
+        state.done(vm=vm, phase=BuildPhase.JOIN)
+    state.failed(vm=failed, phase=BuildPhase.JOIN, error=Exception("timed out"))
+
+    vms = [master, joined, failed]
+    plan = ExecutionPlan(logger=logger)
+    build = ClusterBuild(
+        vm_infos=vms,
+        preconf=PreconfigureCluster(
+            vm_infos=vms, logger=logger, kube_version="1.32", state=state
+        ),
+        logger=logger,
+        ssh_pool_manager=FakeSSHConnectionPool(
+            plan=plan, hosts={vm.ip_address: vm.vm_name for vm in vms}
+        ),
+        state=state,
+        plan=plan,
+    )
+    build.preconfigure(provisioning="image")
+    build.setup_cluster(cluster_type=ClusterType.SIMPLE)
+    with plan.phase("cluster setup"):
+        build.run()
+
+    actions = [(entry.target, entry.action) for entry in plan.phases[0].entries]
+    assert not any("kubeadm init" in action for _, action in actions)
+    assert (master.ip_address, "sudo kubeadm token create --print-join-command") in (
+        actions
+    )
+    # the failed node is reset before it joins again, the joined one is left alone
+    assert [
+        action.split()[1:3] for target, action in actions if target == failed.ip_address
+    ] == [
+        ["kubeadm", "reset"],
+        ["kubeadm", "join"],
+    ]
+    assert not any(target == joined.ip_address for target, _ in actions)
+    assert state.pending(vm_infos=[master, joined, failed], phase=BuildPhase.JOIN) == []
@@ -0,0 +1,4 @@
+__all__ = ["CloudInitSnippets"]
+
+
+from ._snippets import CloudInitSnippets
@@ -0,0 +1,152 @@
+import os
+import hashlib
+import logging
+import secrets
+import paramiko
+from typing import Optional
+from jinja2 import Environment, FileSystemLoader
+from .._setup import SimpleVmConf, ComplexVmConf, VmType
+from .._setupUtils import SSHConnectionPool, preconfigure_cmds, PRECONFIGURED_MARKER
+
+SCRIPT_PATH = "/usr/local/sbin/kube-preconfigure.sh"
+
+# alphabet of the crypt hashes and the order, in which the digest bytes are encoded
+CRYPT_ALPHABET = "./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+SHA512_CRYPT_ORDER = [
+    (0, 21, 42), (22, 43, 1), (44, 2, 23), (3, 24, 45), (25, 46, 4), (47, 5, 26),
+    (6, 27, 48), (28, 49, 7), (50, 8, 29), (9, 30, 51), (31, 52, 10), (53, 11, 32),
+    (12, 33, 54), (34, 55, 13), (56, 14, 35), (15, 36, 57), (37, 58, 16), (59, 17, 38),
+    (18, 39, 60), (40, 61, 19), (62, 20, 41),
+]  # fmt: skip
+
+
+def sha512_crypt(password: str, salt: Optional[str] = None) -> str:
+    """
+    SHA-512 crypt hash ($6$) of the password with the default 5000 rounds, as /etc/shadow
+    expects it. The crypt module is gone since python 3.13, so the hash is computed here.
+    """
+    if salt is None:
+        salt = "".join(secrets.choice(CRYPT_ALPHABET) for _ in range(16))
+    pw, salt_bytes = password.encode(), salt.encode()[:16]
+
+    alternate = hashlib.sha512(pw + salt_bytes + pw).digest()
+    digest = hashlib.sha512(pw + salt_bytes)
+    digest.update((alternate * (len(pw) // 64 + 1))[: len(pw)])
+    length = len(pw)
+    while length:
+        digest.update(alternate if length & 1 else pw)
+        length >>= 1
+    result = digest.digest()
+
+    pw_sequence = (hashlib.sha512(pw * len(pw)).digest() * (len(pw) // 64 + 1))[
+        : len(pw)
+    ]
+    salt_sequence = hashlib.sha512(salt_bytes * (16 + result[0])).digest()[
+        : len(salt_bytes)
+    ]
+    for step in range(5000):
+        digest = hashlib.sha512(pw_sequence if step & 1 else result)
+        if step % 3:
+            digest.update(salt_sequence)
+        if step % 7:
+            digest.update(pw_sequence)
+        digest.update(result if step & 1 else pw_sequence)
+        result = digest.digest()
+
+    encoded = ""
+    for groups, chars in [*((order, 4) for order in SHA512_CRYPT_ORDER), ((63,), 2)]:
+        value = int.from_bytes(bytes(result[index] for index in groups), "big")
+        for _ in range(chars):
+            encoded += CRYPT_ALPHABET[value & 0x3F]
+            value >>= 6
+    return f"$6${salt_bytes.decode()}${encoded}"
+
+
+class CloudInitSnippets:
+    """
+    Renders the whole preconfiguration of a vm into a cloud-init user-data snippet and uploads it
+    to the snippets storage of the proxmox node, so it can be attached at clone time via cicustom.
+    The vms then configure themselves in parallel during the first boot.
+    The snippets stay on the storage, as proxmox reads them again on every start of the vm, so
+    the password is only written as a SHA-512 crypt hash.
+    """
+
+    def __init__(
+        self,
+        kube_version: str,
+        snippets_storage: str,
+        snippets_dir: str,
+        logger: logging.Logger,
+    ) -> None:
+        self.kube_version = kube_version
+        self.snippets_storage = snippets_storage
+        self.snippets_dir = snippets_dir
+        self.logger = logger
+
+    def upload(
+        self,
+        vm_infos: list[SimpleVmConf | ComplexVmConf],
+        node_addresses: dict[str, str],
+        node_user: str,
+        node_ssh_key: str,
+        ssh_pool_manager: SSHConnectionPool,
+    ) -> dict[int, str]:
+        """Uploads the snippet of every vm to its node and returns the cicustom value per vm id."""
+        cicustom: dict[int, str] = {}
+        for node, node_vms in self._by_node(vm_infos=vm_infos).items():
+            sftp = ssh_pool_manager.get_sftp(
+                ip_address=node_addresses[node], user=node_user, ssh_key=node_ssh_key
+            )
+            for vm in node_vms:
+                file_name = f"kube-{vm.vm_id}-user-data.yaml"
+                with sftp.open(f"{self.snippets_dir}/{file_name}", "w") as remote_file:
+                    remote_file.write(self.render(vm=vm))
+                self.logger.info(
+                    f"Uploaded the user-data of {vm.vm_id} - {vm.vm_name} to {node}"
+                )
+                cicustom[vm.vm_id] = (
+                    f"user={self.snippets_storage}:snippets/{file_name}"
+                )
+        return cicustom
+
+    def render(self, vm: SimpleVmConf | ComplexVmConf) -> str:
+        temp_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "_templates"
+        )
+        template = Environment(
+            loader=FileSystemLoader(temp_path), trim_blocks=True
+        ).get_template("user-data.j2")
+
+        # load balancers are set up via SSH later on, so they only need the user
+        preconfigure = vm.vm_type != VmType.LOADBALANCER
+        return template.render(
+            vm_name=vm.vm_name,
+            user=vm.user,
+            pw_hash=sha512_crypt(password=vm.pw),
+            ssh_public_key=self._public_key(ssh_key=vm.ssh_key),
+            packages=["nfs-common", "sshpass"] if preconfigure else [],
+            commands=(
+                preconfigure_cmds(kube_version=self.kube_version)
+                if preconfigure
+                else []
+            ),
+            script_path=SCRIPT_PATH,
+            marker_path=PRECONFIGURED_MARKER,
+        )
+
+    @staticmethod
+    def _public_key(ssh_key: str) -> str:
+        if os.path.exists(f"{ssh_key}.pub"):
+            with open(f"{ssh_key}.pub", "r") as file:
+                return file.read().strip()
+        private_key = paramiko.RSAKey.from_private_key_file(ssh_key)
+        return f"{private_key.get_name()} {private_key.get_base64()}"
+
+    @staticmethod
+    def _by_node(
+        vm_infos: list[SimpleVmConf | ComplexVmConf],
+    ) -> dict[str, list[SimpleVmConf | ComplexVmConf]]:
+        by_node: dict[str, list[SimpleVmConf | ComplexVmConf]] = {}
+        for vm in vm_infos:
+            by_node.setdefault(vm.target_name, []).append(vm)
+        return by_node
@@ -0,0 +1,59 @@
+import logging
+from kubeSetup.commands.utils import CloudInitSnippets, SimpleVmConf, VmType
+from kubeSetup.commands.utils._cloudInit._snippets import sha512_crypt
+
+
+def _vm(tmp_path, vm_type):
+    ssh_key = tmp_path / "homelab"
+    ssh_key.write_text("private")
+    (tmp_path / "homelab.pub").write_text("ssh-rsa AAAATEST tom@home\n")
+    return SimpleVmConf(
+        vm_name="test_01",
+        vm_type=vm_type,
+        target_name="pve",
+        vm_id=100,
+        tags="kubernetes",
+        clone_type=1,
+        ip_address="10.10.10.10",
+        ip_gw="10.10.10.1",
+        user="tom",
+        ssh_key=str(ssh_key),
+        pw="secret",
+    )
+
+
+def _snippets():
+    return CloudInitSnippets(
+        kube_version="1.32",
+        snippets_storage="local",
+        snippets_dir="/var/lib/vz/snippets",
+        logger=logging.getLogger("test"),
+    )
+
+
+def test_render_contains_user_and_preconfiguration(tmp_path):
+    user_data = _snippets().render(vm=_vm(tmp_path, VmType.WORKER))
+    assert user_data.startswith("#cloud-config")
+    assert "- name: tom" in user_data
+    assert "- ssh-rsa AAAATEST tom@home" in user_data
+    assert "      sudo swapoff -a\n" in user_data
+    assert "pkgs.k8s.io/core:/stable:/v1.32/deb" in user_data
+    assert "echo done > /var/lib/kube-setup/preconfigured" in user_data
+
+
+def test_render_load_balancer_only_sets_up_the_user(tmp_path):
+    user_data = _snippets().render(vm=_vm(tmp_path, VmType.LOADBALANCER))
+    assert "- name: tom" in user_data
+    assert "kubeadm" not in user_data
+
+
+def test_render_only_contains_the_hash_of_the_password(tmp_path):
+    user_data = _snippets().render(vm=_vm(tmp_path, VmType.WORKER))
+    assert 'hashed_passwd: "$6$' in user_data
+    assert "secret" not in user_data
+
+
+def test_sha512_crypt_matches_the_reference():
+    assert sha512_crypt(password="Hello world!", salt="saltstring") == (
+        "$6$saltstring$svn8UoSVapNtMuq1ukKS4tPQd8iKwSMHWjl/O817G3uBnIFNjnQJuesI68u4OTLiBFdcbYEdFCoEOfaS35inz1"
+    )
@@ -1,5 +1,6 @@
-__all__ = ["ClusterSetup", "ClusterType"]
+__all__ = ["ClusterSetup", "ClusterType", "ImageDistribution"]
 
 
 from ._setup import ClusterSetup
 from ._schemas import ClusterType
+from ._images import ImageDistribution
@@ -0,0 +1,198 @@
+import os
+import re
+import logging
+from functools import partial
+from typing import Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from ._schemas import ClusterType
+from .._setup import SimpleVmConf, ComplexVmConf, VmType
+from .._setupUtils import SSHConnectionPool, execute_command, run_command
+
+# the image archive, which is passed from vm to vm
+IMAGES_TAR = "/tmp/kube-images.tar"
+
+# the kubelet only sees the images in the k8s.io namespace of containerd
+CTR = "sudo ctr -n k8s.io"
+
+_IMAGE_PATTERN = re.compile(r"^\s*image:\s*(\S+)\s*$", re.MULTILINE)
+
+
+def calico_images(cluster_type: ClusterType) -> list[str]:
+    """The images, which are referenced by the calico manifest of the cluster type."""
+    template = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "templates",
+        cluster_type.name.lower(),
+        "calico.j2",
+    )
+    with open(template) as file:
+        return sorted(set(_IMAGE_PATTERN.findall(file.read())))
+
+
+class ImageDistribution:
+    """
+    Pulls the container images of the cluster once on a seed vm and passes the exported archive
+    on in a tree: in every round each vm, which holds the archive, copies it to one more vm. So
+    the registry is hit once per cluster and all N vms hold the images after log2(N) rounds.
+    """
+
+    def __init__(
+        self,
+        vm_infos: list[SimpleVmConf | ComplexVmConf],
+        logger: logging.Logger,
+        cluster_type: ClusterType,
+        max_parallel: int = 10,
+    ) -> None:
+        self.vms = [vm for vm in vm_infos if vm.vm_type != VmType.LOADBALANCER]
+        self.logger = logger
+        self.cluster_type = cluster_type
+        self.max_parallel = max(1, max_parallel)
+        # the images, which the seed pulled
+        self.images: list[str] = []
+
+    def distribute(self, ssh_pool_manager: SSHConnectionPool) -> None:
+        self.pull(ssh_pool_manager=ssh_pool_manager)
+        self.spread(ssh_pool_manager=ssh_pool_manager)
+
+    def seed(self) -> Optional[SimpleVmConf | ComplexVmConf]:
+        """The first master initializes the cluster, so it needs the images first."""
+        return next(
+            (vm for vm in self.vms if vm.vm_type == VmType.MASTER),
+            self.vms[0] if self.vms else None,
+        )
+
+    def pull(self, ssh_pool_manager: SSHConnectionPool) -> None:
+        """Pulls the images on the seed, the other vms can still be busy meanwhile."""
+        seed = self.seed()
+        if seed is not None:
+            self.images = self._pull(seed=seed, ssh_pool_manager=ssh_pool_manager)
+
+    def spread(self, ssh_pool_manager: SSHConnectionPool) -> None:
+        """Passes the images of the seed on to the other vms, once all of them are up."""
+        seed = self.seed()
+        if seed is None:
+            return
+        others = [vm for vm in self.vms if vm is not seed]
+        self.logger.info(
+            f"Distribute {len(self.images)} images from {seed.vm_name} to {len(others)} vms"
+        )
+
+        self._fan_out(seed=seed, others=others, ssh_pool_manager=ssh_pool_manager)
+
+        # every vm imports its copy at the same time
+        self._parallel(
+            name="image import",
+            tasks=[
+                (vm, partial(self._import, vm=vm, ssh_pool_manager=ssh_pool_manager))
+                for vm in others
+            ],
+        )
+        run_command(
+            cmd=f"sudo rm -f {IMAGES_TAR}",
+            client=ssh_pool_manager.get_connection(ip_address=seed.ip_address),
+            logger=self.logger,
+        )
+
+    def _pull(
+        self, seed: SimpleVmConf | ComplexVmConf, ssh_pool_manager: SSHConnectionPool
+    ) -> list[str]:
+        """Pulls and exports the images of kubeadm and calico on the seed vm."""
+        client = ssh_pool_manager.get_connection(
+            ip_address=seed.ip_address, user=seed.user, ssh_key=seed.ssh_key
+        )
+        kube_images, _ = execute_command(
+            cmd="sudo kubeadm config images list", client=client, logger=self.logger
+        )
+        cni_images = calico_images(cluster_type=self.cluster_type)
+
+        run_command(
+            cmd="sudo kubeadm config images pull", client=client, logger=self.logger
+        )
+        for image in cni_images:
+            run_command(
+                cmd=f"{CTR} images pull {image}", client=client, logger=self.logger
+            )
+        images = kube_images.split() + cni_images
+        run_command(
+            cmd=f"{CTR} images export {IMAGES_TAR} {' '.join(images)} && sudo chmod 644 {IMAGES_TAR}",
+            client=client,
+            logger=self.logger,
+        )
+        return images
+
+    def _fan_out(
+        self,
+        seed: SimpleVmConf | ComplexVmConf,
+        others: list[SimpleVmConf | ComplexVmConf],
+        ssh_pool_manager: SSHConnectionPool,
+    ) -> None:
+        holders = [seed]
+        pending = list(others)
+        while pending:
+            # every holder copies the archive to one vm, the receivers hold it afterward
+            pairs = list(zip(holders, pending))
+            pending = pending[len(pairs) :]
+            self._parallel(
+                name="image copy",
+                tasks=[
+                    (
+                        target,
+                        partial(
+                            self._copy,
+                            source=source,
+                            target=target,
+                            ssh_pool_manager=ssh_pool_manager,
+                        ),
+                    )
+                    for source, target in pairs
+                ],
+            )
+            holders.extend(target for _, target in pairs)
+
+    def _copy(
+        self,
+        source: SimpleVmConf | ComplexVmConf,
+        target: SimpleVmConf | ComplexVmConf,
+        ssh_pool_manager: SSHConnectionPool,
+    ) -> None:
+        with ssh_pool_manager.session(ip_address=source.ip_address) as client:
+            run_command(
+                cmd=f'sshpass -p "{target.pw}" scp -o StrictHostKeyChecking=no {IMAGES_TAR} {target.user}@{target.ip_address}:{IMAGES_TAR}',
+                client=client,
+                logger=self.logger.getChild(target.vm_name),
+            )
+
+    def _import(
+        self, vm: SimpleVmConf | ComplexVmConf, ssh_pool_manager: SSHConnectionPool
+    ) -> None:
+        client = ssh_pool_manager.get_connection(
+            ip_address=vm.ip_address, user=vm.user, ssh_key=vm.ssh_key
+        )
+        run_command(
+            cmd=f"{CTR} images import {IMAGES_TAR} && rm -f {IMAGES_TAR}",
+            client=client,
+            logger=self.logger.getChild(vm.vm_name),
+        )
+
+    def _parallel(
+        self,
+        name: str,
+        tasks: list[tuple[SimpleVmConf | ComplexVmConf, Callable[[], None]]],
+    ) -> None:
+        """Runs the tasks of all vms and raises with every failure, once all are done."""
+        if not tasks:
+            return
+        failed: list[str] = []
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_parallel, len(tasks)),
+            thread_name_prefix=name.replace(" ", "-"),
+        ) as executor:
+            futures = [(vm, executor.submit(task)) for vm, task in tasks]
+            for vm, future in futures:
+                error = future.exception()
+                if error is not None:
+                    failed.append(f"{vm.vm_name} ({vm.ip_address}): {error}")
+        if failed:
+            raise Exception(
+                f"The {name} failed on:\n" + "\n".join(f"  - {vm}" for vm in failed)
+            )
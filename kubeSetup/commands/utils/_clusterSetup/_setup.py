@@ -1,30 +1,103 @@
 import os
 import logging
-from time import sleep
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from ._schemas import ClusterType
 from jinja2 import Environment, FileSystemLoader
 from .._setup import SimpleVmConf, ComplexVmConf, VmType
+from .._checkpoint import BuildState, BuildPhase
 from .._setupUtils import (
     get_pwd,
     kubeadm_init,
+    kubeadm_join_cmds,
+    kubeadm_reset,
     setup_calico,
     SSHConnectionPool,
-    execute_command,
+    run_command,
+    execute_commands,
 )
 
 
 class ClusterSetup:
 
     @classmethod
-    def setup_cluster(
+    def init_cluster(
         cls,
         group_vms: dict[str, list[SimpleVmConf | ComplexVmConf]],
         cluster_type: ClusterType,
         logger: logging.Logger,
         ssh_pool_manager: SSHConnectionPool,
         control_plane_endpoint: Optional[str] = None,
+        state: Optional[BuildState] = None,
+    ) -> tuple[Optional[str], str]:
+        """
+        Initializes the cluster on the first master and returns the join commands for the masters
+        and the workers, the other nodes join with join_node. The first master is reset first,
+        if its init failed in a previous build.
+        """
+        state = state or BuildState(logger=logger)
+        cls._reset_failed_joins(
+            vms=group_vms[VmType.MASTER.name][:1],
+            ssh_pool_manager=ssh_pool_manager,
+            logger=logger,
+            state=state,
+        )
+        return cls._kubeadm_cmds(
+            group_vms=group_vms,
+            cluster_type=cluster_type,
+            logger=logger,
+            ssh_pool_manager=ssh_pool_manager,
+            control_plane_endpoint=control_plane_endpoint,
+            state=state,
+        )
+
+    @classmethod
+    def join_node(
+        cls,
+        vm: SimpleVmConf | ComplexVmConf,
+        master_vm: SimpleVmConf | ComplexVmConf,
+        kubeadm_cmd: str,
+        logger: logging.Logger,
+        ssh_pool_manager: SSHConnectionPool,
+        state: Optional[BuildState] = None,
     ) -> None:
+        """
+        Joins a single node into the cluster of the first master, a master gets the certs of the
+        first master before. The node is skipped, if it joined in a previous build, and reset first,
+        if its join failed.
+        """
+        state = state or BuildState(logger=logger)
+        if state.is_done(vm=vm, phase=BuildPhase.JOIN):
+            return
+        cls._reset_failed_joins(
+            vms=[vm], ssh_pool_manager=ssh_pool_manager, logger=logger, state=state
+        )
+        if vm.vm_type == VmType.MASTER:
+            cls._distribute_kube_certs(
+                vms=[vm],  # type: ignore
+                ssh_pool_manager=ssh_pool_manager,
+                logger=logger,
+                master_ip=master_vm.ip_address,
+            )
+        cls._exc_kubeadm_cmd(
+            vms=[vm],
+            kubeadm_cmd=kubeadm_cmd,
+            ssh_pool_manager=ssh_pool_manager,
+            logger=logger,
+            state=state,
+        )
+
+    @classmethod
+    def _kubeadm_cmds(
+        cls,
+        group_vms: dict[str, list[SimpleVmConf | ComplexVmConf]],
+        cluster_type: ClusterType,
+        logger: logging.Logger,
+        ssh_pool_manager: SSHConnectionPool,
+        control_plane_endpoint: Optional[str],
+        state: BuildState,
+    ) -> tuple[Optional[str], str]:
+        """Initializes the cluster, if it is not yet, otherwise the master creates new join commands."""
         # get the connection to the master node
         master_vm = group_vms[VmType.MASTER.name][0]
         client_master = ssh_pool_manager.get_connection(
@@ -32,12 +105,41 @@ class ClusterSetup:
             user=master_vm.user,
             ssh_key=master_vm.ssh_key,
         )
+        if state.is_done(vm=master_vm, phase=BuildPhase.JOIN):
+            logger.info(f"The cluster is already initialized on {master_vm.vm_name}")
+            return kubeadm_join_cmds(
+                client=client_master,
+                logger=logger,
+                complex_type=cluster_type == ClusterType.COMPLEX,
+            )
+        with state.track(vm=master_vm, phase=BuildPhase.JOIN):
+            return cls._init_cluster(
+                master_vm=master_vm,
+                group_vms=group_vms,
+                cluster_type=cluster_type,
+                logger=logger,
+                ssh_pool_manager=ssh_pool_manager,
+                control_plane_endpoint=control_plane_endpoint,
+            )
+
+    @classmethod
+    def _init_cluster(
+        cls,
+        master_vm: SimpleVmConf | ComplexVmConf,
+        group_vms: dict[str, list[SimpleVmConf | ComplexVmConf]],
+        cluster_type: ClusterType,
+        logger: logging.Logger,
+        ssh_pool_manager: SSHConnectionPool,
+        control_plane_endpoint: Optional[str] = None,
+    ) -> tuple[Optional[str], str]:
+        """Runs kubeadm init and sets up calico on the first master, returns the join commands."""
+        client_master = ssh_pool_manager.get_connection(ip_address=master_vm.ip_address)
 
         # get the root directory from the vm, just to move the files there
         pwd = get_pwd(client=client_master, logger=logger)
 
-        # establish sftp
-        sftp = client_master.open_sftp()
+        # the pooled sftp session of the master
+        sftp = ssh_pool_manager.get_sftp(ip_address=master_vm.ip_address)
 
         # get the right templates path
         temp_path = os.path.join(
@@ -70,9 +172,6 @@ class ClusterSetup:
                 cls._setup_calico(pod_subnet="10.244.0.0", temp_path=temp_path)
             )
 
-        # close sftp connection
-        sftp.close()
-
         # init kubeadm and setup kube home
         kubeadm_master, kubeadm_worker = kubeadm_init(
             client=client_master,
@@ -83,38 +182,7 @@ class ClusterSetup:
         # init calico (cni)
         setup_calico(client=client_master, logger=logger)
 
-        # join the master
-        if cluster_type == ClusterType.COMPLEX and kubeadm_master:
-            # move the certs
-            cls._distribute_kube_certs(
-                vms=[
-                    vm  # type: ignore
-                    for vm in group_vms[VmType.MASTER.name]
-                    if vm.ip_address != master_vm.ip_address
-                ],
-                ssh_pool_manager=ssh_pool_manager,
-                logger=logger,
-                master_ip=master_vm.ip_address,
-            )
-
-            cls._exc_kubeadm_cmd(
-                vms=[
-                    vm
-                    for vm in group_vms[VmType.MASTER.name]
-                    if vm.ip_address != master_vm.ip_address
-                ],
-                ssh_pool_manager=ssh_pool_manager,
-                kubeadm_cmd=kubeadm_master,
-                logger=logger,
-            )
-
-        # join the worker nodes
-        cls._exc_kubeadm_cmd(
-            vms=[vm for vm in group_vms[VmType.WORKER.name]],
-            ssh_pool_manager=ssh_pool_manager,
-            kubeadm_cmd=kubeadm_worker,
-            logger=logger,
-        )
+        return kubeadm_master, kubeadm_worker
 
     @staticmethod
     def _setup_kubeadm_conf(
@@ -159,17 +227,11 @@ class ClusterSetup:
         logger: logging.Logger,
         master_ip: str,
     ) -> None:
-        # get the certs to the initial master node and creat a temp folder with the certs in it
-        init_master_client = ssh_pool_manager.get_connection(
-            ip_address=master_ip,
-        )
-
         # get the certs with sftp
         certs_dir = "/etc/kubernetes/pki"
         kube_dir = "/etc/kubernetes"
 
-        # create folder and move the files
-        for master_vm in vms:
+        def copy_certs(master_vm: ComplexVmConf) -> None:
             client_con = ssh_pool_manager.get_connection(
                 ip_address=master_vm.ip_address,
                 user=master_vm.user,
@@ -177,34 +239,167 @@ class ClusterSetup:
             )
             # get the root location
             client_pwd = get_pwd(client=client_con, logger=logger)
-            # copy the certs
-            execute_command(
-                cmd=f'sudo sshpass -p "{master_vm.pw}" scp -o StrictHostKeyChecking=no -r {certs_dir} {master_vm.user}@{master_vm.ip_address}:{client_pwd}',
-                client=init_master_client,
-                logger=logger,
-            )
+            # copy the certs, every copy runs in its own channel of the initial master
+            with ssh_pool_manager.session(ip_address=master_ip) as init_master_client:
+                run_command(
+                    cmd=f'sudo sshpass -p "{master_vm.pw}" scp -o StrictHostKeyChecking=no -r {certs_dir} {master_vm.user}@{master_vm.ip_address}:{client_pwd}',
+                    client=init_master_client,
+                    logger=logger,
+                )
             # move the certs to the right position
-            execute_command(
+            run_command(
                 cmd=f"sudo mv {client_pwd}/pki {kube_dir}",
                 client=client_con,
                 logger=logger,
             )
 
+        # create folder and move the files, to all masters at the same time
+        if vms:
+            with ThreadPoolExecutor(
+                max_workers=len(vms), thread_name_prefix="certs"
+            ) as executor:
+                list(executor.map(copy_certs, vms))
+
+    @staticmethod
+    def _reset_failed_joins(
+        vms: list[SimpleVmConf | ComplexVmConf],
+        ssh_pool_manager: SSHConnectionPool,
+        logger: logging.Logger,
+        state: BuildState,
+    ) -> None:
+        for vm in vms:
+            if state.failed_phase(vm=vm) != BuildPhase.JOIN:
+                continue
+            logger.info(f"Reset {vm.vm_name} {vm.ip_address} after its failed join")
+            kubeadm_reset(
+                client=ssh_pool_manager.get_connection(
+                    ip_address=vm.ip_address, user=vm.user, ssh_key=vm.ssh_key
+                ),
+                logger=logger,
+            )
+
+    @classmethod
+    def join_nodes(
+        cls,
+        master_vm: SimpleVmConf | ComplexVmConf,
+        vms: list[SimpleVmConf | ComplexVmConf],
+        logger: logging.Logger,
+        ssh_pool_manager: SSHConnectionPool,
+        max_parallel: int = 10,
+    ) -> None:
+        """
+        Joins workers into the running cluster of the master. The join command of kubeadm init
+        expires, so the master creates a new one, with which all workers join at the same time.
+        """
+        _, kubeadm_worker = kubeadm_join_cmds(
+            client=ssh_pool_manager.get_connection(
+                ip_address=master_vm.ip_address,
+                user=master_vm.user,
+                ssh_key=master_vm.ssh_key,
+            ),
+            logger=logger,
+            complex_type=False,
+        )
+        cls._exc_kubeadm_cmd(
+            vms=vms,
+            kubeadm_cmd=kubeadm_worker,
+            ssh_pool_manager=ssh_pool_manager,
+            logger=logger,
+            state=BuildState(logger=logger),
+            max_parallel=max_parallel,
+        )
+
+    @staticmethod
+    def remove_nodes(
+        master_vm: SimpleVmConf | ComplexVmConf,
+        vms: list[SimpleVmConf | ComplexVmConf],
+        logger: logging.Logger,
+        ssh_pool_manager: SSHConnectionPool,
+        max_parallel: int = 3,
+        drain_timeout: int = 300,
+    ) -> list[SimpleVmConf | ComplexVmConf]:
+        """
+        Cordons and drains the nodes, at most max_parallel at a time, and deletes them from the
+        cluster. The drain respects the pod disruption budgets, so the workloads move without
+        downtime. Returns the removed nodes, a node, whose drain failed, stays in the cluster.
+        """
+        ssh_pool_manager.get_connection(
+            ip_address=master_vm.ip_address,
+            user=master_vm.user,
+            ssh_key=master_vm.ssh_key,
+        )
+
+        def remove(vm: SimpleVmConf | ComplexVmConf) -> None:
+            # every node is drained in its own channel of the master
+            with ssh_pool_manager.session(ip_address=master_vm.ip_address) as client:
+                execute_commands(
+                    cmds=[
+                        f"kubectl cordon {vm.vm_name}",
+                        f"kubectl drain {vm.vm_name} --ignore-daemonsets "
+                        f"--delete-emptydir-data --timeout={drain_timeout}s",
+                        f"kubectl delete node {vm.vm_name}",
+                    ],
+                    client=client,
+                    logger=logger.getChild(vm.vm_name),
+                )
+
+        if not vms:
+            return []
+        removed: list[SimpleVmConf | ComplexVmConf] = []
+        with ThreadPoolExecutor(
+            max_workers=min(max(1, max_parallel), len(vms)), thread_name_prefix="drain"
+        ) as executor:
+            futures = [(vm, executor.submit(remove, vm)) for vm in vms]
+            for vm, future in futures:
+                error = future.exception()
+                if error is None:
+                    removed.append(vm)
+                else:
+                    logger.error(
+                        f"Removal of {vm.vm_name} ({vm.ip_address}) failed: {error}"
+                    )
+        return removed
+
     @staticmethod
     def _exc_kubeadm_cmd(
         vms: list[SimpleVmConf | ComplexVmConf],
         kubeadm_cmd: str,
         ssh_pool_manager: SSHConnectionPool,
         logger: logging.Logger,
+        state: BuildState,
+        max_parallel: int = 1,
     ) -> None:
+        """
+        Joins the vms, at most max_parallel at a time. A failing vm does not stop the others,
+        all failures are reported together once every vm is done.
+        """
 
-        for vm in vms:
+        def join(vm: SimpleVmConf | ComplexVmConf) -> None:
             client_worker = ssh_pool_manager.get_connection(
                 ip_address=vm.ip_address, user=vm.user, ssh_key=vm.ssh_key
             )
 
-            stdin, stdout, stderr = client_worker.exec_command(kubeadm_cmd)
-            logger.info(
-                f"Connect to {vm.vm_name} {vm.ip_address}: {stdout.read().decode()} | {stderr.read().decode()}"
+            # kubeadm join returns, once the kubelet of the node is up and registered
+            logger.info(f"Join {vm.vm_name} {vm.ip_address} into the cluster")
+            with state.track(vm=vm, phase=BuildPhase.JOIN):
+                run_command(cmd=kubeadm_cmd, client=client_worker, logger=logger)
+
+        if not vms:
+            return
+        failed: list[str] = []
+        with ThreadPoolExecutor(
+            max_workers=min(max(1, max_parallel), len(vms)), thread_name_prefix="join"
+        ) as executor:
+            futures = [(vm, executor.submit(join, vm)) for vm in vms]
+            for vm, future in futures:
+                error = future.exception()
+                if error is not None:
+                    logger.error(
+                        f"Join of {vm.vm_name} ({vm.ip_address}) failed: {error}"
+                    )
+                    failed.append(f"{vm.vm_name} ({vm.ip_address}): {error}")
+
+        if failed:
+            raise Exception(
+                "The join failed on:\n" + "\n".join(f"  - {vm}" for vm in failed)
             )
-            sleep(15)
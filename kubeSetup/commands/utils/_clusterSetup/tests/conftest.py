@@ -0,0 +1,24 @@
+import pytest
+from kubeSetup.commands.utils import SimpleVmConf, VmType
+
+
+@pytest.fixture
+def make_vm():
+    """Builds the vm with the index, its id and ip address are derived from the index."""
+
+    def build(index: int, vm_type: VmType = VmType.WORKER) -> SimpleVmConf:
+        return SimpleVmConf(
+            vm_name=f"vm-{index}",
+            vm_type=vm_type,
+            target_name="pve",
+            vm_id=100 + index,
+            tags="kubernetes",
+            clone_type=1,
+            ip_address=f"10.10.10.{index}",
+            ip_gw="10.10.10.1",
+            user="tom",
+            ssh_key="/not/needed",
+            pw="secret",
+        )
+
+    return build
@@ -0,0 +1,38 @@
+import logging
+from kubeSetup.commands.utils import ExecutionPlan, VmType, ClusterType
+from kubeSetup.commands.utils._clusterSetup._images import (
+    ImageDistribution,
+    calico_images,
+)
+from kubeSetup.commands.utils._dryRun._fake_ssh import FakeSSHConnectionPool
+
+logger = logging.getLogger("test")
+
+
+def test_calico_images_are_read_from_the_manifest():
+    assert "docker.io/calico/node:v3.28.1" in calico_images(ClusterType.SIMPLE)
+
+
+def test_images_are_pulled_once_and_passed_on_in_a_tree(make_vm):
+    vms = [make_vm(10, VmType.MASTER)] + [make_vm(index) for index in range(11, 18)]
+    plan = ExecutionPlan(logger=logger)
+    pool = FakeSSHConnectionPool(plan=plan, hosts={})
+    for vm in vms:
+        pool.get_connection(ip_address=vm.ip_address, user=vm.user, ssh_key="key")
+
+    ImageDistribution(
+        vm_infos=vms, logger=logger, cluster_type=ClusterType.SIMPLE
+    ).distribute(ssh_pool_manager=pool)
+
+    entries = [entry for phase in plan.phases for entry in phase.entries]
+    pulls = [entry for entry in entries if "images pull" in entry.action]
+    assert {entry.target for entry in pulls} == {"10.10.10.10"}
+
+    copies = [entry for entry in entries if "scp" in entry.action]
+    receivers = [entry.action.split("@")[1].split(":")[0] for entry in copies]
+    assert sorted(receivers) == [vm.ip_address for vm in vms[1:]]
+    # the copies are sent from several vms, not only from the seed
+    assert len({entry.target for entry in copies}) == 4
+
+    imports = [entry for entry in entries if "images import" in entry.action]
+    assert len(imports) == 7
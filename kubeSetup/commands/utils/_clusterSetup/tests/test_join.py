@@ -0,0 +1,60 @@
+import logging
+import pytest
+from kubeSetup.commands.utils import ClusterSetup, ExecutionPlan, VmType
+from kubeSetup.commands.utils._dryRun._fake_ssh import FakeSSHConnectionPool
+
+logger = logging.getLogger("test")
+
+
+class _FailingPool(FakeSSHConnectionPool):
+    def create_connection(self, ip_address, user, ssh_key):
+        if ip_address == "10.10.10.12":
+            raise TimeoutError("timed out")
+        return super().create_connection(ip_address, user, ssh_key)
+
+
+def test_new_workers_join_at_the_same_time_with_a_new_token(make_vm):
+    master, workers = make_vm(10, VmType.MASTER), [
+        make_vm(11),
+        make_vm(12),
+        make_vm(13),
+    ]
+    plan = ExecutionPlan(logger=logger)
+    pool = FakeSSHConnectionPool(
+        plan=plan, hosts={vm.ip_address: vm.vm_name for vm in [master, *workers]}
+    )
+    with plan.phase("join"):
+        ClusterSetup.join_nodes(
+            master_vm=master, vms=workers, logger=logger, ssh_pool_manager=pool
+        )
+
+    phase = plan.phases[0]
+    assert phase.entries[0].action == "sudo kubeadm token create --print-join-command"
+    joins = [entry for entry in phase.entries if "kubeadm join" in entry.action]
+    assert {entry.target for entry in joins} == {vm.ip_address for vm in workers}
+    # the joins overlap, so the phase takes about as long as a single join
+    assert phase.estimate() < 2 * joins[0].estimate
+
+
+def test_a_failing_join_does_not_stop_the_others(make_vm):
+    master, workers = make_vm(10, VmType.MASTER), [
+        make_vm(11),
+        make_vm(12),
+        make_vm(13),
+    ]
+    plan = ExecutionPlan(logger=logger)
+    with plan.phase("join"), pytest.raises(Exception) as err:
+        ClusterSetup.join_nodes(
+            master_vm=master,
+            vms=workers,
+            logger=logger,
+            ssh_pool_manager=_FailingPool(plan=plan, hosts={}),
+        )
+
+    assert "vm-12 (10.10.10.12): timed out" in str(err.value)
+    joined = {
+        entry.target
+        for entry in plan.phases[0].entries
+        if "kubeadm join" in entry.action
+    }
+    assert joined == {"10.10.10.11", "10.10.10.13"}
@@ -0,0 +1,50 @@
+import logging
+from kubeSetup.commands.utils import ClusterSetup, ExecutionPlan, VmType
+from kubeSetup.commands.utils._dryRun._fake_ssh import (
+    FakeSSHClient,
+    FakeSSHConnectionPool,
+    _fake_exec,
+)
+
+logger = logging.getLogger("test")
+
+
+class _BlockedDrainClient(FakeSSHClient):
+    def exec_command(self, command, **kwargs):
+        if command.startswith("kubectl drain vm-12 "):
+            return _fake_exec(
+                stderr="Cannot evict pod as it would violate the pod's disruption budget.",
+                exit_status=1,
+            )
+        return super().exec_command(command, **kwargs)
+
+
+class _BlockedDrainPool(FakeSSHConnectionPool):
+    def create_connection(self, ip_address, user, ssh_key):
+        return _BlockedDrainClient(
+            plan=self.plan, ip_address=ip_address, user=user, vm=ip_address
+        )
+
+
+def test_drained_nodes_are_deleted_and_blocked_ones_stay(make_vm):
+    master, workers = make_vm(10, VmType.MASTER), [
+        make_vm(11),
+        make_vm(12),
+        make_vm(13),
+    ]
+    plan = ExecutionPlan(logger=logger)
+    with plan.phase("remove"):
+        removed = ClusterSetup.remove_nodes(
+            master_vm=master,
+            vms=workers,
+            logger=logger,
+            ssh_pool_manager=_BlockedDrainPool(plan=plan, hosts={}),
+        )
+
+    assert [vm.vm_name for vm in removed] == ["vm-11", "vm-13"]
+    actions = [entry.action for entry in plan.phases[0].entries]
+    assert "kubectl cordon vm-12" in actions
+    assert "kubectl delete node vm-11" in actions
+    assert "kubectl delete node vm-12" not in actions
+    # everything runs on the master
+    assert {entry.target for entry in plan.phases[0].entries} == {master.ip_address}
@@ -4,7 +4,7 @@ import paramiko
 from jinja2 import Environment, FileSystemLoader
 from .._setupUtils import (
     update_upgrade_cmd,
-    execute_command,
+    run_command,
     execute_commands,
     get_pwd,
     SSHConnectionPool,
@@ -36,26 +36,29 @@ class HAProxySetup:
                 )
 
                 # install haproxy
-                execute_command(
+                run_command(
                     cmd="sudo apt install haproxy -y",
                     logger=self.logger,
                     client=client_connection,
                 )
 
                 # generate the conf and transfer the file
-                self._haproxy_setup(client=client_connection)
+                self._haproxy_setup(
+                    client=client_connection,
+                    sftp=ssh_pool_manager.get_sftp(ip_address=vm.ip_address),
+                )
 
         return ssh_pool_manager
 
-    def _haproxy_setup(self, client: paramiko.SSHClient) -> None:
+    def _haproxy_setup(
+        self, client: paramiko.SSHClient, sftp: paramiko.SFTPClient
+    ) -> None:
         pwd = get_pwd(client=client, logger=self.logger)
 
         temp_path = os.path.join(
             os.path.dirname(os.path.abspath(__file__)), "_templates"
         )
 
-        sftp = client.open_sftp()
-
         with sftp.open(f"{pwd}/haproxy.cfg", mode="w") as remote_file:
             remote_file.write(
                 self.setup_haproxy_conf(
@@ -64,8 +67,6 @@ class HAProxySetup:
                 )
             )
 
-        sftp.close()
-
         # move the file to the right position
         cmds = [
             "sudo mv haproxy.cfg /etc/haproxy/haproxy.cfg",
@@ -5,7 +5,7 @@ from typing import Optional
 from jinja2 import Environment, FileSystemLoader
 from .._setupUtils import (
     update_upgrade_cmd,
-    execute_command,
+    run_command,
     execute_commands,
     get_pwd,
     SSHConnectionPool,
@@ -37,7 +37,7 @@ class KeepaLivedSetup:
                 )
 
                 # install keepalived
-                execute_command(
+                run_command(
                     cmd="sudo apt install keepalived -y",
                     client=client_connection,
                     logger=self.logger,
@@ -46,6 +46,7 @@ class KeepaLivedSetup:
                 # generate conf and transfer conf file
                 self._keepalived_setup(
                     client=client_connection,
+                    sftp=ssh_pool_manager.get_sftp(ip_address=vm.ip_address),
                     node_state=vm.node_state,  # type: ignore
                     virtual_ip=vm.virtual_ip_address,  # type: ignore
                 )
@@ -53,7 +54,11 @@ class KeepaLivedSetup:
         return ssh_pool_manager
 
     def _keepalived_setup(
-        self, client: paramiko.SSHClient, node_state: NodeType, virtual_ip: str
+        self,
+        client: paramiko.SSHClient,
+        sftp: paramiko.SFTPClient,
+        node_state: NodeType,
+        virtual_ip: str,
     ) -> None:
         pwd = get_pwd(client=client, logger=self.logger)
 
@@ -61,8 +66,6 @@ class KeepaLivedSetup:
             os.path.dirname(os.path.abspath(__file__)), "_templates"
         )
 
-        sftp = client.open_sftp()
-
         # get the files on the home dir
         with sftp.open(f"{pwd}/keepalived.conf", "w") as remote_file:
             remote_file.write(
@@ -85,8 +88,6 @@ class KeepaLivedSetup:
                 )
             )
 
-        sftp.close()
-
         # move the files to the right position
         cmds = [
             "sudo mv keepalived.conf /etc/keepalived/keepalived.conf",
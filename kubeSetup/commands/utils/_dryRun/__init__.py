@@ -0,0 +1,5 @@
+__all__ = ["ExecutionPlan", "DryRun"]
+
+
+from ._plan import ExecutionPlan
+from ._dry_run import DryRun
@@ -0,0 +1,83 @@
+import threading
+from types import ModuleType
+from typing import Iterator
+from contextlib import contextmanager
+from ._plan import ExecutionPlan
+from ._estimates import BOOT, PING
+from ._fake_proxmox import FakeProxmoxAPI
+from ._fake_ssh import FakeSSHConnectionPool
+from .._setup import ProxmoxConnection, SimpleVmConf, ComplexVmConf, AUTO_PLACEMENT
+from .._setupUtils import _general_commands
+
+# modules, which sleep between the polls of a remote condition
+SLEEPING_MODULES: list[ModuleType] = [_general_commands]
+
+
+class DryRun:
+    """
+    Runs the whole orchestration against an in-process proxmox api and ssh connections.
+    Nothing is changed on the cluster, every api call and remote command ends up in the plan.
+    """
+
+    def __init__(
+        self,
+        proxmox_conf: ProxmoxConnection,
+        vm_infos: list[SimpleVmConf | ComplexVmConf],
+        plan: ExecutionPlan,
+    ) -> None:
+        self.plan = plan
+        self.hosts = {vm.ip_address: vm.vm_name for vm in vm_infos}
+        nodes = sorted(
+            {vm.target_name for vm in vm_infos if vm.target_name != AUTO_PLACEMENT}
+        )
+        self.api = FakeProxmoxAPI(
+            plan=plan,
+            template_id=proxmox_conf.template_id,
+            nodes=nodes or ["pve"],
+            vm_names={vm.vm_id: vm.vm_name for vm in vm_infos},
+        )
+
+    def ssh_pool(self) -> FakeSSHConnectionPool:
+        return FakeSSHConnectionPool(plan=self.plan, hosts=self.hosts)
+
+    def ssh_reachable(self, ip_address: str) -> bool:
+        """The ssh probe of the vms, which passes after the estimated boot time."""
+        self.plan.record(
+            kind="wait",
+            target=ip_address,
+            action="ssh reachable",
+            estimate=BOOT,
+            vm=self.hosts.get(ip_address, ip_address),
+        )
+        return True
+
+    def address_in_use(self, ip_address: str) -> bool:
+        """The preflight sweep of the vm addresses, which finds all of them free."""
+        self.plan.record(
+            kind="ping",
+            target=ip_address,
+            action="address in use",
+            estimate=PING,
+            vm=self.hosts.get(ip_address, ip_address),
+        )
+        return False
+
+    @contextmanager
+    def simulate(self) -> Iterator[None]:
+        """Records the poll intervals into the plan instead of waiting for them."""
+        originals = {module: getattr(module, "sleep") for module in SLEEPING_MODULES}
+        for module in SLEEPING_MODULES:
+            setattr(module, "sleep", self._sleep)
+        try:
+            yield
+        finally:
+            for module, sleep in originals.items():
+                setattr(module, "sleep", sleep)
+
+    def _sleep(self, seconds: float) -> None:
+        self.plan.record(
+            kind="sleep",
+            target=threading.current_thread().name,
+            action=f"sleep {seconds}s",
+            estimate=seconds,
+        )
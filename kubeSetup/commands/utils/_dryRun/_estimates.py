@@ -0,0 +1,60 @@
+from typing import Any
+
+# rough durations in seconds of a small vm on an average proxmox node, used by the dry run
+API_CALL = 0.1
+SSH_COMMAND = 1.0
+SFTP_WRITE = 0.5
+PING = 1.0
+BOOT = 60.0
+SHUTDOWN = 30.0
+
+# proxmox tasks by the last part of their path
+TASKS = {
+    "full_clone": 180.0,
+    "linked_clone": 10.0,
+    "migrate": 180.0,
+    "template": 5.0,
+    "config": 2.0,
+    "resize": 10.0,
+    "start": 5.0,
+    "shutdown": 10.0,
+    "stop": 5.0,
+    "delete": 15.0,
+}
+
+# remote commands by a part of the command, the first match wins
+COMMANDS = [
+    ("@@kube-fact", 2.0),
+    ("apt-get upgrade", 180.0),
+    ("apt-get update", 20.0),
+    ("apt-get install docker-ce", 90.0),
+    ("apt-get install kubelet", 60.0),
+    ("apt-get install", 30.0),
+    ("kubeadm config images pull", 60.0),
+    ("images pull", 20.0),
+    ("images export", 30.0),
+    ("images import", 30.0),
+    ("kubeadm init", 120.0),
+    ("kubeadm join", 60.0),
+    ("kubeadm reset", 15.0),
+    ("boot-finished", 10.0),
+    ("cloud-init status --wait", 420.0),
+    ("kubectl apply", 10.0),
+    ("rollout status", 60.0),
+    ("systemctl is-active", 5.0),
+    ("scp", 10.0),
+    ("curl", 3.0),
+]
+
+
+def task_estimate(action: str, params: dict[str, Any]) -> float:
+    if action == "clone":
+        return TASKS["full_clone" if int(params.get("full", 1)) else "linked_clone"]
+    return TASKS.get(action, TASKS["config"])
+
+
+def command_estimate(cmd: str) -> float:
+    return next(
+        (estimate for part, estimate in COMMANDS if part in cmd),
+        SSH_COMMAND,
+    )
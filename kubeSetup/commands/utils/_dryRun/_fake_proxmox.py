@@ -0,0 +1,294 @@
+import threading
+from time import time
+from typing import Any, Optional
+from ._plan import ExecutionPlan
+from ._estimates import API_CALL, SHUTDOWN, task_estimate
+
+# paths of the async api calls, which return a task
+TASK_ACTIONS = {
+    "clone",
+    "migrate",
+    "template",
+    "resize",
+    "start",
+    "shutdown",
+    "stop",
+}
+
+
+class _FakeResource:
+    """Builds the path like a proxmoxer resource, e.g. nodes("pve").qemu(100).status.get()."""
+
+    def __init__(self, api: "FakeProxmoxAPI", path: list[str]) -> None:
+        self._api = api
+        self._path = path
+
+    def __getattr__(self, name: str) -> "_FakeResource":
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _FakeResource(self._api, self._path + [name])
+
+    def __call__(self, *args: Any) -> "_FakeResource":
+        return _FakeResource(self._api, self._path + [str(arg) for arg in args])
+
+    def get(self, *args: Any, **params: Any) -> Any:
+        return self._api.request("GET", self._path + [str(arg) for arg in args], params)
+
+    def post(self, *args: Any, **params: Any) -> Any:
+        return self._api.request(
+            "POST", self._path + [str(arg) for arg in args], params
+        )
+
+    def put(self, *args: Any, **params: Any) -> Any:
+        return self._api.request("PUT", self._path + [str(arg) for arg in args], params)
+
+    def delete(self, *args: Any, **params: Any) -> Any:
+        return self._api.request(
+            "DELETE", self._path + [str(arg) for arg in args], params
+        )
+
+    create = post
+    set = put
+
+
+class FakeProxmoxAPI:
+    """
+    In-process stand-in for the ProxmoxAPI. It keeps the nodes, storages, vms and tasks in memory,
+    answers like the proxmox api and records every call into the execution plan.
+    All tasks finish right away, their estimated duration is recorded instead.
+    """
+
+    def __init__(
+        self,
+        plan: ExecutionPlan,
+        template_id: int,
+        nodes: list[str],
+        vm_names: dict[int, str],
+        cores: int = 16,
+        memory: int = 64 * 1024**3,
+        storage: int = 1024 * 1024**3,
+    ) -> None:
+        self.plan = plan
+        self.vm_names = vm_names
+        self.template_storage = "local-lvm"
+        self.nodes_state = {
+            node: {
+                "node": node,
+                "status": "online",
+                "maxcpu": cores,
+                "cpu": 0.1,
+                "maxmem": memory,
+                "mem": memory // 8,
+                "ip": f"192.0.2.{index + 1}",
+            }
+            for index, node in enumerate(nodes)
+        }
+        self.storages = {
+            "local": {
+                "storage": "local",
+                "type": "dir",
+                "content": "iso,vztmpl,backup,snippets",
+                "path": "/var/lib/vz",
+                "shared": 0,
+                "avail": storage,
+            },
+            "local-lvm": {
+                "storage": "local-lvm",
+                "type": "lvmthin",
+                "content": "images,rootdir",
+                "shared": 0,
+                "avail": storage,
+            },
+        }
+        self.vms: dict[int, dict[str, Any]] = {
+            template_id: {
+                "vmid": template_id,
+                "name": f"template-{template_id}",
+                "node": nodes[0],
+                "status": "stopped",
+                "template": 1,
+                "tags": "",
+                "config": {
+                    "cores": 2,
+                    "memory": 2048,
+                    "virtio0": f"{self.template_storage}:base-{template_id}-disk-0,size=32G",
+                },
+            }
+        }
+        self.tasks: dict[str, list[dict[str, Any]]] = {node: [] for node in nodes}
+        # the time the vms need to reach their new state, recorded by the first poll
+        self.transitions: dict[int, tuple[str, float]] = {}
+        self._task_count = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> _FakeResource:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _FakeResource(self, [name])
+
+    def request(self, method: str, path: list[str], params: dict[str, Any]) -> Any:
+        with self._lock:
+            result, estimate, vm_id = self._handle(
+                method=method, path=path, params=params
+            )
+
+        action = f"{method} /{'/'.join(path)}"
+        if params:
+            action += f" {params}"
+        vm = self.vm_names.get(vm_id, f"vm {vm_id}") if vm_id is not None else None
+        if isinstance(result, str) and result.startswith("UPID:"):
+            self.plan.record(
+                kind="task",
+                target="proxmox",
+                action=action,
+                estimate=estimate,
+                vm=vm,
+                lane=self._task_lane(path=path, params=params, vm=vm),
+            )
+        else:
+            self.plan.record(
+                kind="api", target="proxmox", action=action, estimate=estimate, vm=vm
+            )
+        return result
+
+    def _task_lane(
+        self, path: list[str], params: dict[str, Any], vm: Optional[str]
+    ) -> Optional[str]:
+        if path[-1] == "clone" and int(params.get("full", 1)):
+            # full clones wait for each other, with the default of one clone per storage
+            storage = params.get("storage") or self.template_storage
+            return f"storage {params.get('target', path[1])}:{storage}"
+        return vm
+
+    def _handle(
+        self, method: str, path: list[str], params: dict[str, Any]
+    ) -> tuple[Any, float, Optional[int]]:
+        if path == ["cluster", "resources"]:
+            return [self._resource(vm=vm) for vm in self.vms.values()], API_CALL, None
+        if path == ["cluster", "nextid"]:
+            if "vmid" in params:
+                # like proxmox, a given id is only returned, if it is free
+                if int(params["vmid"]) in self.vms:
+                    raise Exception(
+                        f"400 Bad Request: VM {params['vmid']} already exists"
+                    )
+                return str(params["vmid"]), API_CALL, None
+            return str(max(self.vms.keys(), default=99) + 1), API_CALL, None
+        if path == ["cluster", "status"]:
+            return (
+                [
+                    {"type": "node", "name": node["node"], "ip": node["ip"]}
+                    for node in self.nodes_state.values()
+                ],
+                API_CALL,
+                None,
+            )
+        if path == ["nodes"]:
+            return list(self.nodes_state.values()), API_CALL, None
+        if path[0] == "storage":
+            if len(path) == 1:
+                return list(self.storages.values()), API_CALL, None
+            return self.storages.get(path[1], {}), API_CALL, None
+        if len(path) == 3 and path[0] == "nodes" and path[2] == "storage":
+            return list(self.storages.values()), API_CALL, None
+        if len(path) >= 3 and path[0] == "nodes" and path[2] == "tasks":
+            if len(path) == 3:
+                return self.tasks.get(path[1], []), API_CALL, None
+            return {"status": "stopped", "exitstatus": "OK"}, API_CALL, None
+        if len(path) >= 4 and path[0] == "nodes" and path[2] == "qemu":
+            return self._handle_vm(
+                method=method,
+                node=path[1],
+                vm_id=int(path[3]),
+                action=path[4:],
+                params=params,
+            )
+        return None, API_CALL, None
+
+    def _handle_vm(
+        self,
+        method: str,
+        node: str,
+        vm_id: int,
+        action: list[str],
+        params: dict[str, Any],
+    ) -> tuple[Any, float, Optional[int]]:
+        vm = self.vms.get(vm_id)
+        if vm is None:
+            raise Exception(f"500 Internal Server Error: vm {vm_id} does not exist")
+
+        if method == "DELETE" and not action:
+            del self.vms[vm_id]
+            return self._task(node=node, vm_id=vm_id, name="delete", params=params)
+        if action == ["config"]:
+            if method == "GET":
+                return dict(vm["config"]), API_CALL, vm_id
+            vm["config"].update(params)
+            for key in ("name", "tags"):
+                if key in params:
+                    vm[key] = params[key]
+            if method == "PUT":
+                return None, API_CALL, vm_id
+            return self._task(node=node, vm_id=vm_id, name="config", params=params)
+        if action == ["status", "current"]:
+            if vm_id in self.transitions:
+                state, estimate = self.transitions.pop(vm_id)
+                return {"status": state}, API_CALL + estimate, vm_id
+            return {"status": vm["status"]}, API_CALL, vm_id
+        if action == ["clone"]:
+            new_id = int(params["newid"])
+            self.vms[new_id] = {
+                "vmid": new_id,
+                "name": params.get("name", f"vm-{new_id}"),
+                "node": params.get("target", node),
+                "status": "stopped",
+                "template": 0,
+                "tags": "",
+                "config": dict(vm["config"]),
+            }
+            return self._task(node=node, vm_id=new_id, name="clone", params=params)
+        if action == ["migrate"]:
+            vm["node"] = params["target"]
+        elif action == ["template"]:
+            vm["template"] = 1
+        elif action == ["status", "start"]:
+            vm["status"] = "running"
+        elif action in (["status", "shutdown"], ["status", "stop"]):
+            vm["status"] = "stopped"
+            self.transitions[vm_id] = ("stopped", SHUTDOWN)
+        elif action == ["agent", "ping"]:
+            return {}, API_CALL, vm_id
+
+        if action and action[-1] in TASK_ACTIONS:
+            return self._task(node=node, vm_id=vm_id, name=action[-1], params=params)
+        return None, API_CALL, vm_id
+
+    def _task(
+        self, node: str, vm_id: int, name: str, params: dict[str, Any]
+    ) -> tuple[str, float, int]:
+        self._task_count += 1
+        start_time = int(time())
+        upid = (
+            f"UPID:{node}:{self._task_count:08X}:00000000:{start_time:08X}:"
+            f"qm{name}:{vm_id}:dry-run@pve:"
+        )
+        self.tasks.setdefault(node, []).append(
+            {
+                "upid": upid,
+                "status": "OK",
+                "starttime": start_time,
+                "endtime": start_time,
+            }
+        )
+        return upid, task_estimate(action=name, params=params), vm_id
+
+    @staticmethod
+    def _resource(vm: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "vmid": vm["vmid"],
+            "name": vm["name"],
+            "node": vm["node"],
+            "status": vm["status"],
+            "template": vm["template"],
+            "tags": vm["tags"],
+        }
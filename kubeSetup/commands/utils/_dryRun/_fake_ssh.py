@@ -0,0 +1,220 @@
+import io
+from typing import Any, Optional
+from ._plan import ExecutionPlan
+from ._estimates import SFTP_WRITE, command_estimate
+from .._setupUtils import SSHConnectionPool, PRECONFIGURED_MARKER
+from .._setupUtils._script import STEP_FUNCTION, STEP_MARKER, script_steps
+
+
+def _kubeadm_init_output(ip_address: str) -> str:
+    """Tail of the kubeadm init output, which contains the join commands."""
+    join = (
+        f"kubeadm join {ip_address}:6443 --token abcdef.0123456789abcdef \\\n"
+        f"\t--discovery-token-ca-cert-hash sha256:{'0' * 64}"
+    )
+    return (
+        "Your Kubernetes control-plane has initialized successfully!\n\n"
+        "You can now join any number of control-plane nodes running the following command on each as root:\n\n"
+        f"  {join} \\\n"
+        f"\t--control-plane --certificate-key {'1' * 64}\n\n"
+        "Then you can join any number of worker nodes by running the following on each as root:\n\n"
+        f"{join}\n"
+    )
+
+
+class _FakeChannel:
+    """Channel of a fake command, which finished at once with the given output."""
+
+    def __init__(
+        self, stdout: str = "", stderr: str = "", exit_status: int = 0
+    ) -> None:
+        self.stdout = io.BytesIO(stdout.encode())
+        self.stderr = io.BytesIO(stderr.encode())
+        self.exit_status = exit_status
+        self.closed = False
+
+    def recv_ready(self) -> bool:
+        return self.stdout.tell() < len(self.stdout.getbuffer())
+
+    def recv(self, size: int) -> bytes:
+        return self.stdout.read(size)
+
+    def recv_stderr_ready(self) -> bool:
+        return self.stderr.tell() < len(self.stderr.getbuffer())
+
+    def recv_stderr(self, size: int) -> bytes:
+        return self.stderr.read(size)
+
+    def recv_exit_status(self) -> int:
+        return self.exit_status
+
+    def exit_status_ready(self) -> bool:
+        return True
+
+
+class _FakeFile(io.BytesIO):
+    """Stdin, stdout and stderr of a fake command."""
+
+    def __init__(self, channel: _FakeChannel, content: bytes = b"") -> None:
+        super().__init__(content)
+        self.channel = channel
+
+    def readlines(self, hint: int = -1) -> list[str]:  # type: ignore[override]
+        # like paramiko, read returns bytes and readlines decoded lines
+        return [line.decode() for line in super().readlines(hint)]
+
+    def write(self, data: Any) -> int:
+        return len(data)
+
+
+def _fake_exec(
+    stdout: str = "", stderr: str = "", exit_status: int = 0
+) -> tuple[Any, Any, Any]:
+    # stdout and stderr can be read either as files or from the shared channel
+    channel = _FakeChannel(stdout=stdout, stderr=stderr, exit_status=exit_status)
+    return (
+        _FakeFile(channel=channel),
+        _FakeFile(channel=channel, content=stdout.encode()),
+        _FakeFile(channel=channel, content=stderr.encode()),
+    )
+
+
+class _FakeTransport:
+    def __init__(self, ip_address: str) -> None:
+        self.ip_address = ip_address
+
+    def getpeername(self) -> tuple[str, int]:
+        return self.ip_address, 22
+
+    def is_active(self) -> bool:
+        return True
+
+    def set_keepalive(self, interval: int) -> None:
+        pass
+
+
+class _FakeRemoteFile(io.StringIO):
+    def __init__(self, plan: ExecutionPlan, target: str, path: str, vm: str) -> None:
+        super().__init__()
+        self.plan = plan
+        self.target = target
+        self.path = path
+        self.vm = vm
+
+    def close(self) -> None:
+        if not self.closed:
+            self.plan.record(
+                kind="sftp",
+                target=self.target,
+                action=f"write {self.path} ({len(self.getvalue())} bytes)",
+                estimate=SFTP_WRITE,
+                vm=self.vm,
+            )
+        super().close()
+
+
+class _FakeSFTPClient:
+    def __init__(self, plan: ExecutionPlan, target: str, vm: str) -> None:
+        self.plan = plan
+        self.target = target
+        self.vm = vm
+        self.channel = _FakeChannel()
+
+    def get_channel(self) -> _FakeChannel:
+        return self.channel
+
+    def open(self, path: str, mode: str = "r") -> _FakeRemoteFile:
+        return _FakeRemoteFile(
+            plan=self.plan, target=self.target, path=path, vm=self.vm
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class FakeSSHClient:
+    """Answers the remote commands of the setup with canned outputs and records them."""
+
+    def __init__(
+        self, plan: ExecutionPlan, ip_address: str, user: Optional[str], vm: str
+    ) -> None:
+        self.plan = plan
+        self.ip_address = ip_address
+        self.user = user or "root"
+        self.vm = vm
+
+    def exec_command(self, command: str, **kwargs: Any) -> tuple[Any, Any, Any]:
+        if STEP_FUNCTION in command:
+            return _fake_exec(stdout=self._run_script(script=command))
+        self.plan.record(
+            kind="ssh",
+            target=self.ip_address,
+            action=command,
+            estimate=command_estimate(cmd=command),
+            vm=self.vm,
+        )
+        return _fake_exec(stdout=self._output(command=command))
+
+    def get_transport(self) -> _FakeTransport:
+        return _FakeTransport(ip_address=self.ip_address)
+
+    def open_sftp(self) -> _FakeSFTPClient:
+        return _FakeSFTPClient(plan=self.plan, target=self.ip_address, vm=self.vm)
+
+    def close(self) -> None:
+        pass
+
+    def _run_script(self, script: str) -> str:
+        """Every step of a bundled script succeeds after its estimated duration."""
+        output = []
+        for index, step in enumerate(script_steps(script=script)):
+            estimate = command_estimate(cmd=step)
+            self.plan.record(
+                kind="script",
+                target=self.ip_address,
+                action=step,
+                estimate=estimate,
+                vm=self.vm,
+            )
+            output.append(
+                f"{STEP_MARKER}-start {index}\n{self._output(command=step)}\n"
+                f"{STEP_MARKER}-end {index} 0 {int(estimate * 1000)}\n"
+            )
+        return "".join(output)
+
+    def _output(self, command: str) -> str:
+        if command == "pwd":
+            return f"/home/{self.user}\n"
+        if "kubeadm init" in command:
+            return _kubeadm_init_output(ip_address=self.ip_address)
+        if "kubeadm token create --print-join-command" in command:
+            return f"kubeadm join {self.ip_address}:6443 --token abcdef.0123456789abcdef --discovery-token-ca-cert-hash sha256:{'0' * 64}\n"
+        if "kubeadm config images list" in command:
+            return "".join(
+                f"registry.k8s.io/{image}\n"
+                for image in ("kube-apiserver:v1.32.0", "pause:3.10", "etcd:3.5.16-0")
+            )
+        if "cloud-init status" in command:
+            return "status: done\n"
+        if f"cat {PRECONFIGURED_MARKER}" in command:
+            return "done\n"
+        return ""
+
+
+class FakeSSHConnectionPool(SSHConnectionPool):
+    """Connection pool, which hands out fake clients instead of connecting to the vms."""
+
+    def __init__(self, plan: ExecutionPlan, hosts: dict[str, str]) -> None:
+        super().__init__()
+        self.plan = plan
+        self.hosts = hosts
+
+    def create_connection(  # type: ignore[override]
+        self, ip_address: str, user: Optional[str], ssh_key: Optional[str]
+    ) -> FakeSSHClient:
+        return FakeSSHClient(
+            plan=self.plan,
+            ip_address=ip_address,
+            user=user,
+            vm=self.hosts.get(ip_address, ip_address),
+        )
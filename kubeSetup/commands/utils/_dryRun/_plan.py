@@ -0,0 +1,136 @@
+import logging
+import threading
+from typing import Iterator, Optional, Sequence
+from contextlib import contextmanager
+from time import perf_counter
+from ._schemas import PlanEntry, PhaseSummary
+
+
+class ExecutionPlan:
+    """
+    Splits a run into sequential phases and measures how long every phase took. In a dry run,
+    the fakes record every api call and remote command with an estimated duration as well.
+    Entries of one lane run one after another, different lanes run in parallel, so the estimate
+    of a phase is the duration of its longest lane. The entries of a task graph also wait for the
+    tasks, their task needs, so the estimate of the graph is its critical path.
+    """
+
+    def __init__(self, logger: logging.Logger) -> None:
+        self.logger = logger
+        self.phases: list[PhaseSummary] = []
+        self._phase: Optional[PhaseSummary] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # the task, every vm currently works on
+        self._tasks: dict[str, str] = {}
+        self._task_vms: dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        summary = PhaseSummary(name=name)
+        with self._lock:
+            self.phases.append(summary)
+            self._phase = summary
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            summary.measured = perf_counter() - start_time
+            with self._lock:
+                self._phase = None
+
+    @contextmanager
+    def task(
+        self, name: str, needs: Sequence[str] = (), vms: Sequence[str] = ()
+    ) -> Iterator[None]:
+        """
+        Marks the steps of the current thread and of the vms as steps of the task. The vms work
+        on one task at a time, so the steps of the threads, which the task starts, are found too.
+        """
+        with self._lock:
+            if self._phase is not None:
+                self._phase.needs[name] = list(needs)
+            self._tasks.update({vm: name for vm in vms})
+            self._task_vms[name] = len(vms)
+        self._local.task = name
+        try:
+            yield
+        finally:
+            self._local.task = None
+            with self._lock:
+                for vm in vms:
+                    if self._tasks.get(vm) == name:
+                        del self._tasks[vm]
+
+    def record(
+        self,
+        kind: str,
+        target: str,
+        action: str,
+        estimate: float,
+        vm: Optional[str] = None,
+        lane: Optional[str] = None,
+    ) -> None:
+        """
+        Records a step of the vm, which is waited for by the current thread. Proxmox tasks pass
+        their own lane, as the thread which starts them does not necessarily wait for them.
+        """
+        with self._lock:
+            task = self._tasks.get(vm or "") or getattr(self._local, "task", None)
+            # the vms of a task, which works on several of them, run in parallel
+            if task is not None and not lane:
+                lane = (
+                    task
+                    if self._task_vms.get(task, 0) < 2 or not vm
+                    else f"{task} {vm}"
+                )
+        entry = PlanEntry(
+            kind=kind,
+            target=target,
+            action=action,
+            estimate=estimate,
+            lane=lane or self._lane(vm=vm),
+            task=task,
+            vm=vm,
+        )
+        with self._lock:
+            if self._phase is None:
+                self._phase = PhaseSummary(name="other")
+                self.phases.append(self._phase)
+            self._phase.entries.append(entry)
+
+    def _lane(self, vm: Optional[str]) -> str:
+        """
+        The main thread works through its steps one after another. The worker threads of a pool
+        work on different vms in parallel, so their steps are laned by the vm, they belong to.
+        """
+        thread = threading.current_thread()
+        if thread is threading.main_thread():
+            return thread.name
+        if vm is None:
+            return str(getattr(self._local, "lane", thread.name))
+        self._local.lane = vm
+        return vm
+
+    def report(self, detailed: bool) -> None:
+        """Logs the duration of every phase and in detail every recorded entry."""
+        total_estimate = 0.0
+        total_measured = 0.0
+        for phase in self.phases:
+            if detailed:
+                self.logger.info(f"Phase {phase.name}:")
+                for entry in phase.entries:
+                    self.logger.info(
+                        f"  [{entry.lane}] {entry.kind} {entry.target}: {entry.action} "
+                        f"(~{entry.estimate:.1f}s)"
+                    )
+            self.logger.info(
+                f"Phase {phase.name}: estimated {phase.estimate():.0f}s, "
+                f"measured {phase.measured:.1f}s, {len(phase.entries)} steps"
+            )
+            total_estimate += phase.estimate()
+            total_measured += phase.measured
+        self.logger.info(
+            f"Total: estimated {total_estimate:.0f}s ({total_estimate / 60:.1f} min), "
+            f"measured {total_measured:.1f}s"
+        )
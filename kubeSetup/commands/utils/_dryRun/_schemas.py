@@ -0,0 +1,60 @@
+from typing import Optional
+from dataclasses import dataclass, field
+
+
+@dataclass
+class PlanEntry:
+    kind: str
+    target: str
+    action: str
+    # seconds
+    estimate: float
+    lane: str
+    # the task of a task graph and the vm, the entry belongs to
+    task: Optional[str] = None
+    vm: Optional[str] = None
+
+
+@dataclass
+class PhaseSummary:
+    name: str
+    entries: list[PlanEntry] = field(default_factory=list)
+    # seconds
+    measured: float = 0.0
+    # the tasks, every task of a task graph waits for
+    needs: dict[str, list[str]] = field(default_factory=dict)
+
+    def estimate(self) -> float:
+        """
+        Replays the entries in the order they were recorded. An entry starts, once its lane is free,
+        an entry of a task also waits for the tasks it needs and for the previous step of its vm
+        within the task.
+        """
+        lanes: dict[str, float] = {}
+        chains: dict[tuple[str, Optional[str]], float] = {}
+        tasks: dict[str, float] = {}
+        ready: dict[str, float] = {}
+
+        def start_of(task: str) -> float:
+            return max((finish(need) for need in self.needs.get(task, [])), default=0.0)
+
+        def finish(task: str) -> float:
+            return max(tasks.get(task, 0.0), ready.get(task) or start_of(task))
+
+        for entry in self.entries:
+            start = lanes.get(entry.lane, 0.0)
+            if entry.task is not None:
+                if entry.task not in ready:
+                    ready[entry.task] = start_of(entry.task)
+                start = max(
+                    start,
+                    chains.get((entry.task, entry.vm), ready[entry.task]),
+                )
+            end = start + entry.estimate
+            lanes[entry.lane] = end
+            if entry.task is not None:
+                chains[(entry.task, entry.vm)] = end
+                tasks[entry.task] = max(tasks.get(entry.task, 0.0), end)
+        return max(
+            [*lanes.values(), *(finish(task) for task in self.needs)], default=0.0
+        )
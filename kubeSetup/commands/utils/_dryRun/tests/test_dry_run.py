@@ -0,0 +1,83 @@
+import logging
+from kubeSetup.commands.utils import (
+    DryRun,
+    ExecutionPlan,
+    PreconfigureCluster,
+    ProxmoxCommands,
+    ProxmoxConnection,
+    SimpleVmConf,
+    VmType,
+)
+
+logger = logging.getLogger("test")
+
+
+def _vm(vm_id, vm_type, ip_address):
+    return SimpleVmConf(
+        vm_name=f"vm-{vm_id}",
+        vm_type=vm_type,
+        target_name="pve",
+        vm_id=vm_id,
+        tags="kubernetes",
+        clone_type=1,
+        ip_address=ip_address,
+        ip_gw="10.10.10.1",
+        user="tom",
+        ssh_key="/not/needed",
+        pw="secret",
+    )
+
+
+def test_phase_estimate_is_the_longest_lane():
+    plan = ExecutionPlan(logger=logger)
+    with plan.phase("clone"):
+        plan.record(kind="task", target="pve", action="a", estimate=10, lane="a")
+        plan.record(kind="task", target="pve", action="b", estimate=5, lane="a")
+        plan.record(kind="task", target="pve", action="c", estimate=12, lane="b")
+    assert plan.phases[0].estimate() == 15
+
+
+def test_dry_run_plans_the_clone_and_preconfiguration():
+    vms = [
+        _vm(101, VmType.MASTER, "10.10.10.11"),
+        _vm(102, VmType.WORKER, "10.10.10.12"),
+    ]
+    proxmox_conf = ProxmoxConnection(
+        proxmox_user="root@pam",
+        url="pve.local",
+        token_name="kube",
+        token="secret",
+        ssl_verify=False,
+        template_id=900,
+    )
+    plan = ExecutionPlan(logger=logger)
+    dry = DryRun(proxmox_conf=proxmox_conf, vm_infos=vms, plan=plan)
+
+    with dry.simulate():
+        proxmox = ProxmoxCommands(
+            proxmox_conf=proxmox_conf,
+            logger=logger,
+            api=dry.api,
+            ssh_check=dry.ssh_reachable,
+        )
+        with plan.phase("clone"):
+            proxmox.clone_vm(vm_infos=vms)
+        with plan.phase("preconfigure"):
+            PreconfigureCluster(
+                vm_infos=vms, logger=logger, kube_version="1.32"
+            ).preconfigure_vms(ssh_pool_manager=dry.ssh_pool())
+
+    assert {101, 102} <= set(dry.api.vms.keys())
+    assert dry.api.vms[101]["status"] == "running"
+    clone, preconfigure = plan.phases
+    assert any("/clone" in entry.action for entry in clone.entries)
+    # the steps wait for explicit conditions, not for fixed sleeps
+    assert any("is-active" in entry.action for entry in preconfigure.entries)
+    assert not any(entry.kind == "sleep" for entry in preconfigure.entries)
+    # the clones share one storage, the vms are preconfigured at the same time
+    assert clone.estimate() >= 360
+    lanes = {entry.lane for entry in preconfigure.entries}
+    assert {"vm-101", "vm-102"} <= lanes
+    assert preconfigure.estimate() < sum(
+        entry.estimate for entry in preconfigure.entries
+    )
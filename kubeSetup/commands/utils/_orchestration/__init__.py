@@ -0,0 +1,6 @@
+__all__ = ["TaskGraph", "GraphTask", "ClusterBuild"]
+
+
+from ._graph import TaskGraph
+from ._schemas import GraphTask
+from ._build import ClusterBuild
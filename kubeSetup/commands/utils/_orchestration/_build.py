@@ -0,0 +1,268 @@
+import logging
+from functools import partial
+from typing import Callable, Optional, Sequence
+from ._graph import TaskGraph
+from .._setup import SimpleVmConf, ComplexVmConf, VmType
+from .._checkpoint import BuildState, BuildPhase
+from .._dryRun import ExecutionPlan
+from .._proxmox import ProxmoxCommands
+from .._setupUtils import PreconfigureCluster, SSHConnectionPool
+from .._clusterSetup import ClusterSetup, ClusterType, ImageDistribution
+from .._complexCluster import KeepaLivedSetup, HAProxySetup
+
+
+class ClusterBuild:
+    """
+    Builds a cluster as a graph of per vm tasks. Every vm is cloned, booted and preconfigured on
+    its own, the cluster is initialized, as soon as the first master is ready, and every other
+    node joins, as soon as it is ready itself. So the build takes about as long as its longest
+    chain of tasks, instead of the slowest vm of every phase added up.
+    The steps are added in the order of the build, every task follows the last task of its vms.
+    """
+
+    def __init__(
+        self,
+        vm_infos: Sequence[SimpleVmConf | ComplexVmConf],
+        preconf: PreconfigureCluster,
+        logger: logging.Logger,
+        ssh_pool_manager: SSHConnectionPool,
+        state: BuildState,
+        plan: Optional[ExecutionPlan] = None,
+        max_parallel: int = 10,
+    ) -> None:
+        self.vm_infos = list(vm_infos)
+        self.preconf = preconf
+        self.logger = logger
+        self.ssh_pool_manager = ssh_pool_manager
+        self.state = state
+        self.graph = TaskGraph(logger=logger, plan=plan)
+        self.graph.limit(group="preconfigure", max_parallel=max_parallel)
+        # the last task of every vm
+        self._last: dict[int, str] = {}
+        # the tasks, which the init of the cluster waits for besides the first master
+        self._before_init: list[str] = []
+        # the join commands of the masters and the workers, once the cluster is initialized
+        self._kubeadm_cmds: dict[VmType, Optional[str]] = {}
+
+    def _add_vm_task(
+        self,
+        vm: SimpleVmConf | ComplexVmConf,
+        step: str,
+        run: Callable[[], object],
+        needs: Sequence[str] = (),
+        group: Optional[str] = None,
+    ) -> None:
+        name = f"{step}:{vm.vm_name}"
+        self.graph.add(
+            name=name,
+            run=run,
+            needs=[*([self._last[vm.vm_id]] if vm.vm_id in self._last else []), *needs],
+            vms=[vm.vm_name],
+            group=group,
+        )
+        self._last[vm.vm_id] = name
+
+    def _nodes(self) -> list[SimpleVmConf | ComplexVmConf]:
+        return [vm for vm in self.vm_infos if vm.vm_type != VmType.LOADBALANCER]
+
+    def clone(
+        self,
+        proxmox: ProxmoxCommands,
+        cicustom: Optional[dict[int, str]] = None,
+        first_boot: bool = False,
+    ) -> None:
+        """
+        Clones, configures and starts every vm and restarts it, once it booted. With first_boot
+        it only waits for the first boot, as cloud-init configures the vm during it.
+        """
+        # the masters are cloned first, as the init of the cluster waits for the first one
+        for vm in sorted(self.vm_infos, key=lambda vm: vm.vm_type != VmType.MASTER):
+            self._add_vm_task(
+                vm=vm,
+                step="clone",
+                run=partial(
+                    proxmox.clone_single_vm,
+                    vm=vm,
+                    cicustom=(cicustom or {}).get(vm.vm_id),
+                ),
+            )
+            self._add_vm_task(
+                vm=vm,
+                step="boot",
+                run=(
+                    partial(proxmox.wait_for_boot, vm_infos=[vm])
+                    if first_boot
+                    else partial(
+                        proxmox.make_required_restarts,
+                        vm_infos=[vm],
+                        ssh_pool_manager=self.ssh_pool_manager,
+                    )
+                ),
+            )
+
+    def load_balancers(self, vm_infos: list[ComplexVmConf]) -> None:
+        """
+        Sets up keepalived and haproxy on the load balancers next to the preconfiguration of the
+        other vms, the cluster is initialized, once its endpoint is up.
+        """
+        balancers = [vm for vm in vm_infos if vm.vm_type == VmType.LOADBALANCER]
+        if not balancers:
+            return
+
+        def setup() -> None:
+            KeepaLivedSetup(vm_infos=vm_infos, logger=self.logger).configure_keepalived(
+                ssh_pool_manager=self.ssh_pool_manager
+            )
+            HAProxySetup(vm_infos=vm_infos, logger=self.logger).configure_haproxy(
+                ssh_pool_manager=self.ssh_pool_manager
+            )
+
+        self.graph.add(
+            name="load balancers",
+            run=setup,
+            needs=[self._last[vm.vm_id] for vm in balancers if vm.vm_id in self._last],
+            vms=[vm.vm_name for vm in balancers],
+        )
+        for vm in balancers:
+            self._last[vm.vm_id] = "load balancers"
+        self._before_init.append("load balancers")
+
+    def preconfigure(self, provisioning: str = "ssh") -> None:
+        """
+        Preconfigures every vm via SSH, at most max_parallel at a time, through the apt cache,
+        once it is set up. With the provisioning cloud-init it waits for cloud-init instead and
+        with image the vms are already preconfigured by their golden image.
+        """
+        needs: list[str] = []
+        if provisioning == "ssh" and self.preconf.apt_cache:
+            cache_vm = next(
+                (vm for vm in self.vm_infos if vm.vm_name == self.preconf.apt_cache),
+                None,
+            )
+            self.graph.add(
+                name="apt cache",
+                run=partial(
+                    self.preconf.prepare_apt_cache,
+                    ssh_pool_manager=self.ssh_pool_manager,
+                ),
+                needs=(
+                    [self._last[cache_vm.vm_id]]
+                    if cache_vm is not None and cache_vm.vm_id in self._last
+                    else []
+                ),
+                vms=[cache_vm.vm_name] if cache_vm is not None else [],
+            )
+            needs.append("apt cache")
+
+        for vm in self._nodes():
+            if provisioning == "image":
+                run = partial(self.state.done, vm=vm, phase=BuildPhase.PRECONFIGURE)
+            elif provisioning == "cloud-init":
+                run = partial(
+                    self.preconf.wait_for_cloud_init_vm,
+                    vm=vm,
+                    ssh_pool_manager=self.ssh_pool_manager,
+                )
+            else:
+                run = partial(
+                    self.preconf.preconfigure_vm,
+                    vm=vm,
+                    ssh_pool_manager=self.ssh_pool_manager,
+                )
+            self._add_vm_task(
+                vm=vm,
+                step="preconfigure",
+                run=run,
+                needs=needs,
+                group="preconfigure" if provisioning == "ssh" else None,
+            )
+
+    def distribute_images(self, distribution: ImageDistribution) -> None:
+        """
+        Pulls the images on the first master, once it is preconfigured, and passes them on to the
+        other vms, once all of them are preconfigured. The init only waits for the pull.
+        """
+        nodes = self._nodes()
+        seed = distribution.seed()
+        if seed is None:
+            return
+        self._add_vm_task(
+            vm=seed,
+            step="images",
+            run=partial(distribution.pull, ssh_pool_manager=self.ssh_pool_manager),
+        )
+        self.graph.add(
+            name="image distribution",
+            run=partial(distribution.spread, ssh_pool_manager=self.ssh_pool_manager),
+            needs=[self._last[vm.vm_id] for vm in nodes if vm.vm_id in self._last],
+            vms=[vm.vm_name for vm in nodes if vm is not seed],
+        )
+        for vm in nodes:
+            if vm is not seed:
+                self._last[vm.vm_id] = "image distribution"
+
+    def setup_cluster(
+        self, cluster_type: ClusterType, control_plane_endpoint: Optional[str] = None
+    ) -> None:
+        """
+        Initializes the cluster on the first master, every other node joins right after its own
+        preconfiguration, once the cluster is initialized. The workers join in parallel, the other
+        masters one after another, each once the master before it joined.
+        """
+        group_vms = {
+            vm_type.name: [vm for vm in self._nodes() if vm.vm_type == vm_type]
+            for vm_type in (VmType.MASTER, VmType.WORKER)
+        }
+        master_vm = group_vms[VmType.MASTER.name][0]
+
+        def init() -> None:
+            (
+                self._kubeadm_cmds[VmType.MASTER],
+                self._kubeadm_cmds[VmType.WORKER],
+            ) = ClusterSetup.init_cluster(
+                group_vms=group_vms,
+                cluster_type=cluster_type,
+                logger=self.logger,
+                ssh_pool_manager=self.ssh_pool_manager,
+                control_plane_endpoint=control_plane_endpoint,
+                state=self.state,
+            )
+
+        self._add_vm_task(vm=master_vm, step="init", run=init, needs=self._before_init)
+
+        def join(vm: SimpleVmConf | ComplexVmConf) -> None:
+            kubeadm_cmd = self._kubeadm_cmds[vm.vm_type]
+            # only the masters of a complex cluster join the control plane
+            if not kubeadm_cmd:
+                return
+            ClusterSetup.join_node(
+                vm=vm,
+                master_vm=master_vm,
+                kubeadm_cmd=kubeadm_cmd,
+                logger=self.logger,
+                ssh_pool_manager=self.ssh_pool_manager,
+                state=self.state,
+            )
+
+        # stacked etcd grows by one member at a time, so the masters join one after another
+        control_plane = f"init:{master_vm.vm_name}"
+        for vm in self._nodes():
+            if vm is master_vm:
+                continue
+            self._add_vm_task(
+                vm=vm,
+                step="join",
+                run=partial(join, vm=vm),
+                needs=[
+                    (
+                        control_plane
+                        if vm.vm_type == VmType.MASTER
+                        else f"init:{master_vm.vm_name}"
+                    )
+                ],
+            )
+            if vm.vm_type == VmType.MASTER:
+                control_plane = f"join:{vm.vm_name}"
+
+    def run(self) -> None:
+        self.graph.run()
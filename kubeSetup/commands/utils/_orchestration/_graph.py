@@ -0,0 +1,115 @@
+import logging
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from ._schemas import GraphTask
+from .._dryRun import ExecutionPlan
+
+
+class TaskGraph:
+    """
+    Runs every task, as soon as the tasks, it needs, are done. There are no barriers between the
+    phases of a build, so a vm starts its next task, while other vms are still busy with earlier
+    ones. A failing task does not stop the others, only the tasks, which need it, are skipped.
+    All failures are reported together, once nothing can run anymore.
+    """
+
+    def __init__(
+        self, logger: logging.Logger, plan: Optional[ExecutionPlan] = None
+    ) -> None:
+        self.logger = logger
+        self.plan = plan
+        self.tasks: dict[str, GraphTask] = {}
+        self._limits: dict[str, int] = {}
+
+    def add(
+        self,
+        name: str,
+        run: Callable[[], object],
+        needs: Sequence[str] = (),
+        vms: Sequence[str] = (),
+        group: Optional[str] = None,
+    ) -> None:
+        """Adds a task, the tasks it needs are added before, so the graph can't have a cycle."""
+        if name in self.tasks:
+            raise Exception(f"The task {name} is already in the graph!")
+        unknown = [need for need in needs if need not in self.tasks]
+        if unknown:
+            raise Exception(
+                f"The task {name} needs the unknown tasks {', '.join(unknown)}!"
+            )
+        self.tasks[name] = GraphTask(
+            name=name, run=run, needs=list(needs), vms=list(vms), group=group
+        )
+
+    def limit(self, group: str, max_parallel: int) -> None:
+        """At most max_parallel tasks of the group run at the same time."""
+        self._limits[group] = max(1, max_parallel)
+
+    def run(self) -> None:
+        if not self.tasks:
+            return
+
+        waiting = {
+            name: set(task.needs) for name, task in self.tasks.items() if task.needs
+        }
+        ready = [task for task in self.tasks.values() if not task.needs]
+        order = list(self.tasks)
+        running: dict[Future[None], GraphTask] = {}
+        failed: dict[str, BaseException] = {}
+
+        def release(name: str) -> None:
+            for other, needs in list(waiting.items()):
+                needs.discard(name)
+                if not needs:
+                    ready.append(self.tasks[other])
+                    del waiting[other]
+
+        def busy(group: Optional[str]) -> bool:
+            if group not in self._limits:
+                return False
+            return (
+                sum(task.group == group for task in running.values())
+                >= self._limits[group]
+            )
+
+        # the threads only wait on their own work, the limits are kept by the scheduler
+        with ThreadPoolExecutor(
+            max_workers=len(self.tasks), thread_name_prefix="task"
+        ) as executor:
+            while ready or running:
+                # the ready tasks start in the order, they were added
+                for task in sorted(ready, key=lambda task: order.index(task.name)):
+                    if not busy(group=task.group):
+                        ready.remove(task)
+                        running[executor.submit(self._run_task, task)] = task
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        release(name=task.name)
+                    else:
+                        self.logger.error(f"Task {task.name} failed: {error}")
+                        failed[f"{task.name}: {error}"] = error
+
+        if waiting:
+            self.logger.error(
+                f"Skipped the tasks {', '.join(waiting)}, as a task they need failed"
+            )
+        if failed:
+            raise Exception(
+                "The build failed on:\n"
+                + "\n".join(f"  - {task}" for task in failed.keys())
+            )
+
+    def _run_task(self, task: GraphTask) -> None:
+        # a dry run plans the steps of the task against the tasks it needs
+        context: ContextManager[None] = (
+            self.plan.task(name=task.name, needs=task.needs, vms=task.vms)
+            if self.plan
+            else nullcontext()
+        )
+        with context:
+            task.run()
@@ -0,0 +1,14 @@
+from typing import Callable, Optional
+from dataclasses import dataclass, field
+
+
+@dataclass
+class GraphTask:
+    name: str
+    run: Callable[[], object]
+    # the tasks, which must be done, before the task starts
+    needs: list[str] = field(default_factory=list)
+    # the vms, the task works on
+    vms: list[str] = field(default_factory=list)
+    # the tasks of a group share the limit of the group
+    group: Optional[str] = None
@@ -0,0 +1,208 @@
+import logging
+import threading
+import pytest
+from kubeSetup.commands.utils import (
+    BuildPhase,
+    BuildState,
+    ClusterBuild,
+    ClusterType,
+    ExecutionPlan,
+    PreconfigureCluster,
+    SimpleVmConf,
+    TaskGraph,
+    VmType,
+)
+from kubeSetup.commands.utils._dryRun._fake_ssh import FakeSSHConnectionPool
+
+logger = logging.getLogger("test")
+
+
+def test_a_task_runs_as_soon_as_its_needs_are_done():
+    graph = TaskGraph(logger=logger)
+    slow_started = threading.Event()
+    release_slow = threading.Event()
+    order: list[str] = []
+
+    def slow() -> None:
+        slow_started.set()
+        # the fast chain finishes, while the slow vm is still busy
+        assert release_slow.wait(timeout=5)
+        order.append("clone:vm-2")
+
+    graph.add(name="clone:vm-1", run=lambda: order.append("clone:vm-1"))
+    graph.add(name="clone:vm-2", run=slow)
+    graph.add(
+        name="preconfigure:vm-1",
+        run=lambda: (order.append("preconfigure:vm-1"), release_slow.set()),
+        needs=["clone:vm-1"],
+    )
+    graph.add(
+        name="join:vm-2",
+        run=lambda: order.append("join:vm-2"),
+        needs=["clone:vm-2", "preconfigure:vm-1"],
+    )
+    graph.run()
+
+    assert slow_started.is_set()
+    assert order == ["clone:vm-1", "preconfigure:vm-1", "clone:vm-2", "join:vm-2"]
+
+
+def test_a_failed_task_only_skips_the_tasks_which_need_it():
+    graph = TaskGraph(logger=logger)
+    ran: list[str] = []
+
+    def fail() -> None:
+        raise Exception("clone timed out")
+
+    graph.add(name="clone:vm-1", run=fail)
+    graph.add(name="clone:vm-2", run=lambda: ran.append("clone:vm-2"))
+    graph.add(
+        name="boot:vm-1", run=lambda: ran.append("boot:vm-1"), needs=["clone:vm-1"]
+    )
+    graph.add(
+        name="boot:vm-2", run=lambda: ran.append("boot:vm-2"), needs=["clone:vm-2"]
+    )
+
+    with pytest.raises(Exception, match="clone:vm-1: clone timed out"):
+        graph.run()
+    assert ran == ["clone:vm-2", "boot:vm-2"]
+
+    with pytest.raises(Exception, match="unknown tasks"):
+        graph.add(name="join:vm-1", run=lambda: None, needs=["init"])
+
+
+def test_the_tasks_of_a_group_keep_its_limit():
+    graph = TaskGraph(logger=logger)
+    graph.limit(group="preconfigure", max_parallel=2)
+    lock = threading.Lock()
+    running = [0]
+    most = [0]
+
+    def preconfigure() -> None:
+        with lock:
+            running[0] += 1
+            most[0] = max(most[0], running[0])
+        threading.Event().wait(timeout=0.05)
+        with lock:
+            running[0] -= 1
+
+    for vm_id in range(5):
+        graph.add(
+            name=f"preconfigure:vm-{vm_id}", run=preconfigure, group="preconfigure"
+        )
+    graph.run()
+    assert most[0] == 2
+
+
+def test_the_estimate_of_a_graph_is_its_critical_path():
+    plan = ExecutionPlan(logger=logger)
+    graph = TaskGraph(logger=logger, plan=plan)
+
+    def step(vm: str, estimate: float):
+        return lambda: plan.record(
+            kind="ssh", target=vm, action="step", estimate=estimate, vm=vm
+        )
+
+    graph.add(name="preconfigure:m1", run=step(vm="m1", estimate=50), vms=["m1"])
+    graph.add(name="preconfigure:w1", run=step(vm="w1", estimate=100), vms=["w1"])
+    graph.add(
+        name="init:m1",
+        run=step(vm="m1", estimate=30),
+        needs=["preconfigure:m1"],
+        vms=["m1"],
+    )
+    graph.add(
+        name="join:w1",
+        run=step(vm="w1", estimate=10),
+        needs=["preconfigure:w1", "init:m1"],
+        vms=["w1"],
+    )
+    with plan.phase("build"):
+        graph.run()
+
+    # the init overlaps the preconfiguration of the worker, barriers would take 100 + 30 + 10
+    assert plan.phases[0].estimate() == 110
+    assert {entry.lane for entry in plan.phases[0].entries} == {
+        "preconfigure:m1",
+        "preconfigure:w1",
+        "init:m1",
+        "join:w1",
+    }
+
+
+def _vm(vm_id, vm_type=VmType.WORKER):
+    return SimpleVmConf(
+        vm_name=f"vm-{vm_id}",
+        vm_type=vm_type,
+        target_name="pve",
+        vm_id=vm_id,
+        tags="kubernetes",
+        clone_type=1,
+        ip_address=f"10.10.10.{vm_id - 90}",
+        ip_gw="10.10.10.1",
+        user="tom",
+        ssh_key="/not/needed",
+        pw="secret",
+    )
+
+
+def test_every_node_joins_right_after_its_own_preconfiguration():
+    master, worker = _vm(101, VmType.MASTER), _vm(102)
+    plan = ExecutionPlan(logger=logger)
+    state = BuildState(logger=logger)
+    build = ClusterBuild(
+        vm_infos=[master, worker],
+        preconf=PreconfigureCluster(
+            vm_infos=[master, worker], logger=logger, kube_version="1.30", state=state
+        ),
+        logger=logger,
+        ssh_pool_manager=FakeSSHConnectionPool(
+            plan=plan, hosts={vm.ip_address: vm.vm_name for vm in (master, worker)}
+        ),
+        state=state,
+        plan=plan,
+    )
+    build.preconfigure(provisioning="image")
+    build.setup_cluster(cluster_type=ClusterType.SIMPLE)
+    with plan.phase("build"):
+        build.run()
+
+    assert plan.phases[0].needs["join:vm-102"] == [
+        "preconfigure:vm-102",
+        "init:vm-101",
+    ]
+    joins = [
+        entry for entry in plan.phases[0].entries if "kubeadm join" in entry.action
+    ]
+    assert [(entry.target, entry.task) for entry in joins] == [
+        (worker.ip_address, "join:vm-102")
+    ]
+    assert state.pending(vm_infos=[master, worker], phase=BuildPhase.JOIN) == []
+
+
+def test_the_masters_join_one_after_another():
+    masters = [_vm(vm_id, VmType.MASTER) for vm_id in (101, 102, 103)]
+    workers = [_vm(104), _vm(105)]
+    state = BuildState(logger=logger)
+    build = ClusterBuild(
+        vm_infos=[*masters, *workers],
+        preconf=PreconfigureCluster(
+            vm_infos=[*masters, *workers],
+            logger=logger,
+            kube_version="1.30",
+            state=state,
+        ),
+        logger=logger,
+        ssh_pool_manager=FakeSSHConnectionPool(
+            plan=ExecutionPlan(logger=logger), hosts={}
+        ),
+        state=state,
+    )
+    build.preconfigure(provisioning="image")
+    build.setup_cluster(cluster_type=ClusterType.COMPLEX)
+
+    needs = {name: task.needs for name, task in build.graph.tasks.items()}
+    assert needs["join:vm-102"] == ["preconfigure:vm-102", "init:vm-101"]
+    assert needs["join:vm-103"] == ["preconfigure:vm-103", "join:vm-102"]
+    assert needs["join:vm-104"] == ["preconfigure:vm-104", "init:vm-101"]
+    assert needs["join:vm-105"] == ["preconfigure:vm-105", "init:vm-101"]
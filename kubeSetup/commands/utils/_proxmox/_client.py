@@ -0,0 +1,168 @@
+import re
+import random
+import logging
+import threading
+from typing import Any, Optional
+from urllib.parse import urlparse
+from time import sleep, perf_counter
+from proxmoxer import ProxmoxAPI  # type: ignore
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectTimeout, ReadTimeout, ConnectionError
+from .._setup import ProxmoxConnection
+
+
+class TokenBucket:
+    """Token bucket rate limiter, which blocks the caller until a token is available."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        self.rate = rate
+        self.capacity = float(burst or max(1, int(rate)))
+        self._tokens = self.capacity
+        self._last = perf_counter()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = perf_counter()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            sleep(wait_time)
+
+
+class ApiStats:
+    """Latency counters per api endpoint."""
+
+    def __init__(self) -> None:
+        self._stats: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, latency: float, failed: bool) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(
+                endpoint, {"calls": 0, "errors": 0, "total": 0.0, "max": 0.0}
+            )
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["total"] += latency
+            stats["max"] = max(stats["max"], latency)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+
+    def log(self, logger: logging.Logger) -> None:
+        for endpoint, stats in sorted(
+            self.snapshot().items(), key=lambda item: -item[1]["total"]
+        ):
+            logger.info(
+                f"{endpoint}: {stats['calls']:.0f} calls, {stats['errors']:.0f} errors, "
+                f"avg {stats['total'] / stats['calls'] * 1000:.0f}ms, "
+                f"max {stats['max'] * 1000:.0f}ms"
+            )
+
+    @staticmethod
+    def endpoint(method: str, url: str) -> str:
+        """Replaces the ids in the path, so the calls of all vms share one counter."""
+        path = urlparse(url).path.split("/api2/json", 1)[-1]
+        path = re.sub(r"/nodes/[^/]+", "/nodes/{node}", path)
+        path = re.sub(r"/UPID:[^/]+", "/{upid}", path)
+        path = re.sub(r"/\d+(?=/|$)", "/{id}", path)
+        return f"{method} {path}"
+
+
+class _PooledAdapter(HTTPAdapter):
+    """
+    Keep-alive connection pool, which rate limits, retries and measures every request.
+    Only GET requests are retried on 5xx errors and read timeouts, as proxmox creates tasks on
+    the other methods. Those are only retried, if the connection could not even be established.
+    """
+
+    def __init__(
+        self,
+        pool_size: int,
+        rate_limiter: TokenBucket,
+        stats: ApiStats,
+        retries: int,
+        logger: logging.Logger,
+        backoff: float = 0.5,
+    ) -> None:
+        super().__init__(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.rate_limiter = rate_limiter
+        self.stats = stats
+        self.retries = retries
+        self.logger = logger
+        self.backoff = backoff
+
+    def send(self, request: PreparedRequest, *args: Any, **kwargs: Any) -> Response:
+        endpoint = ApiStats.endpoint(method=str(request.method), url=str(request.url))
+        idempotent = request.method == "GET"
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            start_time = perf_counter()
+            try:
+                response = super().send(request, *args, **kwargs)
+            except (ConnectTimeout, ReadTimeout, ConnectionError) as err:
+                self.stats.record(endpoint, perf_counter() - start_time, failed=True)
+                if attempt >= self.retries or not (
+                    idempotent or isinstance(err, ConnectTimeout)
+                ):
+                    raise
+                self.logger.warning(f"{endpoint} failed ({err}), retrying...")
+            else:
+                failed = response.status_code >= 500
+                self.stats.record(endpoint, perf_counter() - start_time, failed=failed)
+                if not failed or not idempotent or attempt >= self.retries:
+                    return response
+                self.logger.warning(
+                    f"{endpoint} returned {response.status_code}, retrying..."
+                )
+                response.close()
+
+            attempt += 1
+            # exponential backoff with full jitter
+            sleep(random.uniform(0, self.backoff * 2**attempt))
+
+
+class ProxmoxClient:
+    """
+    Client layer around the ProxmoxAPI, which is safe to be used by many threads.
+    All requests share a pool of keep-alive connections and a rate limiter.
+    """
+
+    def __init__(
+        self,
+        proxmox_conf: ProxmoxConnection,
+        logger: logging.Logger,
+        api: Optional[Any] = None,
+    ):
+        self.stats = ApiStats()
+        if api is not None:
+            # e.g. the fake api of a dry run, which does not send any requests
+            self.api = api
+            return
+        self.api = ProxmoxAPI(
+            proxmox_conf.url,
+            user=proxmox_conf.proxmox_user,
+            token_name=proxmox_conf.token_name,
+            token_value=proxmox_conf.token,
+            verify_ssl=proxmox_conf.ssl_verify,
+            timeout=20,
+        )
+        adapter = _PooledAdapter(
+            pool_size=proxmox_conf.api_pool_size,
+            rate_limiter=TokenBucket(rate=proxmox_conf.api_rate_limit),
+            stats=self.stats,
+            retries=proxmox_conf.api_retries,
+            logger=logger,
+        )
+        # all resources of the api share the session of the backend
+        self.api._store["session"].mount("https://", adapter)
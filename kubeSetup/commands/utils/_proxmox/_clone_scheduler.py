@@ -0,0 +1,64 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, TypeVar
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .._setup import SimpleVmConf, ComplexVmConf
+
+VmT = TypeVar("VmT", SimpleVmConf, ComplexVmConf)
+
+
+class CloneScheduler:
+    """
+    Runs the per vm clone pipelines concurrently. The disk heavy part of a pipeline is guarded
+    by a slot, which is limited per proxmox node and per storage, so full clones can't overload
+    a single node or disk.
+    """
+
+    def __init__(
+        self,
+        max_per_node: int,
+        max_per_storage: int,
+        logger: logging.Logger,
+    ) -> None:
+        self.max_per_node = max(1, max_per_node)
+        self.max_per_storage = max(1, max_per_storage)
+        self.logger = logger
+        self._node_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._storage_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, node: str, storage: str) -> Iterator[None]:
+        """Blocks until a clone slot on the node and the storage is free."""
+        with self._lock:
+            node_slot = self._node_slots.setdefault(
+                node, threading.BoundedSemaphore(self.max_per_node)
+            )
+            storage_slot = self._storage_slots.setdefault(
+                storage, threading.BoundedSemaphore(self.max_per_storage)
+            )
+
+        # always acquire the node first and the storage second, so two pipelines can't deadlock
+        with node_slot, storage_slot:
+            yield
+
+    def run(self, vm_infos: list[VmT], pipeline: Callable[[VmT], None]) -> None:
+        """Runs the pipeline for every vm and raises, after all are done, if one of them failed."""
+        if not vm_infos:
+            return
+
+        failed: dict[str, BaseException] = {}
+        with ThreadPoolExecutor(
+            max_workers=len(vm_infos), thread_name_prefix="clone"
+        ) as executor:
+            futures = {executor.submit(pipeline, vm): vm for vm in vm_infos}
+            for future in as_completed(futures):
+                vm = futures[future]
+                error = future.exception()
+                if error is not None:
+                    self.logger.error(f"{vm.vm_id} - {vm.vm_name} failed: {error}")
+                    failed[f"{vm.vm_id} - {vm.vm_name}"] = error
+
+        if failed:
+            raise Exception(f"Cloning failed for the vms: {', '.join(failed.keys())}!")
@@ -0,0 +1,65 @@
+import logging
+from typing import Any, Optional
+from proxmoxer import ProxmoxAPI  # type: ignore
+from ._task_tracker import TaskTracker, is_upid
+from .._setup import SimpleVmConf, ComplexVmConf
+
+
+def build_vm_config(
+    vm: SimpleVmConf | ComplexVmConf, cicustom: Optional[str] = None
+) -> dict[str, Any]:
+    """Merges all settings of the vm conf into the parameters of a single config request."""
+    config: dict[str, Any] = {
+        "ipconfig0": f"ip={vm.ip_address}/24,gw={vm.ip_gw}",
+        "tags": vm.tags,
+    }
+    if vm.cores is not None:
+        config["cores"] = vm.cores
+        config["memory"] = vm.memory
+    if cicustom is not None:
+        config["cicustom"] = cicustom
+    return config
+
+
+class VmConfigApplier:
+    """
+    Applies the config of a cloned vm with one asynchronous config request and resizes the disk.
+    Both return a task, which is tracked instead of sleeping. As every clone pipeline applies
+    its own config, the resizes of different vms run in parallel.
+    """
+
+    def __init__(
+        self,
+        proxmox: ProxmoxAPI,
+        tasks: TaskTracker,
+        logger: logging.Logger,
+        timeout: int = 300,
+        disk: str = "virtio0",
+    ) -> None:
+        self.proxmox = proxmox
+        self.tasks = tasks
+        self.logger = logger
+        self.timeout = timeout
+        self.disk = disk
+
+    def apply(
+        self, vm: SimpleVmConf | ComplexVmConf, cicustom: Optional[str] = None
+    ) -> None:
+        self.logger.info(f"The config will be set for {vm.vm_id} - {vm.vm_name}")
+        config_task = (
+            self.proxmox.nodes(vm.target_name)
+            .qemu(vm.vm_id)
+            .config.post(**build_vm_config(vm=vm, cicustom=cicustom))
+        )
+        if is_upid(config_task):
+            self.tasks.wait(upids=[config_task], timeout=self.timeout)
+
+        if vm.disk_size is not None:
+            # newer proxmox versions resize in a task, older ones before they respond
+            resize_task = (
+                self.proxmox.nodes(vm.target_name)
+                .qemu(vm.vm_id)
+                .resize.put(disk=self.disk, size=f"+{vm.disk_size}G")
+            )
+            if is_upid(resize_task):
+                self.tasks.wait(upids=[resize_task], timeout=self.timeout)
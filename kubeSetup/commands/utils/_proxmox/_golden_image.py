@@ -0,0 +1,26 @@
+import re
+from typing import Any, Optional
+
+
+def golden_image_tags(kube_version: str, base_template_id: int) -> list[str]:
+    """Tags, which identify the golden image of a kubernetes version built from a template."""
+    return ["kube-image", f"kube-{kube_version}", f"base-{base_template_id}"]
+
+
+def golden_image_name(kube_version: str, base_template_id: int) -> str:
+    """Name of the golden image, vm names must be valid DNS names."""
+    return f"k8s-v{re.sub(r'[^a-z0-9]', '-', kube_version.lower())}-base-{base_template_id}"
+
+
+def find_golden_image(
+    resources: list[dict[str, Any]], kube_version: str, base_template_id: int
+) -> Optional[dict[str, Any]]:
+    """Newest template in the cluster resources, which carries all golden image tags."""
+    wanted = set(golden_image_tags(kube_version, base_template_id))
+    images = [
+        resource
+        for resource in resources
+        if resource.get("template")
+        and wanted.issubset(str(resource.get("tags", "")).split(";"))
+    ]
+    return max(images, key=lambda resource: int(resource["vmid"]), default=None)
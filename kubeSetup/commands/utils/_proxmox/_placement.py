@@ -0,0 +1,254 @@
+import re
+import logging
+from typing import Any, Optional
+from proxmoxer import ProxmoxAPI  # type: ignore
+from ._schemas import NodeCapacity, VmDemand
+from ._template_replicas import TemplateReplicas
+from .._setup import SimpleVmConf, ComplexVmConf, VmType, AUTO_PLACEMENT
+
+# vm types, which are spread over different proxmox nodes
+ANTI_AFFINITY_TYPES = {VmType.MASTER.value, VmType.LOADBALANCER.value}
+
+
+def plan_placement(
+    demands: list[VmDemand],
+    nodes: list[NodeCapacity],
+    storage_free: dict[str, int],
+    shared_storages: set[str],
+    logger: Optional[logging.Logger] = None,
+) -> dict[int, str]:
+    """
+    Places every vm without a node with best-fit decreasing on memory, so the nodes are filled
+    up one after another instead of overcommitting a busy one. Masters and load balancers are
+    spread over as many nodes as possible. Vms with a node consume its headroom and must fit.
+    Memory and storage are hard limits, the cpu headroom is preferred but can be overcommitted.
+    """
+    capacity = {node.node: NodeCapacity(**vars(node)) for node in nodes}
+    storage_left = dict(storage_free)
+    hosted_types: dict[str, set[str]] = {node: set() for node in capacity}
+
+    def storage_key(node: str, storage: str) -> str:
+        return storage if storage in shared_storages else f"{node}:{storage}"
+
+    def consume(demand: VmDemand, node: str) -> None:
+        if node in capacity:
+            capacity[node].cores -= demand.cores
+            capacity[node].memory -= demand.memory
+            hosted_types[node].add(demand.vm_type)
+        key = storage_key(node=node, storage=demand.storage)
+        storage_left[key] = storage_left.get(key, 0) - demand.disk
+
+    for demand in demands:
+        if demand.node is not None:
+            consume(demand=demand, node=demand.node)
+            key = storage_key(node=demand.node, storage=demand.storage)
+            if demand.node in capacity and (
+                capacity[demand.node].memory < 0 or storage_left.get(key, 0) < 0
+            ):
+                raise Exception(
+                    f"The proxmox node {demand.node} has not enough memory and storage left "
+                    f"for the vm {demand.vm_id}!"
+                )
+
+    plan: dict[int, str] = {}
+    auto = sorted(
+        (demand for demand in demands if demand.node is None),
+        key=lambda demand: (
+            demand.vm_type not in ANTI_AFFINITY_TYPES,
+            -demand.memory,
+            -demand.disk,
+            -demand.cores,
+        ),
+    )
+    for demand in auto:
+        fitting = [
+            node
+            for node in capacity.values()
+            if node.memory >= demand.memory
+            and storage_left.get(storage_key(node=node.node, storage=demand.storage), 0)
+            >= demand.disk
+        ]
+        if not fitting:
+            raise Exception(
+                f"No proxmox node has enough memory and storage left for the vm {demand.vm_id}!"
+            )
+
+        if demand.vm_type in ANTI_AFFINITY_TYPES:
+            spread = [
+                node
+                for node in fitting
+                if demand.vm_type not in hosted_types[node.node]
+            ]
+            if not spread and logger is not None:
+                logger.warning(
+                    f"The {demand.vm_type.lower()} {demand.vm_id} shares a proxmox node with another "
+                    f"{demand.vm_type.lower()}, as there are not enough nodes."
+                )
+            # most headroom first, so the control plane lands on the least busy nodes
+            chosen = max(
+                spread or fitting,
+                key=lambda node: (node.cores >= demand.cores, node.memory, node.cores),
+            )
+        else:
+            # tightest fit first, which keeps the headroom of the other nodes together
+            chosen = min(
+                fitting,
+                key=lambda node: (
+                    node.cores < demand.cores,
+                    node.memory - demand.memory,
+                    -node.cores,
+                ),
+            )
+        consume(demand=demand, node=chosen.node)
+        plan[demand.vm_id] = chosen.node
+    return plan
+
+
+class PlacementEngine:
+    """
+    Chooses the proxmox node of every vm, which has the target name auto or none at all,
+    based on the cpu, memory and storage headroom of the nodes.
+    """
+
+    def __init__(
+        self,
+        proxmox: ProxmoxAPI,
+        replicas: TemplateReplicas,
+        logger: logging.Logger,
+        memory_reserve: float = 0.1,
+    ) -> None:
+        self.proxmox = proxmox
+        self.replicas = replicas
+        self.logger = logger
+        self.memory_reserve = memory_reserve
+
+    def place(self, vm_infos: list[SimpleVmConf | ComplexVmConf]) -> dict[int, str]:
+        """Sets the target name of the vms to be placed and logs the plan before the cloning."""
+        if not any(vm.target_name == AUTO_PLACEMENT for vm in vm_infos):
+            return {}
+
+        nodes = self._node_capacity()
+        storage_free, shared_storages = self._storage_headroom(
+            nodes=[node.node for node in nodes]
+        )
+        plan = plan_placement(
+            demands=self._demands(vm_infos=vm_infos),
+            nodes=nodes,
+            storage_free=storage_free,
+            shared_storages=shared_storages,
+            logger=self.logger,
+        )
+
+        self.logger.info("Placement plan:")
+        for vm in vm_infos:
+            if vm.vm_id in plan:
+                vm.target_name = plan[vm.vm_id]
+                self.logger.info(
+                    f"{vm.vm_id} - {vm.vm_name} ({vm.vm_type.value.lower()}) -> {vm.target_name}"
+                )
+        return plan
+
+    def capacity_problems(
+        self, vm_infos: list[SimpleVmConf | ComplexVmConf]
+    ) -> list[str]:
+        """Checks, without setting any target name, if all vms fit onto the nodes."""
+        nodes = self._node_capacity()
+        online = {node.node for node in nodes}
+        demands = self._demands(vm_infos=vm_infos)
+        problems = [
+            f"The target node {demand.node} of the vm {demand.vm_id} does not exist or is offline"
+            for demand in demands
+            if demand.node is not None and demand.node not in online
+        ]
+        storage_free, shared_storages = self._storage_headroom(nodes=sorted(online))
+        try:
+            plan_placement(
+                demands=[
+                    demand
+                    for demand in demands
+                    if demand.node is None or demand.node in online
+                ],
+                nodes=nodes,
+                storage_free=storage_free,
+                shared_storages=shared_storages,
+            )
+        except Exception as err:
+            problems.append(str(err).rstrip("!"))
+        return problems
+
+    def _node_capacity(self) -> list[NodeCapacity]:
+        nodes = [
+            NodeCapacity(
+                node=node["node"],
+                cores=float(node["maxcpu"]) * (1 - float(node.get("cpu", 0))),
+                memory=int(
+                    (
+                        int(node["maxmem"]) * (1 - self.memory_reserve)
+                        - int(node.get("mem", 0))
+                    )
+                    // 1024**2
+                ),
+            )
+            for node in self.proxmox.nodes.get()
+            if node.get("status") == "online"
+        ]
+        for node in nodes:
+            self.logger.info(
+                f"{node.node}: {node.cores:.1f} cores and {node.memory} MiB memory free"
+            )
+        return nodes
+
+    def _storage_headroom(self, nodes: list[str]) -> tuple[dict[str, int], set[str]]:
+        """Free GiB per storage, shared storages are counted once for the whole cluster."""
+        storage_free: dict[str, int] = {}
+        shared_storages: set[str] = set()
+        for node in nodes:
+            for storage in self.proxmox.nodes(node).storage.get(enabled=1):
+                if not storage.get("active", 1):
+                    continue
+                free = int(storage.get("avail", 0)) // 1024**3
+                if storage.get("shared"):
+                    shared_storages.add(storage["storage"])
+                    storage_free[storage["storage"]] = free
+                else:
+                    storage_free[f"{node}:{storage['storage']}"] = free
+        return storage_free, shared_storages
+
+    def _demands(self, vm_infos: list[SimpleVmConf | ComplexVmConf]) -> list[VmDemand]:
+        template = self.replicas.template_config()
+        template_disk = self._disk_size(config=template)
+        template_storage = self.replicas.template_storage()
+        return [
+            VmDemand(
+                vm_id=vm.vm_id,
+                vm_type=vm.vm_type.value,
+                cores=(
+                    vm.cores if vm.cores is not None else int(template.get("cores", 1))
+                ),
+                memory=(
+                    int(vm.memory)
+                    if vm.memory is not None
+                    else int(template.get("memory", 512))
+                ),
+                disk=template_disk + (vm.disk_size or 0),
+                storage=vm.storage or template_storage,
+                node=None if vm.target_name == AUTO_PLACEMENT else vm.target_name,
+            )
+            for vm in vm_infos
+        ]
+
+    @staticmethod
+    def _disk_size(config: dict[str, Any]) -> int:
+        """Size of the boot disk in GiB."""
+        for key, value in sorted(config.items()):
+            if (
+                key.rstrip("0123456789") in ("virtio", "scsi", "sata", "ide")
+                and "media=cdrom" not in str(value)
+                and "cloudinit" not in str(value)
+            ):
+                size = re.search(r"size=(\d+)([KMGT]?)", str(value))
+                if size is None:
+                    return 0
+                factor = {"K": 1 / 1024**2, "M": 1 / 1024, "G": 1, "T": 1024}
+                return int(int(size.group(1)) * factor.get(size.group(2), 1 / 1024**3))
+        return 0
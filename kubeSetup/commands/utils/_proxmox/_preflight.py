@@ -0,0 +1,178 @@
+import socket
+import shutil
+import logging
+import ipaddress
+import subprocess
+from collections import Counter
+from typing import Callable, Optional
+from proxmoxer import ProxmoxAPI  # type: ignore
+from concurrent.futures import ThreadPoolExecutor
+from ._placement import PlacementEngine
+from .._setup import SimpleVmConf, ComplexVmConf
+
+# valid range of the proxmox vm ids
+VM_ID_RANGE = range(100, 1_000_000_000)
+
+
+def config_problems(
+    vm_infos: list[SimpleVmConf | ComplexVmConf], template_id: int
+) -> list[str]:
+    """Checks the whole config at once for clashing ids, names and addresses."""
+    problems: list[str] = []
+    for name, values in (
+        ("vm_id", [vm.vm_id for vm in vm_infos]),
+        ("vm_name", [vm.vm_name for vm in vm_infos]),
+        ("ip_address", [vm.ip_address for vm in vm_infos]),
+    ):
+        duplicates = [value for value, count in Counter(values).items() if count > 1]
+        if duplicates:
+            problems.append(
+                f"Duplicate {name} in the config: {', '.join(map(str, duplicates))}"
+            )
+
+    vm_addresses: dict[ipaddress.IPv4Address | ipaddress.IPv6Address, str] = {}
+    for vm in vm_infos:
+        if vm.vm_id not in VM_ID_RANGE:
+            problems.append(f"{vm.vm_name}: the vm_id {vm.vm_id} is out of range")
+        if vm.vm_id == template_id:
+            problems.append(f"{vm.vm_name}: the vm_id is the id of the template")
+        try:
+            interface = ipaddress.ip_interface(f"{vm.ip_address}/24")
+            gateway = ipaddress.ip_address(vm.ip_gw)
+        except ValueError as err:
+            problems.append(f"{vm.vm_name}: {err}")
+            continue
+        vm_addresses[interface.ip] = vm.vm_name
+        if interface.ip in (
+            interface.network.network_address,
+            interface.network.broadcast_address,
+        ):
+            problems.append(
+                f"{vm.vm_name}: {interface.ip} is not a host address of {interface.network}"
+            )
+        if gateway not in interface.network:
+            problems.append(
+                f"{vm.vm_name}: the gateway {gateway} is not in {interface.network}"
+            )
+        elif gateway == interface.ip:
+            problems.append(f"{vm.vm_name}: the ip_address is the gateway")
+
+    # the load balancers share their virtual ip, but it must not be the address of a vm
+    for vm in vm_infos:
+        virtual_ip = getattr(vm, "virtual_ip_address", None)
+        if not virtual_ip:
+            continue
+        try:
+            address = ipaddress.ip_address(virtual_ip)
+        except ValueError as err:
+            problems.append(f"{vm.vm_name}: {err}")
+            continue
+        if address in vm_addresses:
+            problems.append(
+                f"{vm.vm_name}: the virtual_ip_address {address} is used by {vm_addresses[address]}"
+            )
+    return problems
+
+
+def address_in_use(ip_address: str, timeout: float = 1) -> bool:
+    """Pings the address, without ping any answer of the ssh port counts as in use."""
+    if shutil.which("ping"):
+        return (
+            subprocess.run(
+                ["ping", "-c", "1", "-W", str(max(1, int(timeout))), ip_address],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            ).returncode
+            == 0
+        )
+    try:
+        with socket.create_connection((ip_address, 22), timeout=timeout):
+            return True
+    except ConnectionRefusedError:
+        return True
+    except OSError:
+        return False
+
+
+class Preflight:
+    """
+    Checks the whole config against itself, the proxmox cluster and the network, before
+    anything is cloned. The address sweep runs concurrently with the api checks, all problems
+    are reported together.
+    """
+
+    def __init__(
+        self,
+        proxmox: ProxmoxAPI,
+        placement: PlacementEngine,
+        template_id: int,
+        logger: logging.Logger,
+        address_check: Optional[Callable[[str], bool]] = None,
+        max_workers: int = 128,
+    ) -> None:
+        self.proxmox = proxmox
+        self.placement = placement
+        self.template_id = template_id
+        self.logger = logger
+        self.address_check = address_check or address_in_use
+        self.max_workers = max_workers
+
+    def run(self, vm_infos: list[SimpleVmConf | ComplexVmConf]) -> None:
+        self.logger.info(f"Running the preflight checks for {len(vm_infos)} vms...")
+        problems = config_problems(vm_infos=vm_infos, template_id=self.template_id)
+
+        addresses = sorted({vm.ip_address for vm in vm_infos})
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(addresses))),
+            thread_name_prefix="preflight",
+        ) as executor:
+            in_use = executor.map(self._check_address, addresses)
+
+            # the api checks run, while the sweep is still going on
+            problems.extend(self._cluster_problems(vm_infos=vm_infos))
+
+            problems.extend(
+                f"{address} already answers on the network"
+                for address, used in zip(addresses, in_use)
+                if used
+            )
+
+        if problems:
+            raise Exception(
+                "The preflight checks failed:\n"
+                + "\n".join(f"  - {problem}" for problem in problems)
+            )
+        self.logger.info("All preflight checks passed.")
+
+    def _cluster_problems(
+        self, vm_infos: list[SimpleVmConf | ComplexVmConf]
+    ) -> list[str]:
+        problems: list[str] = []
+        resources = {
+            int(resource["vmid"]): resource
+            for resource in self.proxmox.cluster.resources.get(type="vm")
+        }
+
+        template = resources.get(self.template_id)
+        if template is None:
+            problems.append(f"The template {self.template_id} does not exist")
+        elif not template.get("template"):
+            problems.append(f"{self.template_id} is a vm and not a template")
+
+        problems.extend(
+            f"{vm.vm_name}: the vm_id {vm.vm_id} is already used by "
+            f"{resources[vm.vm_id].get('name', vm.vm_id)} on {resources[vm.vm_id].get('node')}"
+            for vm in vm_infos
+            if vm.vm_id in resources
+        )
+
+        if template is not None:
+            problems.extend(self.placement.capacity_problems(vm_infos=vm_infos))
+        return problems
+
+    def _check_address(self, ip_address: str) -> bool:
+        try:
+            return self.address_check(ip_address)
+        except Exception as err:
+            self.logger.warning(f"{ip_address} could not be checked: {err}")
+            return False
@@ -1,156 +1,434 @@
 import logging
-from tqdm import tqdm
-from typing import Any
-from proxmoxer import ProxmoxAPI  # type: ignore
-from time import sleep, perf_counter
+from typing import Any, Callable, Optional, Sequence
+from ._schemas import ReadinessProbe
+from ._client import ProxmoxClient
+from ._readiness import VmReadiness
+from ._task_tracker import TaskTracker, is_upid
+from ._clone_scheduler import CloneScheduler
+from ._template_replicas import TemplateReplicas
+from ._config_apply import VmConfigApplier
+from ._placement import PlacementEngine
+from ._preflight import Preflight
+from ._golden_image import find_golden_image, golden_image_name, golden_image_tags
 from .._setup import SimpleVmConf, ComplexVmConf, ProxmoxConnection, VmConf
+from .._checkpoint import BuildState, BuildPhase
+from .._setupUtils import SSHConnectionPool, wait_for_first_boot
 
 
 class ProxmoxCommands:
-    def __init__(self, proxmox_conf: ProxmoxConnection, logger: logging.Logger):
-        self.proxmox = ProxmoxAPI(
-            proxmox_conf.url,
-            user=proxmox_conf.proxmox_user,
-            token_name=proxmox_conf.token_name,
-            token_value=proxmox_conf.token,
-            verify_ssl=proxmox_conf.ssl_verify,
-            timeout=20,
-        )
+    def __init__(
+        self,
+        proxmox_conf: ProxmoxConnection,
+        logger: logging.Logger,
+        api: Optional[Any] = None,
+        ssh_check: Optional[Callable[[str], bool]] = None,
+        state: Optional[BuildState] = None,
+    ):
+        self.client = ProxmoxClient(proxmox_conf=proxmox_conf, logger=logger, api=api)
+        self.proxmox = self.client.api
         self.template_id = proxmox_conf.template_id
+        self.bwlimit = proxmox_conf.bwlimit
         self.logger = logger
+        self.clone_scheduler = CloneScheduler(
+            max_per_node=proxmox_conf.clone_limit_per_node,
+            max_per_storage=proxmox_conf.clone_limit_per_storage,
+            logger=logger,
+        )
+        self.tasks = TaskTracker(proxmox=self.proxmox, logger=logger)
+        self.clone_timeout = 1800
+        self.readiness = VmReadiness(
+            proxmox=self.proxmox, logger=logger, ssh_check=ssh_check
+        )
+        self.boot_probes = [ReadinessProbe.RUNNING, ReadinessProbe.SSH]
+        if proxmox_conf.guest_agent:
+            self.boot_probes.insert(1, ReadinessProbe.GUEST_AGENT)
+        self.boot_timeout = 600
+        self.shutdown_timeout = 180
+        self.delete_timeout = 300
+        self.config_applier = VmConfigApplier(
+            proxmox=self.proxmox, tasks=self.tasks, logger=logger
+        )
+        self.template_replicas = proxmox_conf.template_replicas
+        # the phases, which the vms finished, so a resumed build skips them
+        self.state = state or BuildState(logger=logger)
+        # the ids of the config, the replicas of the template must not take them
+        self.planned_vm_ids: set[int] = set()
+        self.use_template(template_id=self.template_id)
 
-    def clone_vm(self, vm_infos: list[SimpleVmConf | ComplexVmConf]) -> None:
-        for vm in vm_infos:
-            clone_task = (
+    def use_template(self, template_id: int) -> None:
+        """Sets the template, all vms are cloned from."""
+        self.template_id = template_id
+        self.replicas = TemplateReplicas(
+            proxmox=self.proxmox,
+            template_id=template_id,
+            tasks=self.tasks,
+            logger=self.logger,
+            timeout=self.clone_timeout,
+            planned_ids=self.planned_vm_ids,
+        )
+
+    def use_golden_image(self, kube_version: str) -> bool:
+        """
+        Clones from the golden image of the kubernetes version, if one was built from the template.
+        Returns whether a golden image is used, so the preconfiguration can be skipped.
+        """
+        image = find_golden_image(
+            resources=self.proxmox.cluster.resources.get(type="vm"),
+            kube_version=kube_version,
+            base_template_id=self.template_id,
+        )
+        if image is None:
+            self.logger.info(f"No golden image for kubernetes {kube_version} found.")
+            return False
+        self.logger.info(
+            f"Using the golden image {image['vmid']} - {image.get('name')} for kubernetes {kube_version}."
+        )
+        self.use_template(template_id=int(image["vmid"]))
+        return True
+
+    def convert_to_golden_image(
+        self, vm: SimpleVmConf | ComplexVmConf, kube_version: str, base_template_id: int
+    ) -> None:
+        """Shuts the preconfigured vm down and converts it into a versioned template."""
+        self.logger.info(f"{vm.vm_id} - {vm.vm_name} will be shutdown now...")
+        self.tasks.wait(
+            upids=[
                 self.proxmox.nodes(vm.target_name)
-                .qemu(self.template_id)
-                .clone.post(
-                    newid=vm.vm_id,
-                    name=vm.vm_name,
-                    target=vm.target_name,
-                    full=vm.clone_type,
+                .qemu(vm.vm_id)
+                .status.shutdown.post(forceStop=1, timeout=self.shutdown_timeout)
+            ],
+            timeout=self.shutdown_timeout + 60,
+        )
+
+        self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).config.set(
+            name=golden_image_name(
+                kube_version=kube_version, base_template_id=base_template_id
+            ),
+            tags=";".join(
+                golden_image_tags(
+                    kube_version=kube_version, base_template_id=base_template_id
                 )
-            )
+            ),
+            description=f"Golden image for kubernetes {kube_version}, built from template {base_template_id}.",
+        )
+        template_task = (
+            self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).template.post()
+        )
+        if is_upid(template_task):
+            self.tasks.wait(upids=[template_task], timeout=self.clone_timeout)
+        self.logger.info(
+            f"{vm.vm_id} - {vm.vm_name} is now the golden image for kubernetes {kube_version}."
+        )
 
-            self.wait_for_task(
-                proxmox=self.proxmox,
-                node=vm.target_name,
-                task_id=clone_task,
-                logger=self.logger,
-            )
+    def preflight(
+        self,
+        vm_infos: list[SimpleVmConf | ComplexVmConf],
+        address_check: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        """Raises with all problems of the config, which would make the setup fail later on."""
+        Preflight(
+            proxmox=self.proxmox,
+            placement=self._placement(),
+            template_id=self.template_id,
+            logger=self.logger,
+            address_check=address_check,
+        ).run(vm_infos=vm_infos)
 
-            self._prg_bar(
-                sleep_time=10,
-                desc=f"The config will be set for {vm.vm_id} - {vm.vm_name}\n",
-                logger=self.logger,
+    def place_vms(self, vm_infos: list[SimpleVmConf | ComplexVmConf]) -> None:
+        """Chooses the proxmox node of the vms without a target name from the template in use."""
+        self.planned_vm_ids.update(vm.vm_id for vm in vm_infos)
+        self._placement().place(vm_infos=vm_infos)
+
+    def _placement(self) -> PlacementEngine:
+        return PlacementEngine(
+            proxmox=self.proxmox, replicas=self.replicas, logger=self.logger
+        )
+
+    def clone_vm(
+        self,
+        vm_infos: list[SimpleVmConf | ComplexVmConf],
+        cicustom: Optional[dict[int, str]] = None,
+    ) -> None:
+        """
+        Clones all vms concurrently. The clone itself is limited per proxmox node and per storage,
+        setting the config and starting the vm happens as soon as the clone of the vm is done.
+        Optionally a custom cloud-init snippet is attached to the vms.
+        The vms, which are already cloned and configured, are skipped.
+        """
+        self.planned_vm_ids.update(vm.vm_id for vm in vm_infos)
+        self.clone_scheduler.run(
+            vm_infos=self.state.pending(vm_infos=vm_infos, phase=BuildPhase.CONFIG),
+            pipeline=lambda vm: self._clone_single_vm(
+                vm=vm, cicustom=(cicustom or {}).get(vm.vm_id)
+            ),
+        )
+
+    def clone_single_vm(
+        self, vm: SimpleVmConf | ComplexVmConf, cicustom: Optional[str] = None
+    ) -> None:
+        """
+        Clones, configures and starts a single vm in the calling thread, the clone still waits
+        for a free slot on its node and storage. A vm, which is already configured, is skipped.
+        """
+        if self.state.is_done(vm=vm, phase=BuildPhase.CONFIG):
+            return
+        self._clone_single_vm(vm=vm, cicustom=cicustom)
+
+    def _clone_single_vm(
+        self, vm: SimpleVmConf | ComplexVmConf, cicustom: Optional[str] = None
+    ) -> None:
+        # a vm, which is cloned, but not configured, is only configured again
+        if not self.state.is_done(vm=vm, phase=BuildPhase.CLONE):
+            with self.state.track(vm=vm, phase=BuildPhase.CLONE):
+                self._clone(vm=vm)
+
+        with self.state.track(vm=vm, phase=BuildPhase.CONFIG):
+            self.config_applier.apply(vm=vm, cicustom=cicustom)
+
+            self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).status.start.post()
+            self.logger.info(f"Starting up {vm.vm_id} - {vm.vm_name}")
+
+    def _clone(self, vm: SimpleVmConf | ComplexVmConf) -> None:
+        with self.clone_scheduler.slot(
+            node=vm.target_name, storage=self._storage_key(vm=vm)
+        ):
+            source = self.replicas.source_for(
+                node=vm.target_name, replicate=self.template_replicas
             )
+            clone_params: dict[str, Any] = {
+                "newid": vm.vm_id,
+                "name": vm.vm_name,
+                "full": vm.clone_type,
+            }
+            if source.node != vm.target_name:
+                clone_params["target"] = vm.target_name
+            if source.linked and vm.storage in (None, source.storage):
+                # a linked clone is always placed on the storage of its template
+                clone_params["full"] = 0
+            elif vm.storage is not None:
+                clone_params["storage"] = vm.storage
+            if self.bwlimit is not None and clone_params["full"]:
+                clone_params["bwlimit"] = self.bwlimit
 
-            self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).config.set(
-                ipconfig0=f"ip={vm.ip_address}/24,gw={vm.ip_gw}"
+            self.logger.info(
+                f"Cloning {vm.vm_id} - {vm.vm_name} from {source.vm_id} on {source.node} "
+                f"({'linked' if not clone_params['full'] else 'full'} clone)"
+            )
+            clone_task = (
+                self.proxmox.nodes(source.node)
+                .qemu(source.vm_id)
+                .clone.post(**clone_params)
             )
 
-            self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).config.post(tags=vm.tags)
+            self.tasks.wait(upids=[clone_task], timeout=self.clone_timeout)
 
-            if vm.cores is not None:
-                self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).config.set(
-                    cores=vm.cores, memory=vm.memory
-                )
+    def _storage_key(self, vm: SimpleVmConf | ComplexVmConf) -> str:
+        """
+        Key of the storage the clone is written to. Shared storages are limited cluster wide,
+        local storages per node.
+        """
+        storage = vm.storage or self.replicas.template_storage()
+        if self.replicas.is_shared(storage=storage):
+            return storage
+        return f"{vm.target_name}:{storage}"
 
-            if vm.disk_size is not None:
-                self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).resize.put(
-                    disk="virtio0", size=f"+{vm.disk_size}G"
-                )
-                sleep(10)
-            sleep(5)
-            self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).status.start.post()
-            self._prg_bar(
-                sleep_time=15,
-                desc=f"Starting up {vm.vm_id} - {vm.vm_name}\n",
-                logger=self.logger,
+    def wait_for_boot(self, vm_infos: list[SimpleVmConf | ComplexVmConf]) -> None:
+        """Waits until every vm is started and reachable via SSH."""
+        self.logger.info("Waiting for the initial start up\n")
+        self.readiness.wait_for(
+            vm_infos=vm_infos, probes=self.boot_probes, timeout=self.boot_timeout
+        )
+        # the first boot replaces the restart
+        for vm in vm_infos:
+            self.state.done(vm=vm, phase=BuildPhase.RESTART)
+
+    def node_addresses(self) -> dict[str, str]:
+        """IP address of every proxmox node in the cluster."""
+        return {
+            entry["name"]: entry["ip"]
+            for entry in self.proxmox.cluster.status.get()
+            if entry.get("type") == "node"
+        }
+
+    def snippets_dir(self, storage: str) -> str:
+        """Directory of the snippets on a file based storage."""
+        conf = self.proxmox.storage(storage).get()
+        if "snippets" not in str(conf.get("content", "")).split(",") or not conf.get(
+            "path"
+        ):
+            raise Exception(
+                f"The storage {storage} must be a file based storage with the content type snippets!"
             )
+        return f"{conf['path']}/snippets"
 
     def make_required_restarts(
-        self, vm_infos: list[SimpleVmConf | ComplexVmConf]
+        self,
+        vm_infos: list[SimpleVmConf | ComplexVmConf],
+        ssh_pool_manager: SSHConnectionPool,
     ) -> None:
         """
-        Tries to SSH into the VM and checks if connection can be established.
-        If the connection is established, it will be restarted the vm.
+        Waits until every vm finished its initial boot, is reachable via SSH and cloud-init is done.
+        Afterward all vms will be restarted and it waits again until they are reachable.
+        The vms, which are already restarted, are skipped.
         """
-        self._prg_bar(sleep_time=125, desc="Initial start up\n", logger=self.logger)
+        vm_infos = self.state.pending(vm_infos=vm_infos, phase=BuildPhase.RESTART)
+        if not vm_infos:
+            return
+
+        self.logger.info("Waiting for the initial start up\n")
+        self.readiness.wait_for(
+            vm_infos=vm_infos, probes=self.boot_probes, timeout=self.boot_timeout
+        )
+
+        # SSH answers before cloud-init is done, e.g. with the upgrades of the first boot
+        for vm in vm_infos:
+            wait_for_first_boot(
+                client=ssh_pool_manager.get_connection(
+                    ip_address=vm.ip_address, user=vm.user, ssh_key=vm.ssh_key
+                ),
+                logger=self.logger,
+            )
 
         for vm in vm_infos:
             self.logger.info(f"{vm.vm_id} - {vm.vm_name} will be shutdown now...")
             self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).status.post("shutdown")
+        ssh_pool_manager.close_connections(
+            ip_addresses=[vm.ip_address for vm in vm_infos]
+        )
 
-        self._prg_bar(
-            sleep_time=25,
-            desc="Waiting for the shutdown to finish\n",
-            logger=self.logger,
+        self.logger.info("Waiting for the shutdown to finish\n")
+        self.readiness.wait_for(
+            vm_infos=vm_infos,
+            probes=[ReadinessProbe.STOPPED],
+            timeout=self.shutdown_timeout,
         )
 
         for vm in vm_infos:
             self.logger.info(f"{vm.vm_id} - {vm.vm_name} starting up again...")
             self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).status.post("start")
 
-        self.logger.info(f"Restarting all vms\n")
-
-        self._prg_bar(
-            sleep_time=150,
-            desc="Waiting for the restart task to finish\n",
-            logger=self.logger,
+        self.logger.info("Waiting for the restart to finish\n")
+        self.readiness.wait_for(
+            vm_infos=vm_infos, probes=self.boot_probes, timeout=self.boot_timeout
         )
+        for vm in vm_infos:
+            self.state.done(vm=vm, phase=BuildPhase.RESTART)
 
-    def cleanup_vm(self, vm_infos: list[VmConf]) -> None:
+    def cleanup_vm(self, vm_infos: list[VmConf], hard_stop: bool = False) -> None:
+        """
+        Stops all running vms and deletes them concurrently. Both, the stop and the delete,
+        are tracked through their tasks, so it returns as soon as all vms are gone.
+        Missing vms are skipped, the other failures are raised together at the end.
+        """
+        resources = {
+            int(resource["vmid"]): resource
+            for resource in self.proxmox.cluster.resources.get(type="vm")
+        }
+        missing = [vm for vm in vm_infos if vm.vm_id not in resources]
+        for vm in missing:
+            self.logger.warning(f"{vm.vm_id} - {vm.vm_name} does not exist, skip it")
+        vm_infos = [vm for vm in vm_infos if vm.vm_id in resources]
+        failed: dict[str, BaseException] = {}
+
+        stop_tasks: dict[str, VmConf] = {}
         for vm in vm_infos:
-            self.logger.info(f"{vm.vm_id} - {vm.vm_name} will be shutdown now...")
-            self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).status.post("shutdown")
-        self._prg_bar(
-            sleep_time=25,
-            desc="Waiting for the shutdown to finish\n",
-            logger=self.logger,
-        )
+            if resources[vm.vm_id].get("status") != "running":
+                continue
+            vm_status = self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).status
+            try:
+                if hard_stop:
+                    self.logger.info(
+                        f"{vm.vm_id} - {vm.vm_name} will be stopped now..."
+                    )
+                    stop_tasks[vm_status.stop.post()] = vm
+                else:
+                    self.logger.info(
+                        f"{vm.vm_id} - {vm.vm_name} will be shutdown now..."
+                    )
+                    stop_tasks[
+                        vm_status.shutdown.post(
+                            forceStop=1, timeout=self.shutdown_timeout
+                        )
+                    ] = vm
+            except Exception as err:
+                failed[f"{vm.vm_id} - {vm.vm_name}"] = err
+
+        self.logger.info("Waiting for the vms to stop\n")
+        for upid, error in self.tasks.failures(
+            upids=list(stop_tasks), timeout=self.shutdown_timeout + 60
+        ).items():
+            failed[f"{stop_tasks[upid].vm_id} - {stop_tasks[upid].vm_name}"] = error
 
+        delete_tasks: dict[str, VmConf] = {}
         for vm in vm_infos:
+            # a vm, which did not stop, can't be deleted
+            if f"{vm.vm_id} - {vm.vm_name}" in failed:
+                continue
             self.logger.info(f"{vm.vm_id} - {vm.vm_name} will be removed now...")
-            self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).delete()
-        self._prg_bar(
-            sleep_time=10,
-            desc="Waiting for the delete task to finish\n",
-            logger=self.logger,
-        )
+            try:
+                delete_tasks[
+                    self.proxmox.nodes(vm.target_name)
+                    .qemu(vm.vm_id)
+                    .delete(purge=1, **{"destroy-unreferenced-disks": 1})
+                ] = vm
+            except Exception as err:
+                failed[f"{vm.vm_id} - {vm.vm_name}"] = err
 
+        self.logger.info("Waiting for the delete tasks to finish\n")
+        for upid, error in self.tasks.failures(
+            upids=list(delete_tasks), timeout=self.delete_timeout
+        ).items():
+            failed[f"{delete_tasks[upid].vm_id} - {delete_tasks[upid].vm_name}"] = error
+
+        if failed:
+            raise Exception(
+                "The cleanup failed on:\n"
+                + "\n".join(f"  - {vm}: {error}" for vm, error in failed.items())
+            )
         self.logger.info(f"Cleanup completed.\n")
 
-    @staticmethod
-    def wait_for_task(
-        proxmox: ProxmoxAPI,
-        node: str,
-        task_id: Any,
-        logger: logging.Logger,
-        timeout: int = 300,
-        interval: int = 10,
-    ) -> None:
-        sleep(2)
-        start_time = perf_counter()
-        logger.info(f"Task {task_id} is started")
-        while perf_counter() - start_time < timeout:
-            status = proxmox.nodes(node).tasks(task_id).status.get()
-            if status["status"] == "stopped":
-                if "exitstatus" in status and status["exitstatus"] == "OK":
-                    logger.info(f"Task {task_id} stopped and status was OK.")
-                    return
-                else:
-                    raise Exception(
-                        f"Task {task_id} has failed with exit status: {status['exitstatus']}!"
-                    )
-            logger.info(f"Task {task_id} in progress.")
-            sleep(interval)
-        raise TimeoutError(f"Task {task_id} did not complete in {timeout} seconds!")
-
-    @staticmethod
-    def _prg_bar(sleep_time: int, desc: str, logger: logging.Logger) -> None:
-        logger.info(desc)
-        sleep(1)
-        for _ in tqdm(range(sleep_time - 1), colour="green"):
-            sleep(1)
-        logger.info("\n")
+    def log_api_stats(self) -> None:
+        """Logs the latency counters of all proxmox api endpoints, which were used."""
+        self.logger.info("Proxmox api latencies:")
+        self.client.stats.log(logger=self.logger)
+
+    def locate_vms(
+        self, vm_infos: Sequence[SimpleVmConf | ComplexVmConf | VmConf]
+    ) -> list[VmConf]:
+        """The node, every vm is running on, the vms, which don't exist, are left out."""
+        nodes = {
+            int(resource["vmid"]): resource["node"]
+            for resource in self.proxmox.cluster.resources.get(type="vm")
+            if not resource.get("template")
+        }
+        missing = [vm.vm_name for vm in vm_infos if vm.vm_id not in nodes]
+        if missing:
+            self.logger.warning(f"The vms {', '.join(missing)} don't exist anymore.")
+        return [
+            VmConf(vm_name=vm.vm_name, target_name=nodes[vm.vm_id], vm_id=vm.vm_id)
+            for vm in vm_infos
+            if vm.vm_id in nodes
+        ]
+
+    def discover_vms(self, tags: list[str]) -> list[VmConf]:
+        """Finds the vms, which carry all the given tags, which were applied by clone_vm."""
+        wanted = {tag.strip().lower() for tag in tags if tag.strip()}
+        if not wanted:
+            raise Exception("At least one tag is required to discover the vms!")
+        vms = [
+            VmConf(
+                vm_name=resource.get("name", str(resource["vmid"])),
+                target_name=resource["node"],
+                vm_id=int(resource["vmid"]),
+            )
+            for resource in self.proxmox.cluster.resources.get(type="vm")
+            if not resource.get("template")
+            and wanted.issubset(
+                tag.lower() for tag in str(resource.get("tags", "")).split(";")
+            )
+        ]
+        self.logger.info(
+            f"Found {len(vms)} vms with the tags {', '.join(sorted(wanted))}: "
+            f"{', '.join(f'{vm.vm_id} - {vm.vm_name}' for vm in vms)}"
+        )
+        return vms
@@ -0,0 +1,109 @@
+import socket
+import logging
+from time import sleep, perf_counter
+from typing import Callable, Optional, Sequence
+from proxmoxer import ProxmoxAPI  # type: ignore
+from concurrent.futures import ThreadPoolExecutor
+from ._schemas import ReadinessProbe
+from .._setup import SimpleVmConf, ComplexVmConf, VmConf
+
+
+class VmReadiness:
+    """
+    Polls the real state of the vms concurrently and returns as soon as every vm passed all
+    probes. Every vm gets its own deadline, the vms which did not make it are reported by name.
+    """
+
+    def __init__(
+        self,
+        proxmox: ProxmoxAPI,
+        logger: logging.Logger,
+        interval: float = 2,
+        ssh_check: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        self.proxmox = proxmox
+        self.logger = logger
+        self.interval = interval
+        self.ssh_check = ssh_check or self._ssh_reachable
+
+    def wait_for(
+        self,
+        vm_infos: Sequence[VmConf | SimpleVmConf | ComplexVmConf],
+        probes: list[ReadinessProbe],
+        timeout: int,
+    ) -> None:
+        if not vm_infos:
+            return
+
+        with ThreadPoolExecutor(
+            max_workers=len(vm_infos), thread_name_prefix="readiness"
+        ) as executor:
+            pending = list(
+                executor.map(
+                    lambda vm: self._wait_for_vm(vm=vm, probes=probes, timeout=timeout),
+                    vm_infos,
+                )
+            )
+
+        stuck = [
+            f"{vm.vm_id} - {vm.vm_name} (waiting for {probe.value})"
+            for vm, probe in zip(vm_infos, pending)
+            if probe is not None
+        ]
+        if stuck:
+            raise TimeoutError(
+                f"The following vms were not ready within {timeout} seconds: {', '.join(stuck)}!"
+            )
+
+    def _wait_for_vm(
+        self,
+        vm: VmConf | SimpleVmConf | ComplexVmConf,
+        probes: list[ReadinessProbe],
+        timeout: int,
+    ) -> Optional[ReadinessProbe]:
+        """Returns None if the vm is ready, otherwise the probe which did not pass in time."""
+        start_time = perf_counter()
+        remaining = list(probes)
+        while remaining:
+            if self._check(vm=vm, probe=remaining[0]):
+                remaining.pop(0)
+                continue
+            if perf_counter() - start_time > timeout:
+                return remaining[0]
+            sleep(self.interval)
+
+        self.logger.info(
+            f"{vm.vm_id} - {vm.vm_name} is ready after {perf_counter() - start_time:.0f}s "
+            f"({', '.join(probe.value for probe in probes)})"
+        )
+        return None
+
+    def _check(
+        self, vm: VmConf | SimpleVmConf | ComplexVmConf, probe: ReadinessProbe
+    ) -> bool:
+        try:
+            if probe == ReadinessProbe.RUNNING:
+                return self._vm_status(vm=vm) == "running"
+            if probe == ReadinessProbe.STOPPED:
+                return self._vm_status(vm=vm) == "stopped"
+            if probe == ReadinessProbe.GUEST_AGENT:
+                self.proxmox.nodes(vm.target_name).qemu(vm.vm_id).agent.ping.post()
+                return True
+            return self.ssh_check(getattr(vm, "ip_address"))
+        except Exception as err:
+            self.logger.debug(f"{vm.vm_id} - {vm.vm_name} {probe.value}: {err}")
+            return False
+
+    def _vm_status(self, vm: VmConf | SimpleVmConf | ComplexVmConf) -> str:
+        return str(
+            self.proxmox.nodes(vm.target_name)
+            .qemu(vm.vm_id)
+            .status.current.get()["status"]
+        )
+
+    @staticmethod
+    def _ssh_reachable(ip_address: str, port: int = 22) -> bool:
+        """The ssh daemon is only ready, if it also sends its banner."""
+        with socket.create_connection((ip_address, port), timeout=3) as sock:
+            sock.settimeout(3)
+            return sock.recv(4).startswith(b"SSH-")
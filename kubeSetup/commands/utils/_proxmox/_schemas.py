@@ -0,0 +1,39 @@
+from enum import Enum
+from typing import Optional
+from dataclasses import dataclass
+
+
+class ReadinessProbe(Enum):
+    RUNNING = "RUNNING"
+    STOPPED = "STOPPED"
+    GUEST_AGENT = "GUEST_AGENT"
+    SSH = "SSH"
+
+
+@dataclass
+class CloneSource:
+    node: str
+    vm_id: int
+    storage: str
+    linked: bool
+
+
+@dataclass
+class NodeCapacity:
+    node: str
+    cores: float
+    # MiB
+    memory: int
+
+
+@dataclass
+class VmDemand:
+    vm_id: int
+    vm_type: str
+    cores: int
+    # MiB
+    memory: int
+    # GiB
+    disk: int
+    storage: str
+    node: Optional[str] = None
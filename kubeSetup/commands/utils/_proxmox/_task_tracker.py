@@ -0,0 +1,165 @@
+import logging
+import threading
+from typing import Any, Optional
+from itertools import groupby
+from proxmoxer import ProxmoxAPI  # type: ignore
+from concurrent.futures import Future, wait as wait_futures, FIRST_EXCEPTION
+
+
+class TaskTracker:
+    """
+    Tracks many proxmox tasks (UPIDs) at once. A single background thread resolves all pending
+    tasks with one task list query per node, starting with a short interval and backing off
+    while nothing finishes. Every tracked task is exposed as a future.
+    """
+
+    def __init__(
+        self,
+        proxmox: ProxmoxAPI,
+        logger: logging.Logger,
+        min_interval: float = 0.5,
+        max_interval: float = 5,
+        backoff: float = 1.5,
+    ) -> None:
+        self.proxmox = proxmox
+        self.logger = logger
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._pending: dict[str, Future[str]] = {}
+        self._condition = threading.Condition()
+        self._interval = min_interval
+        self._poller: Optional[threading.Thread] = None
+
+    def track(self, upid: str) -> "Future[str]":
+        """Returns a future, which resolves to the exit status or raises if the task failed."""
+        with self._condition:
+            if upid in self._pending:
+                return self._pending[upid]
+            future: Future[str] = Future()
+            self._pending[upid] = future
+            self._interval = self.min_interval
+            self.logger.info(f"Task {upid} is started")
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(
+                    target=self._poll, name="task-tracker", daemon=True
+                )
+                self._poller.start()
+            self._condition.notify()
+            return future
+
+    def wait(self, upids: list[str], timeout: int = 300) -> None:
+        """Blocks until all tasks are finished and raises the first failure."""
+        futures = [self.track(upid=upid) for upid in upids]
+        done, not_done = wait_futures(
+            futures, timeout=timeout, return_when=FIRST_EXCEPTION
+        )
+        for future in done:
+            future.result()
+        if not_done:
+            raise TimeoutError(
+                f"Tasks {', '.join(upid for upid, future in zip(upids, futures) if future in not_done)} "
+                f"did not complete in {timeout} seconds!"
+            )
+
+    def failures(
+        self, upids: list[str], timeout: int = 300
+    ) -> dict[str, BaseException]:
+        """Blocks until all tasks are finished or timed out and returns the failures by upid."""
+        futures = {upid: self.track(upid=upid) for upid in upids}
+        _, not_done = wait_futures(futures.values(), timeout=timeout)
+        failures: dict[str, BaseException] = {}
+        for upid, future in futures.items():
+            if future in not_done:
+                failures[upid] = TimeoutError(
+                    f"Task {upid} did not complete in {timeout} seconds!"
+                )
+            elif (error := future.exception()) is not None:
+                failures[upid] = error
+        return failures
+
+    def _poll(self) -> None:
+        while True:
+            with self._condition:
+                if not self._pending:
+                    self._poller = None
+                    return
+                self._condition.wait(timeout=self._interval)
+                pending = list(self._pending.keys())
+
+            finished = 0
+            for node, node_upids in groupby(
+                sorted(pending, key=self._node), key=self._node
+            ):
+                try:
+                    finished += self._resolve_node(node=node, upids=list(node_upids))
+                except Exception as err:
+                    self.logger.warning(
+                        f"Task list of {node} could not be fetched: {err}"
+                    )
+
+            with self._condition:
+                self._interval = (
+                    self.min_interval
+                    if finished
+                    else min(self._interval * self.backoff, self.max_interval)
+                )
+
+    def _resolve_node(self, node: str, upids: list[str]) -> int:
+        """Resolves the tasks of one node with a single task list query."""
+        tasks = {
+            task["upid"]: task
+            for task in self.proxmox.nodes(node).tasks.get(
+                source="all",
+                since=min(self._start_time(upid) for upid in upids) - 1,
+                limit=max(50, 4 * len(upids)),
+            )
+        }
+
+        finished = 0
+        for upid in upids:
+            task = tasks.get(upid)
+            if task is None:
+                # not in the list (yet), fall back to the status of the single task
+                task = self.proxmox.nodes(node).tasks(upid).status.get()
+            if "exitstatus" in task:
+                # the status of a single task is "running" or "stopped" with an exit status
+                exit_status = (
+                    task["exitstatus"] if task["status"] == "stopped" else None
+                )
+            else:
+                # entries of the task list only have an end time, if they are finished
+                exit_status = task.get("status") if task.get("endtime") else None
+            if exit_status is None:
+                continue
+            self._finish(upid=upid, exit_status=str(exit_status))
+            finished += 1
+        return finished
+
+    def _finish(self, upid: str, exit_status: str) -> None:
+        with self._condition:
+            future = self._pending.pop(upid)
+        if exit_status == "OK":
+            self.logger.info(f"Task {upid} stopped and status was OK.")
+            future.set_result(exit_status)
+        elif exit_status.startswith("WARNINGS"):
+            self.logger.warning(f"Task {upid} stopped with {exit_status}.")
+            future.set_result(exit_status)
+        else:
+            future.set_exception(
+                Exception(f"Task {upid} has failed with exit status: {exit_status}!")
+            )
+
+    @staticmethod
+    def _node(upid: str) -> str:
+        # UPID:<node>:<pid>:<pstart>:<starttime>:<type>:<id>:<user>:
+        return upid.split(":")[1]
+
+    @staticmethod
+    def _start_time(upid: str) -> int:
+        return int(upid.split(":")[4], 16)
+
+
+def is_upid(result: Any) -> bool:
+    """Some api calls return a task id, others (depending on the proxmox version) return nothing."""
+    return isinstance(result, str) and result.startswith("UPID:")
@@ -0,0 +1,204 @@
+import logging
+import threading
+from typing import Any, Optional
+from proxmoxer import ProxmoxAPI  # type: ignore
+from ._schemas import CloneSource
+from ._task_tracker import TaskTracker, is_upid
+
+# storages, which can create linked clones of every disk format
+LINKED_CLONE_BLOCK_STORAGES = {"zfspool", "rbd", "lvmthin"}
+# file based storages, which can create linked clones of qcow2 disks
+LINKED_CLONE_FILE_STORAGES = {"dir", "nfs", "cifs", "glusterfs", "cephfs"}
+
+
+class TemplateReplicas:
+    """
+    Finds or creates a replica of the template on every proxmox node, so a vm can always be cloned
+    from a template on the same node. Clones are linked, whenever the storage supports it.
+    Replicas are tagged with replica-<template_id>, so they are found again on the next run.
+    """
+
+    def __init__(
+        self,
+        proxmox: ProxmoxAPI,
+        template_id: int,
+        tasks: TaskTracker,
+        logger: logging.Logger,
+        timeout: int = 1800,
+        planned_ids: Optional[set[int]] = None,
+    ) -> None:
+        self.proxmox = proxmox
+        self.template_id = template_id
+        self.tasks = tasks
+        self.logger = logger
+        self.timeout = timeout
+        # the ids of the vms in the config, which are not cloned yet, so nextid still hands them out
+        self.planned_ids = planned_ids if planned_ids is not None else set()
+        self.replica_tag = f"replica-{template_id}"
+        self._replicas: dict[str, int] = {}
+        self._template: Optional[dict[str, Any]] = None
+        self._storages: Optional[dict[str, dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+
+    def source_for(self, node: str, replicate: bool) -> CloneSource:
+        """Template to clone a vm on the given node from."""
+        template = self._template_info()
+        storage = self._disk_storage(volume=template["volume"])
+        if not replicate or node == template["node"] or self.is_shared(storage):
+            return CloneSource(
+                node=template["node"],
+                vm_id=self.template_id,
+                storage=storage,
+                linked=replicate
+                and self._supports_linked_clone(volume=template["volume"]),
+            )
+
+        replica_id = self._replica_on(node=node)
+        volume = self._first_disk(node=node, vm_id=replica_id)
+        return CloneSource(
+            node=node,
+            vm_id=replica_id,
+            storage=self._disk_storage(volume=volume),
+            linked=self._supports_linked_clone(volume=volume),
+        )
+
+    def template_config(self) -> dict[str, Any]:
+        template = self._template_info()
+        return dict(
+            self.proxmox.nodes(template["node"]).qemu(self.template_id).config.get()
+        )
+
+    def template_storage(self) -> str:
+        return self._disk_storage(volume=self._template_info()["volume"])
+
+    def is_shared(self, storage: str) -> bool:
+        return bool(self._storage_conf(storage=storage).get("shared"))
+
+    def _replica_on(self, node: str) -> int:
+        with self._lock:
+            if node in self._replicas:
+                return self._replicas[node]
+
+        # only one replica at a time, so the ids of the cluster can't clash
+        with self._create_lock:
+            with self._lock:
+                if not self._replicas:
+                    self._replicas.update(self._discover_replicas())
+                if node in self._replicas:
+                    return self._replicas[node]
+            replica_id = self._create_replica(node=node)
+            with self._lock:
+                self._replicas[node] = replica_id
+            return replica_id
+
+    def _discover_replicas(self) -> dict[str, int]:
+        replicas: dict[str, int] = {}
+        for resource in self.proxmox.cluster.resources.get(type="vm"):
+            if resource.get("template") and self.replica_tag in str(
+                resource.get("tags", "")
+            ).split(";"):
+                replicas.setdefault(resource["node"], int(resource["vmid"]))
+        self.logger.info(f"Found template replicas: {replicas}")
+        return replicas
+
+    def _create_replica(self, node: str) -> int:
+        """Full clone of the template, which is moved to the node and converted to a template."""
+        template = self._template_info()
+        replica_id = self._free_id()
+        self.logger.info(
+            f"Creating replica {replica_id} of template {self.template_id} on {node}"
+        )
+
+        clone_task = (
+            self.proxmox.nodes(template["node"])
+            .qemu(self.template_id)
+            .clone.post(newid=replica_id, name=f"{template['name']}-{node}", full=1)
+        )
+        self.tasks.wait(upids=[clone_task], timeout=self.timeout)
+
+        migrate_task = (
+            self.proxmox.nodes(template["node"])
+            .qemu(replica_id)
+            .migrate.post(target=node, **{"with-local-disks": 1})
+        )
+        self.tasks.wait(upids=[migrate_task], timeout=self.timeout)
+
+        self.proxmox.nodes(node).qemu(replica_id).config.set(tags=self.replica_tag)
+        template_task = self.proxmox.nodes(node).qemu(replica_id).template.post()
+        if is_upid(template_task):
+            self.tasks.wait(upids=[template_task], timeout=self.timeout)
+        return replica_id
+
+    def _free_id(self) -> int:
+        """Next free id of the cluster, which is not planned for a vm of the config."""
+        replica_id = int(self.proxmox.cluster.nextid.get())
+        while replica_id in self.planned_ids:
+            replica_id += 1
+            # nextid only returns a given id, if no vm has it yet
+            while not self._is_free(vm_id=replica_id):
+                replica_id += 1
+        return replica_id
+
+    def _is_free(self, vm_id: int) -> bool:
+        try:
+            return int(self.proxmox.cluster.nextid.get(vmid=vm_id)) == vm_id
+        except Exception:
+            return False
+
+    def _template_info(self) -> dict[str, Any]:
+        with self._lock:
+            if self._template is None:
+                resource = next(
+                    (
+                        resource
+                        for resource in self.proxmox.cluster.resources.get(type="vm")
+                        if int(resource["vmid"]) == self.template_id
+                    ),
+                    None,
+                )
+                if resource is None:
+                    raise Exception(
+                        f"Template {self.template_id} does not exist on the proxmox cluster!"
+                    )
+                self._template = {
+                    "node": resource["node"],
+                    "name": resource.get("name", f"template-{self.template_id}"),
+                    "volume": self._first_disk(
+                        node=resource["node"], vm_id=self.template_id
+                    ),
+                }
+            return self._template
+
+    def _first_disk(self, node: str, vm_id: int) -> str:
+        config = self.proxmox.nodes(node).qemu(vm_id).config.get()
+        return next(
+            (
+                str(value).split(",")[0]
+                for key, value in sorted(config.items())
+                if key.rstrip("0123456789") in ("virtio", "scsi", "sata", "ide")
+                and "media=cdrom" not in str(value)
+                and "cloudinit" not in str(value)
+            ),
+            "default:",
+        )
+
+    def _storage_conf(self, storage: str) -> dict[str, Any]:
+        with self._lock:
+            if self._storages is None:
+                self._storages = {
+                    conf["storage"]: conf for conf in self.proxmox.storage.get()
+                }
+            return self._storages.get(storage, {})
+
+    def _supports_linked_clone(self, volume: str) -> bool:
+        storage_type = self._storage_conf(storage=self._disk_storage(volume)).get(
+            "type"
+        )
+        if storage_type in LINKED_CLONE_BLOCK_STORAGES:
+            return True
+        return storage_type in LINKED_CLONE_FILE_STORAGES and volume.endswith(".qcow2")
+
+    @staticmethod
+    def _disk_storage(volume: str) -> str:
+        return volume.split(":")[0]
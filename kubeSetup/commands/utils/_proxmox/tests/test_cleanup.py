@@ -0,0 +1,115 @@
+import logging
+import pytest
+from unittest.mock import patch
+from kubeSetup.commands.utils import (
+    ExecutionPlan,
+    ProxmoxCommands,
+    ProxmoxConnection,
+    VmConf,
+)
+from kubeSetup.commands.utils._dryRun._fake_proxmox import FakeProxmoxAPI
+
+resources = [
+    {"vmid": 500, "name": "kube1", "node": "pve1", "tags": "kubernetes;master"},
+    {"vmid": 501, "name": "kube2", "node": "pve2", "tags": "kubernetes;worker"},
+    {"vmid": 502, "name": "other", "node": "pve2", "tags": "ubuntu-24-04"},
+    {"vmid": 900, "name": "tmpl", "node": "pve1", "tags": "kubernetes", "template": 1},
+]
+
+
+def _proxmox_commands():
+    with patch("kubeSetup.commands.utils._proxmox._client.ProxmoxAPI") as api:
+        api.return_value.cluster.resources.get.return_value = resources
+        return ProxmoxCommands(
+            proxmox_conf=ProxmoxConnection(
+                proxmox_user="test@test",
+                url="test.net",
+                token_name="test",
+                token="test-test",
+                ssl_verify=False,
+                template_id=900,
+            ),
+            logger=logging.getLogger("test"),
+        )
+
+
+def test_discover_vms_by_tags():
+    vms = _proxmox_commands().discover_vms(tags=["kubernetes"])
+    assert [(vm.vm_id, vm.target_name) for vm in vms] == [(500, "pve1"), (501, "pve2")]
+
+
+def test_discover_vms_requires_all_tags():
+    vms = _proxmox_commands().discover_vms(tags=["Kubernetes", "worker"])
+    assert [vm.vm_name for vm in vms] == ["kube2"]
+
+
+def test_locate_vms_skips_the_missing_ones():
+    vms = _proxmox_commands().locate_vms(
+        vm_infos=[
+            VmConf(vm_name="kube2", target_name="auto", vm_id=501),
+            VmConf(vm_name="gone", target_name="auto", vm_id=503),
+        ]
+    )
+    assert [(vm.vm_id, vm.target_name) for vm in vms] == [(501, "pve2")]
+
+
+class _LockedVmAPI(FakeProxmoxAPI):
+    def _handle_vm(self, method, node, vm_id, action, params):
+        if method == "DELETE" and vm_id == 501:
+            raise Exception("500 Internal Server Error: VM is locked (backup)")
+        return super()._handle_vm(method, node, vm_id, action, params)
+
+
+def _fake_proxmox_commands(api_class=FakeProxmoxAPI):
+    api = api_class(
+        plan=ExecutionPlan(logger=logging.getLogger("test")),
+        template_id=900,
+        nodes=["pve1", "pve2"],
+        vm_names={},
+    )
+    for vm_id, node in ((500, "pve1"), (501, "pve2")):
+        api.vms[vm_id] = {
+            **api.vms[900],
+            "vmid": vm_id,
+            "name": f"kube{vm_id}",
+            "node": node,
+            "status": "running",
+            "template": 0,
+        }
+    proxmox = ProxmoxCommands(
+        proxmox_conf=ProxmoxConnection(
+            proxmox_user="test@test",
+            url="test.net",
+            token_name="test",
+            token="test-test",
+            ssl_verify=False,
+            template_id=900,
+        ),
+        logger=logging.getLogger("test"),
+        api=api,
+    )
+    return proxmox, api
+
+
+def test_cleanup_skips_the_missing_vms():
+    proxmox, api = _fake_proxmox_commands()
+    proxmox.cleanup_vm(
+        vm_infos=[
+            VmConf(vm_name="kube500", target_name="pve1", vm_id=500),
+            VmConf(vm_name="gone", target_name="pve1", vm_id=503),
+            VmConf(vm_name="kube501", target_name="pve2", vm_id=501),
+        ]
+    )
+    assert set(api.vms) == {900}
+
+
+def test_cleanup_deletes_the_other_vms_before_it_raises():
+    proxmox, api = _fake_proxmox_commands(api_class=_LockedVmAPI)
+    with pytest.raises(Exception, match="501 - kube501: .* VM is locked"):
+        proxmox.cleanup_vm(
+            vm_infos=[
+                VmConf(vm_name="kube501", target_name="pve2", vm_id=501),
+                VmConf(vm_name="kube500", target_name="pve1", vm_id=500),
+            ]
+        )
+    assert set(api.vms) == {900, 501}
@@ -0,0 +1,38 @@
+import pytest
+from time import perf_counter
+from kubeSetup.commands.utils._proxmox._client import ApiStats, TokenBucket
+
+
+def test_endpoint_groups_calls_of_all_vms():
+    assert (
+        ApiStats.endpoint(
+            method="POST",
+            url="https://pve.local:8006/api2/json/nodes/pve1/qemu/500/clone",
+        )
+        == "POST /nodes/{node}/qemu/{id}/clone"
+    )
+    assert (
+        ApiStats.endpoint(
+            method="GET",
+            url="https://pve.local:8006/api2/json/nodes/pve2/tasks/"
+            "UPID:pve2:0000A1B2:0001C3D4:67000000:qmclone:900:root@pam:/status",
+        )
+        == "GET /nodes/{node}/tasks/{upid}/status"
+    )
+
+
+def test_api_stats_records_calls():
+    stats = ApiStats()
+    stats.record("GET /version", latency=0.2, failed=False)
+    stats.record("GET /version", latency=0.4, failed=True)
+    assert stats.snapshot()["GET /version"] == pytest.approx(
+        {"calls": 2, "errors": 1, "total": 0.6, "max": 0.4}
+    )
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=1)
+    start_time = perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+    assert perf_counter() - start_time >= 0.09
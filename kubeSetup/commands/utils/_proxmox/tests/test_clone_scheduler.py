@@ -0,0 +1,83 @@
+import logging
+import threading
+import pytest
+from time import sleep
+from kubeSetup.commands.utils import SimpleVmConf, VmType
+from kubeSetup.commands.utils._proxmox._clone_scheduler import CloneScheduler
+
+
+def _vm(vm_id, target_name):
+    return SimpleVmConf(
+        vm_name=f"test_{vm_id}",
+        vm_type=VmType.WORKER,
+        target_name=target_name,
+        vm_id=vm_id,
+        tags="test",
+        clone_type=1,
+        ip_address="10.10.10.10",
+        ip_gw="10.10.10.1",
+        user="tom",
+        ssh_key="key",
+        pw="pw",
+    )
+
+
+def test_clone_scheduler_limits_per_node():
+    scheduler = CloneScheduler(
+        max_per_node=2, max_per_storage=10, logger=logging.getLogger("test")
+    )
+    lock = threading.Lock()
+    running = {"pve1": 0, "pve2": 0}
+    peak = {"pve1": 0, "pve2": 0}
+
+    def pipeline(vm):
+        with scheduler.slot(node=vm.target_name, storage=f"{vm.target_name}:local"):
+            with lock:
+                running[vm.target_name] += 1
+                peak[vm.target_name] = max(
+                    peak[vm.target_name], running[vm.target_name]
+                )
+            sleep(0.05)
+            with lock:
+                running[vm.target_name] -= 1
+
+    vms = [_vm(100 + i, "pve1" if i % 2 else "pve2") for i in range(8)]
+    scheduler.run(vm_infos=vms, pipeline=pipeline)
+    assert peak == {"pve1": 2, "pve2": 2}
+
+
+def test_clone_scheduler_limits_per_storage():
+    scheduler = CloneScheduler(
+        max_per_node=10, max_per_storage=1, logger=logging.getLogger("test")
+    )
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def pipeline(vm):
+        with scheduler.slot(node=vm.target_name, storage="ceph"):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            sleep(0.02)
+            with lock:
+                state["running"] -= 1
+
+    scheduler.run(
+        vm_infos=[_vm(100 + i, f"pve{i}") for i in range(4)], pipeline=pipeline
+    )
+    assert state["peak"] == 1
+
+
+def test_clone_scheduler_reports_failed_vms():
+    scheduler = CloneScheduler(
+        max_per_node=1, max_per_storage=1, logger=logging.getLogger("test")
+    )
+
+    def pipeline(vm):
+        if vm.vm_id == 101:
+            raise Exception("clone failed")
+
+    with pytest.raises(Exception) as err:
+        scheduler.run(vm_infos=[_vm(100, "pve1"), _vm(101, "pve1")], pipeline=pipeline)
+    assert "101 - test_101" in str(err.value)
+    assert "100 - test_100" not in str(err.value)
@@ -0,0 +1,34 @@
+from kubeSetup.commands.utils import SimpleVmConf, VmType
+from kubeSetup.commands.utils._proxmox._config_apply import build_vm_config
+
+
+def _vm(cores=None, memory=None):
+    return SimpleVmConf(
+        vm_name="test_01",
+        vm_type=VmType.MASTER,
+        target_name="pve",
+        vm_id=100,
+        tags="kubernetes,master",
+        clone_type=1,
+        ip_address="10.10.10.10",
+        ip_gw="10.10.10.1",
+        user="tom",
+        ssh_key="key",
+        pw="pw",
+        cores=cores,
+        memory=memory,
+    )
+
+
+def test_build_vm_config_merges_all_settings():
+    assert build_vm_config(vm=_vm(cores=4, memory=4096)) == {
+        "ipconfig0": "ip=10.10.10.10/24,gw=10.10.10.1",
+        "tags": "kubernetes,master",
+        "cores": 4,
+        "memory": 4096,
+    }
+
+
+def test_build_vm_config_keeps_template_resources():
+    assert "cores" not in build_vm_config(vm=_vm())
+    assert "memory" not in build_vm_config(vm=_vm())
@@ -0,0 +1,30 @@
+from kubeSetup.commands.utils._proxmox._golden_image import (
+    find_golden_image,
+    golden_image_name,
+)
+
+resources = [
+    {"vmid": 900, "template": 1, "tags": ""},
+    {"vmid": 910, "template": 1, "tags": "base-900;kube-1.31;kube-image"},
+    {"vmid": 911, "template": 1, "tags": "base-900;kube-1.32;kube-image"},
+    {"vmid": 912, "template": 1, "tags": "base-900;kube-1.32;kube-image"},
+    {"vmid": 913, "template": 1, "tags": "base-901;kube-1.32;kube-image"},
+    {"vmid": 500, "template": 0, "tags": "base-900;kube-1.32;kube-image"},
+]
+
+
+def test_find_golden_image_takes_newest_matching_template():
+    image = find_golden_image(resources, kube_version="1.32", base_template_id=900)
+    assert image["vmid"] == 912
+
+
+def test_find_golden_image_without_image():
+    assert (
+        find_golden_image(resources, kube_version="1.30", base_template_id=900) is None
+    )
+
+
+def test_golden_image_name_is_dns_valid():
+    assert golden_image_name(kube_version="1.32", base_template_id=900) == (
+        "k8s-v1-32-base-900"
+    )
@@ -0,0 +1,72 @@
+import pytest
+from kubeSetup.commands.utils._proxmox._placement import plan_placement
+from kubeSetup.commands.utils._proxmox._schemas import NodeCapacity, VmDemand
+
+nodes = [
+    NodeCapacity(node="pve1", cores=8, memory=16384),
+    NodeCapacity(node="pve2", cores=8, memory=8192),
+    NodeCapacity(node="pve3", cores=8, memory=4096),
+]
+storage_free = {"ceph": 1000}
+
+
+def demand(vm_id, vm_type, memory, node=None):
+    return VmDemand(
+        vm_id=vm_id,
+        vm_type=vm_type,
+        cores=2,
+        memory=memory,
+        disk=32,
+        storage="ceph",
+        node=node,
+    )
+
+
+def test_masters_are_spread_over_the_nodes():
+    plan = plan_placement(
+        demands=[demand(vm_id, "MASTER", 2048) for vm_id in (101, 102, 103)],
+        nodes=nodes,
+        storage_free=storage_free,
+        shared_storages={"ceph"},
+    )
+    assert sorted(plan.values()) == ["pve1", "pve2", "pve3"]
+
+
+def test_workers_are_packed_into_the_tightest_node():
+    plan = plan_placement(
+        demands=[demand(201, "WORKER", 4096), demand(202, "WORKER", 8192)],
+        nodes=nodes,
+        storage_free=storage_free,
+        shared_storages={"ceph"},
+    )
+    assert plan == {202: "pve2", 201: "pve3"}
+
+
+def test_fixed_vms_consume_the_headroom():
+    plan = plan_placement(
+        demands=[demand(301, "WORKER", 4096, node="pve3"), demand(302, "WORKER", 4096)],
+        nodes=nodes,
+        storage_free=storage_free,
+        shared_storages={"ceph"},
+    )
+    assert plan == {302: "pve2"}
+
+
+def test_local_storage_is_a_hard_limit():
+    with pytest.raises(Exception):
+        plan_placement(
+            demands=[demand(401, "WORKER", 1024)],
+            nodes=nodes,
+            storage_free={"pve1:ceph": 10},
+            shared_storages=set(),
+        )
+
+
+def test_overcommitted_fixed_node_is_rejected():
+    with pytest.raises(Exception):
+        plan_placement(
+            demands=[demand(501, "WORKER", 8192, node="pve3")],
+            nodes=nodes,
+            storage_free=storage_free,
+            shared_storages={"ceph"},
+        )
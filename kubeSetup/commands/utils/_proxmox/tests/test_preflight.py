@@ -0,0 +1,50 @@
+from kubeSetup.commands.utils import ComplexVmConf, VmType
+from kubeSetup.commands.utils._proxmox._preflight import config_problems
+
+
+def _vm(vm_id, ip_address, vm_type=VmType.WORKER, virtual_ip_address=None):
+    return ComplexVmConf(
+        vm_name=f"vm-{vm_id}",
+        vm_type=vm_type,
+        target_name="pve",
+        vm_id=vm_id,
+        tags="kubernetes",
+        clone_type=1,
+        ip_address=ip_address,
+        ip_gw="10.0.0.1",
+        user="tom",
+        ssh_key="/key",
+        pw="secret",
+        virtual_ip_address=virtual_ip_address,
+    )
+
+
+def test_valid_config_has_no_problems():
+    vms = [
+        _vm(101, "10.0.0.11", VmType.LOADBALANCER, "10.0.0.100"),
+        _vm(102, "10.0.0.12", VmType.LOADBALANCER, "10.0.0.100"),
+        _vm(103, "10.0.0.13"),
+    ]
+    assert config_problems(vm_infos=vms, template_id=900) == []
+
+
+def test_clashing_config_is_reported():
+    vms = [
+        _vm(101, "10.0.0.11"),
+        _vm(101, "10.0.0.11"),
+        _vm(900, "10.0.0.1"),
+        _vm(102, "10.0.1.12"),
+        _vm(103, "10.0.0.300"),
+        _vm(104, "10.0.0.14", VmType.LOADBALANCER, "10.0.0.11"),
+    ]
+    problems = "\n".join(config_problems(vm_infos=vms, template_id=900))
+    assert "Duplicate vm_id in the config: 101" in problems
+    assert "Duplicate ip_address in the config: 10.0.0.11" in problems
+    assert "vm-900: the vm_id is the id of the template" in problems
+    assert "vm-900: the ip_address is the gateway" in problems
+    assert "vm-102: the gateway 10.0.0.1 is not in 10.0.1.0/24" in problems
+    assert (
+        "vm-103: '10.0.0.300/24' does not appear to be an IPv4 or IPv6 interface"
+        in problems
+    )
+    assert "the virtual_ip_address 10.0.0.11 is used by vm-101" in problems
@@ -0,0 +1,43 @@
+import logging
+import pytest
+from unittest.mock import MagicMock
+from kubeSetup.commands.utils import VmConf
+from kubeSetup.commands.utils._proxmox._schemas import ReadinessProbe
+from kubeSetup.commands.utils._proxmox._readiness import VmReadiness
+
+
+def _proxmox(states):
+    proxmox = MagicMock()
+    proxmox.nodes.return_value.qemu.side_effect = lambda vm_id: MagicMock(
+        **{"status.current.get.return_value": {"status": states[vm_id]}}
+    )
+    return proxmox
+
+
+def test_wait_for_returns_when_all_vms_are_ready():
+    readiness = VmReadiness(
+        proxmox=_proxmox({100: "stopped", 101: "stopped"}),
+        logger=logging.getLogger("test"),
+        interval=0.01,
+    )
+    readiness.wait_for(
+        vm_infos=[VmConf("test_01", "pve", 100), VmConf("test_02", "pve", 101)],
+        probes=[ReadinessProbe.STOPPED],
+        timeout=1,
+    )
+
+
+def test_wait_for_reports_stuck_vm():
+    readiness = VmReadiness(
+        proxmox=_proxmox({100: "stopped", 101: "running"}),
+        logger=logging.getLogger("test"),
+        interval=0.01,
+    )
+    with pytest.raises(TimeoutError) as err:
+        readiness.wait_for(
+            vm_infos=[VmConf("test_01", "pve", 100), VmConf("test_02", "pve", 101)],
+            probes=[ReadinessProbe.STOPPED],
+            timeout=0,
+        )
+    assert "101 - test_02 (waiting for STOPPED)" in str(err.value)
+    assert "test_01" not in str(err.value)
@@ -0,0 +1,49 @@
+import logging
+import pytest
+from unittest.mock import MagicMock
+from kubeSetup.commands.utils._proxmox._task_tracker import TaskTracker
+
+UPID_01 = "UPID:pve1:0000A1B2:0001C3D4:67000000:qmclone:900:root@pam:"
+UPID_02 = "UPID:pve2:0000A1B3:0001C3D5:67000001:qmclone:900:root@pam:"
+
+
+def _proxmox(task_lists):
+    proxmox = MagicMock()
+    proxmox.nodes.side_effect = lambda node: MagicMock(
+        **{"tasks.get.return_value": task_lists[node]}
+    )
+    return proxmox
+
+
+def test_wait_resolves_tasks_of_all_nodes():
+    proxmox = _proxmox(
+        {
+            "pve1": [{"upid": UPID_01, "endtime": 1, "status": "OK"}],
+            "pve2": [{"upid": UPID_02, "endtime": 1, "status": "OK"}],
+        }
+    )
+    tracker = TaskTracker(
+        proxmox=proxmox, logger=logging.getLogger("test"), min_interval=0.01
+    )
+    tracker.wait(upids=[UPID_01, UPID_02], timeout=5)
+
+
+def test_wait_raises_failed_task():
+    proxmox = _proxmox(
+        {"pve1": [{"upid": UPID_01, "endtime": 1, "status": "clone failed"}]}
+    )
+    tracker = TaskTracker(
+        proxmox=proxmox, logger=logging.getLogger("test"), min_interval=0.01
+    )
+    with pytest.raises(Exception) as err:
+        tracker.wait(upids=[UPID_01], timeout=5)
+    assert "has failed with exit status: clone failed" in str(err.value)
+
+
+def test_wait_times_out_on_running_task():
+    proxmox = _proxmox({"pve1": [{"upid": UPID_01, "status": "running"}]})
+    tracker = TaskTracker(
+        proxmox=proxmox, logger=logging.getLogger("test"), min_interval=0.01
+    )
+    with pytest.raises(TimeoutError):
+        tracker.wait(upids=[UPID_01], timeout=0)
@@ -0,0 +1,39 @@
+import logging
+from unittest.mock import MagicMock
+from kubeSetup.commands.utils._proxmox._template_replicas import TemplateReplicas
+
+existing = {100, 101, 104}
+
+
+def _nextid(vmid=None):
+    if vmid is None:
+        return str(min(set(range(100, 200)) - existing))
+    if vmid in existing:
+        raise Exception(f"400 Bad Request: VM {vmid} already exists")
+    return str(vmid)
+
+
+def test_a_replica_does_not_take_a_planned_vm_id():
+    proxmox = MagicMock()
+    proxmox.cluster.nextid.get.side_effect = _nextid
+    replicas = TemplateReplicas(
+        proxmox=proxmox,
+        template_id=900,
+        tasks=MagicMock(),
+        logger=logging.getLogger("test"),
+        planned_ids={102, 103, 105},
+    )
+    # 102 and 103 are planned, 104 exists and 105 is planned again
+    assert replicas._free_id() == 106
+
+
+def test_a_replica_takes_the_next_id_without_a_plan():
+    proxmox = MagicMock()
+    proxmox.cluster.nextid.get.side_effect = _nextid
+    replicas = TemplateReplicas(
+        proxmox=proxmox,
+        template_id=900,
+        tasks=MagicMock(),
+        logger=logging.getLogger("test"),
+    )
+    assert replicas._free_id() == 102
@@ -9,12 +9,15 @@ __all__ = [
     "NodeType",
     "VmConf",
     "parse_config_file",
+    "parse_build_vm_config_file",
+    "AUTO_PLACEMENT",
 ]
 
 from ._vm_cleanup_conf import parse_config_file
 from ._proxmox_conf import parse_proxmox_config_file
 from ._vm_simple_conf import parse_simple_vm_config_file
 from ._vm_complex_conf import parse_complex_vm_config_file
+from ._vm_build_conf import parse_build_vm_config_file
 from ._schemas import (
     SimpleVmConf,
     VmType,
@@ -22,4 +25,5 @@ from ._schemas import (
     ProxmoxConnection,
     NodeType,
     VmConf,
+    AUTO_PLACEMENT,
 )
@@ -13,6 +13,41 @@ def _converter(conf: dict[str, Any]) -> ProxmoxConnection:
             token=conf["token"],
             ssl_verify=bool(conf["ssl_verify"]),
             template_id=conf["template_id"],
+            clone_limit_per_node=(
+                conf["clone_limit_per_node"]
+                if "clone_limit_per_node" in conf.keys()
+                else 2
+            ),
+            clone_limit_per_storage=(
+                conf["clone_limit_per_storage"]
+                if "clone_limit_per_storage" in conf.keys()
+                else 1
+            ),
+            bwlimit=conf["bwlimit"] if "bwlimit" in conf.keys() else None,
+            guest_agent=(
+                bool(conf["guest_agent"]) if "guest_agent" in conf.keys() else False
+            ),
+            template_replicas=(
+                bool(conf["template_replicas"])
+                if "template_replicas" in conf.keys()
+                else False
+            ),
+            api_pool_size=(
+                conf["api_pool_size"] if "api_pool_size" in conf.keys() else 16
+            ),
+            api_rate_limit=(
+                conf["api_rate_limit"] if "api_rate_limit" in conf.keys() else 20
+            ),
+            api_retries=conf["api_retries"] if "api_retries" in conf.keys() else 3,
+            snippets_storage=(
+                conf["snippets_storage"]
+                if "snippets_storage" in conf.keys()
+                else "local"
+            ),
+            node_user=conf["node_user"] if "node_user" in conf.keys() else None,
+            node_ssh_key=(
+                conf["node_ssh_key"] if "node_ssh_key" in conf.keys() else None
+            ),
         )
     except KeyError:
         raise click.UsageError(
@@ -2,6 +2,9 @@ from enum import Enum
 from typing import Optional
 from dataclasses import dataclass
 
+# target name of the vms, which are placed by the placement engine
+AUTO_PLACEMENT = "auto"
+
 
 class VmType(Enum):
     MASTER = "MASTER"
@@ -37,6 +40,7 @@ class SimpleVmConf:
     cores: Optional[int] = None
     memory: Optional[int] = None
     disk_size: Optional[int] = None
+    storage: Optional[str] = None
 
 
 @dataclass
@@ -53,3 +57,14 @@ class ProxmoxConnection:
     token: str
     ssl_verify: bool
     template_id: int
+    clone_limit_per_node: int = 2
+    clone_limit_per_storage: int = 1
+    bwlimit: Optional[int] = None
+    guest_agent: bool = False
+    template_replicas: bool = False
+    api_pool_size: int = 16
+    api_rate_limit: float = 20
+    api_retries: int = 3
+    snippets_storage: str = "local"
+    node_user: Optional[str] = None
+    node_ssh_key: Optional[str] = None
@@ -1,6 +1,6 @@
 import click
 from typing import Any
-from ._schemas import ComplexVmConf, SimpleVmConf, VmType, NodeType
+from ._schemas import ComplexVmConf, SimpleVmConf, VmType, NodeType, AUTO_PLACEMENT
 
 
 def _converter(conf: Any, simple: bool) -> SimpleVmConf | ComplexVmConf:
@@ -9,7 +9,11 @@ def _converter(conf: Any, simple: bool) -> SimpleVmConf | ComplexVmConf:
             configuration = SimpleVmConf(
                 vm_name=conf["vm_name"],
                 vm_type=VmType(conf["vm_type"].upper()),
-                target_name=conf["target_name"],
+                target_name=(
+                    conf["target_name"]
+                    if "target_name" in conf.keys()
+                    else AUTO_PLACEMENT
+                ),
                 vm_id=conf["vm_id"],
                 tags=conf["tags"],
                 clone_type=conf["clone_type"],
@@ -18,6 +22,7 @@ def _converter(conf: Any, simple: bool) -> SimpleVmConf | ComplexVmConf:
                 cores=conf["cores"] if "cores" in conf.keys() else None,
                 memory=conf["memory"] if "memory" in conf.keys() else None,
                 disk_size=conf["disk_size"] if "disk_size" in conf.keys() else None,
+                storage=conf["storage"] if "storage" in conf.keys() else None,
                 user=conf["user"],
                 ssh_key=conf["ssh_key"],
                 pw=conf["pw"],
@@ -26,7 +31,11 @@ def _converter(conf: Any, simple: bool) -> SimpleVmConf | ComplexVmConf:
             configuration = ComplexVmConf(
                 vm_name=conf["vm_name"],
                 vm_type=VmType(conf["vm_type"].upper()),
-                target_name=conf["target_name"],
+                target_name=(
+                    conf["target_name"]
+                    if "target_name" in conf.keys()
+                    else AUTO_PLACEMENT
+                ),
                 vm_id=conf["vm_id"],
                 tags=conf["tags"],
                 clone_type=conf["clone_type"],
@@ -35,6 +44,7 @@ def _converter(conf: Any, simple: bool) -> SimpleVmConf | ComplexVmConf:
                 cores=conf["cores"] if "cores" in conf.keys() else None,
                 memory=conf["memory"] if "memory" in conf.keys() else None,
                 disk_size=conf["disk_size"] if "disk_size" in conf.keys() else None,
+                storage=conf["storage"] if "storage" in conf.keys() else None,
                 user=conf["user"],
                 ssh_key=conf["ssh_key"],
                 pw=conf["pw"],
@@ -0,0 +1,25 @@
+import json
+import click
+from typing import Any
+from ._schemas import SimpleVmConf
+from ._utils import _converter
+
+
+def parse_build_vm_config_file(
+    _: Any, param: click.Parameter, value: str
+) -> SimpleVmConf:
+    if value.endswith(".json"):
+        with open(value, "r") as file:
+            conf = json.load(file)
+            if isinstance(conf, list):
+                if len(conf) != 1:
+                    raise click.BadParameter(
+                        "There must be exactly one vm be defined in the JSON file."
+                    )
+                conf = conf[0]
+            # the build vm is not part of a cluster, so type and tags are optional
+            return _converter(
+                {"vm_type": "worker", "tags": "kube-image-build", **conf}, simple=True
+            )
+    else:
+        raise click.BadParameter("File must be a JSON file", param=param)
@@ -1,6 +1,6 @@
 import json
 import click
-from typing import Any
+from typing import Any, Optional
 from ._schemas import VmConf
 
 
@@ -19,7 +19,11 @@ def _convert(conf: Any) -> VmConf:
         )
 
 
-def parse_config_file(_: Any, param: click.Parameter, value: str) -> list[VmConf]:
+def parse_config_file(
+    _: Any, param: click.Parameter, value: Optional[str]
+) -> list[VmConf]:
+    if value is None:
+        return []
     if value.endswith(".json"):
         with open(value, "r") as file:
             conf_dict = json.load(file)
@@ -1,6 +1,9 @@
 __all__ = [
     "execute_command",
     "execute_commands",
+    "run_command",
+    "wait_until",
+    "wait_for_first_boot",
     "update_upgrade_cmd",
     "setup_client",
     "get_pwd",
@@ -11,6 +14,18 @@ __all__ = [
     "install_kube_pkgs",
     "setup_calico",
     "kubeadm_init",
+    "kubeadm_join_cmds",
+    "kubeadm_reset",
+    "preconfigure_cmds",
+    "preconfigure_phases",
+    "run_script",
+    "apply_file_edits",
+    "FileEdit",
+    "KeyEdit",
+    "LineEdit",
+    "StepResult",
+    "PRECONFIGURED_MARKER",
+    "generalize_vm",
     "PreconfigureCluster",
     "setup_logger",
     "SSHConnectionPool",
@@ -21,6 +36,9 @@ from ._vm_utils import setup_client
 from ._general_commands import (
     execute_command,
     execute_commands,
+    run_command,
+    wait_until,
+    wait_for_first_boot,
     update_upgrade_cmd,
     get_pwd,
 )
@@ -32,7 +50,16 @@ from ._setup_utils import (
     install_kube_pkgs,
     setup_calico,
     kubeadm_init,
+    kubeadm_join_cmds,
+    kubeadm_reset,
+    preconfigure_cmds,
+    preconfigure_phases,
+    PRECONFIGURED_MARKER,
+    generalize_vm,
 )
+from ._script import run_script
+from ._file_edit import apply_file_edits
+from ._schemas import StepResult, FileEdit, KeyEdit, LineEdit
 from ._preconf import PreconfigureCluster
 from ._logging import setup_logger
 from ._ssh_connection import SSHConnectionPool
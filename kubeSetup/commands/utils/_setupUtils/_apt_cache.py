@@ -0,0 +1,66 @@
+import shlex
+from logging import Logger
+from typing import Optional
+from paramiko import SSHClient
+from .._setup import SimpleVmConf, ComplexVmConf
+from ._general_commands import execute_commands, wait_for_apt, wait_until
+
+APT_CACHE_PORT = 3142
+
+APT_PROXY_FILE = "/etc/apt/apt.conf.d/01kube-setup-proxy"
+
+APT_CACHE_ACTIVE = "systemctl is-active --quiet apt-cacher-ng"
+
+APT_CACHE_INSTALL_CMDS = [
+    "sudo apt-get update",
+    "sudo DEBIAN_FRONTEND=noninteractive apt-get install apt-cacher-ng -y",
+    "sudo systemctl enable --now apt-cacher-ng",
+]
+
+
+def apt_proxy_url(
+    apt_cache: str, vm_infos: list[SimpleVmConf | ComplexVmConf]
+) -> tuple[Optional[SimpleVmConf | ComplexVmConf], str]:
+    """
+    The apt cache is either the name of a vm from the config, which hosts the cache, or the
+    address of an already running apt-cacher-ng, e.g. on the controller.
+    """
+    cache_vm = next((vm for vm in vm_infos if vm.vm_name == apt_cache), None)
+    if cache_vm is not None:
+        return cache_vm, f"http://{cache_vm.ip_address}:{APT_CACHE_PORT}"
+    if "://" not in apt_cache:
+        apt_cache = f"http://{apt_cache}"
+    if apt_cache.count(":") < 2:
+        apt_cache = f"{apt_cache}:{APT_CACHE_PORT}"
+    return None, apt_cache
+
+
+def apt_proxy_setting(apt_proxy: str) -> str:
+    return f'Acquire::http::Proxy "{apt_proxy}";'
+
+
+def apt_proxy_cmd(apt_proxy: str) -> str:
+    """Points apt of the vm at the cache."""
+    return (
+        f"echo {shlex.quote(apt_proxy_setting(apt_proxy))} | sudo tee {APT_PROXY_FILE}"
+    )
+
+
+def cached_repo_cmd(list_file: str) -> str:
+    """
+    apt-cacher-ng can't cache https repos behind a proxy, but fetches them itself, when they are
+    addressed as http://HTTPS///<host>/<path>.
+    """
+    return f"sudo sed -i 's#https://#http://HTTPS///#g' {list_file}"
+
+
+def setup_apt_cache(client: SSHClient, logger: Logger) -> None:
+    """Installs apt-cacher-ng on the vm and waits until it serves."""
+    wait_for_apt(client=client, logger=logger)
+    execute_commands(cmds=APT_CACHE_INSTALL_CMDS, client=client, logger=logger)
+    wait_until(
+        condition=APT_CACHE_ACTIVE,
+        client=client,
+        logger=logger,
+        description="apt-cacher-ng active",
+    )
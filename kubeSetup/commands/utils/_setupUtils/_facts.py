@@ -0,0 +1,150 @@
+import shlex
+from logging import Logger
+from typing import Optional
+from paramiko import SSHClient
+from ._stream import STDOUT, stream_command
+from ._schemas import HostFacts
+from ._apt_cache import APT_PROXY_FILE, apt_proxy_setting
+from ._setup_utils import (
+    SYSCTL_SETTINGS,
+    DOCKER_LIST,
+    KUBE_LIST,
+    CONTAINERD_CONFIG,
+    CONTAINERD_CONFIG_STAMP,
+)
+
+FACT_MARKER = "@@kube-fact"
+
+BASE_PACKAGES = ["nfs-common", "sshpass"]
+
+CONTAINERD_PACKAGES = ["docker-ce", "containerd.io"]
+
+KUBE_PACKAGES = ["kubelet", "kubeadm", "kubectl"]
+
+# every fact is read by one command, a missing file or tool gives an empty fact
+FACT_CMDS = {
+    "packages": "dpkg-query -W -f='${Package}\\t${Version}\\t${db:Status-Abbrev}\\n' "
+    + " ".join(BASE_PACKAGES + CONTAINERD_PACKAGES + KUBE_PACKAGES),
+    "sysctl": "sysctl "
+    + " ".join(setting.split("=")[0] for setting in SYSCTL_SETTINGS),
+    "sysctl_conf": "grep -E '^[^#]*=' /etc/sysctl.conf",
+    "swap": "swapon --noheadings --show=NAME",
+    "fstab_swap": "grep swap /etc/fstab",
+    "containerd_active": "systemctl is-active containerd",
+    "containerd_config": f"sudo sha256sum {CONTAINERD_CONFIG}",
+    "containerd_configured": f"sudo cat {CONTAINERD_CONFIG_STAMP}",
+    "apt_proxy": f"cat {APT_PROXY_FILE}",
+    "docker_repo": f"cat {DOCKER_LIST}",
+    "kube_repo": f"cat {KUBE_LIST}",
+    "images": "sudo ctr -n k8s.io images ls -q",
+    "kube_images": "kubeadm config images list --kubernetes-version $(kubeadm version -o short)",
+}
+
+# the steps, which make up a phase of the bundled scripts
+PHASE_STEPS = {
+    "packages": {"apt_proxy", "packages"},
+    "sysctl": {"sysctl"},
+    "swap": {"swap"},
+    "containerd": {"containerd", "containerd_config"},
+    "kubernetes": {"kubernetes", "images"},
+}
+
+
+def _facts_script() -> str:
+    steps = [
+        f'echo "{FACT_MARKER} {name}"; {cmd} 2> /dev/null'
+        for name, cmd in FACT_CMDS.items()
+    ]
+    return f"bash -c {shlex.quote(chr(10).join([*steps, 'true']))}"
+
+
+def parse_facts(lines: list[str]) -> HostFacts:
+    """Parses the output of the facts script, the lines of every fact follow its marker."""
+    raw: dict[str, list[str]] = {}
+    name = None
+    for line in lines:
+        if line.startswith(f"{FACT_MARKER} "):
+            name = line.split()[1]
+            raw[name] = []
+        elif name is not None and line.strip():
+            raw[name].append(line.strip())
+
+    facts = HostFacts()
+    for line in raw.get("packages", []):
+        package, version, status = (line.split("\t") + ["", ""])[:3]
+        # ii: the package is installed and configured
+        if status.startswith("ii"):
+            facts.packages[package] = version
+    for line in raw.get("sysctl", []):
+        key, _, value = line.partition("=")
+        facts.sysctl[key.strip()] = value.strip()
+    for line in raw.get("sysctl_conf", []):
+        key, _, value = line.partition("=")
+        facts.sysctl_conf[key.strip()] = value.strip()
+    facts.swap_active = bool(raw.get("swap"))
+    facts.swap_in_fstab = bool(raw.get("fstab_swap"))
+    facts.containerd_active = raw.get("containerd_active") == ["active"]
+    facts.containerd_config = _checksum(raw.get("containerd_config"))
+    facts.containerd_configured = _checksum(raw.get("containerd_configured"))
+    facts.apt_proxy = "\n".join(raw.get("apt_proxy", []))
+    facts.docker_repo = "\n".join(raw.get("docker_repo", []))
+    facts.kube_repo = "\n".join(raw.get("kube_repo", []))
+    facts.images = raw.get("images", [])
+    facts.kube_images = raw.get("kube_images", [])
+    return facts
+
+
+def _checksum(lines: Optional[list[str]]) -> Optional[str]:
+    return lines[0].split()[0] if lines else None
+
+
+def gather_facts(client: SSHClient, logger: Logger) -> HostFacts:
+    """Reads every fact of the vm with a single command."""
+    lines: list[str] = []
+    stream_command(
+        cmd=_facts_script(),
+        client=client,
+        logger=logger,
+        on_line=lambda stream, line: lines.append(line) if stream == STDOUT else None,
+    )
+    return parse_facts(lines=lines)
+
+
+def _repo_ok(content: str, apt_proxy: Optional[str]) -> bool:
+    """The repo exists and is fetched through the apt cache, if one is used."""
+    if not content:
+        return False
+    return ("http://HTTPS///" in content) == bool(apt_proxy)
+
+
+def satisfied_steps(
+    facts: HostFacts,
+    kube_version: str,
+    apt_proxy: Optional[str] = None,
+    pull_images: bool = True,
+) -> set[str]:
+    """The preconfiguration steps, whose result is already in place on the vm."""
+    wanted_sysctl = dict(setting.split("=") for setting in SYSCTL_SETTINGS)
+    checks = {
+        "apt_proxy": not apt_proxy or facts.apt_proxy == apt_proxy_setting(apt_proxy),
+        "packages": all(package in facts.packages for package in BASE_PACKAGES),
+        "sysctl": all(
+            facts.sysctl.get(key) == value and facts.sysctl_conf.get(key) == value
+            for key, value in wanted_sysctl.items()
+        ),
+        "swap": not facts.swap_active and not facts.swap_in_fstab,
+        "containerd": facts.containerd_active
+        and all(package in facts.packages for package in CONTAINERD_PACKAGES)
+        and _repo_ok(content=facts.docker_repo, apt_proxy=apt_proxy),
+        "containerd_config": facts.containerd_config is not None
+        and facts.containerd_config == facts.containerd_configured,
+        "kubernetes": all(
+            facts.packages.get(package, "").startswith(f"{kube_version}.")
+            for package in KUBE_PACKAGES
+        )
+        and f"/v{kube_version}/" in facts.kube_repo
+        and _repo_ok(content=facts.kube_repo, apt_proxy=apt_proxy),
+        "images": not pull_images
+        or (bool(facts.kube_images) and set(facts.kube_images) <= set(facts.images)),
+    }
+    return {step for step, satisfied in checks.items() if satisfied}
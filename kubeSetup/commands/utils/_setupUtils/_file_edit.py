@@ -0,0 +1,209 @@
+import re
+import base64
+import shlex
+import hashlib
+import posixpath
+from logging import Logger
+from typing import Optional
+from paramiko import SSHClient
+from ._general_commands import run_command
+from ._stream import STDOUT, stream_command
+from ._schemas import LineEdit, KeyEdit, FileEdit, FileEditReport
+
+FILE_MARKER = "@@kube-file"
+
+
+def render_edits(content: str, edits: list[LineEdit | KeyEdit]) -> str:
+    """Applies the edits to the content, applying them twice gives the same result."""
+    lines = content.splitlines()
+    for edit in edits:
+        new_line: Optional[str]
+        if isinstance(edit, KeyEdit):
+            pattern = re.compile(
+                rf"^(\s*)#*\s*{re.escape(edit.key)}\s*{re.escape(edit.separator.strip())}"
+            )
+            new_line = f"{edit.key}{edit.separator}{edit.value}"
+            append = edit.append
+        else:
+            pattern = re.compile(edit.pattern)
+            new_line = edit.line
+            append = edit.append and edit.line is not None
+
+        edited: list[str] = []
+        matched = False
+        for line in lines:
+            match = pattern.search(line)
+            if match is None:
+                edited.append(line)
+                continue
+            matched = True
+            if new_line is None:
+                continue
+            # the indentation of a key is kept, e.g. in a toml section
+            indent = match.group(1) if isinstance(edit, KeyEdit) else ""
+            edited.append(f"{indent}{new_line}")
+        if not matched and append and new_line is not None:
+            edited.append(new_line)
+        lines = edited
+    return "".join(f"{line}\n" for line in lines)
+
+
+def _awk_string(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _awk_edit(edit: LineEdit | KeyEdit) -> str:
+    """One edit as an awk program, which edits the lines like render_edits."""
+    if isinstance(edit, KeyEdit):
+        # every character of the key outside of [A-Za-z0-9_] is matched literally
+        key = "".join(
+            char if char.isalnum() or char == "_" else f"[{char}]" for char in edit.key
+        )
+        separator = "".join(f"[{char}]" for char in edit.separator.strip())
+        pattern = f"^[[:space:]]*#*[[:space:]]*{key}[[:space:]]*{separator}"
+        new_line: Optional[str] = f"{edit.key}{edit.separator}{edit.value}"
+        append, indent = edit.append, True
+    else:
+        # the pattern is used as extended regex by awk
+        pattern, new_line, indent = edit.pattern, edit.line, False
+        append = edit.append and edit.line is not None
+
+    on_match = "next"
+    if new_line is not None:
+        keep = "match($0, /^[[:space:]]*/); " if indent else ""
+        prefix = "substr($0, 1, RLENGTH) " if indent else ""
+        on_match = f"{keep}print {prefix}line; next"
+    return (
+        f"BEGIN {{ re = {_awk_string(pattern)}; line = {_awk_string(new_line or '')} }} "
+        f"$0 ~ re {{ matched = 1; {on_match} }} "
+        "{ print } "
+        f"END {{ if (!matched && {int(append)}) print line }}"
+    )
+
+
+def file_edit_cmd(file: FileEdit) -> str:
+    """
+    The edits of the file as a single shell command, e.g. for the bundled scripts or cloud-init.
+    The file is only written and its restart only run, if the checksum of the file changes.
+    """
+    quoted = shlex.quote(file.path)
+    source = (
+        f"({file.template_cmd})"
+        if file.template_cmd
+        else f"{{ sudo cat {quoted} 2> /dev/null || true; }}"
+    )
+    edits = " | ".join(f"awk {shlex.quote(_awk_edit(edit))}" for edit in file.edits)
+    changed = (
+        '[ "$(sha256sum < "$edited" | cut -d" " -f1)" != '
+        f'"$({{ sudo cat {quoted} 2> /dev/null || true; }} | sha256sum | cut -d" " -f1)" ]'
+    )
+    write = (
+        f"sudo mkdir -p {shlex.quote(posixpath.dirname(file.path))} && "
+        f'sudo tee {quoted} < "$edited" > /dev/null'
+    )
+    if file.restart:
+        write += f" && {file.restart}"
+    return (
+        f'edited=$(mktemp) && {source} | {edits} > "$edited" && '
+        f'{{ if {changed}; then {write}; else echo "{file.path} is up to date"; fi; }} && '
+        f'rm -f "$edited"'
+    )
+
+
+def _read_script(files: list[FileEdit]) -> str:
+    """Prints every file and template base64 encoded, behind a marker with its index."""
+    steps = []
+    for index, file in enumerate(files):
+        steps.append(
+            f'echo "{FILE_MARKER} {index} file"; '
+            f"sudo base64 -w0 {shlex.quote(file.path)} 2> /dev/null; echo"
+        )
+        if file.template_cmd:
+            steps.append(
+                f'echo "{FILE_MARKER} {index} template"; '
+                f"({file.template_cmd}) | base64 -w0; echo"
+            )
+    return f"bash -c {shlex.quote(chr(10).join(steps))}"
+
+
+def _parse_read_output(lines: list[str]) -> dict[tuple[int, str], str]:
+    chunks: dict[tuple[int, str], list[str]] = {}
+    key = None
+    for line in lines:
+        if line.startswith(f"{FILE_MARKER} "):
+            _, index, kind = line.split()
+            key = (int(index), kind)
+            chunks[key] = []
+        elif key is not None:
+            # a long line can arrive in several parts
+            chunks[key].append(line.strip())
+    return {
+        key: base64.b64decode("".join(parts)).decode() for key, parts in chunks.items()
+    }
+
+
+def _write_step(path: str, current: str, content: str) -> str:
+    """Writes the file, only if it still has the checksum, which it had when it was read."""
+    checksum = hashlib.sha256(current.encode()).hexdigest()
+    encoded = base64.b64encode(content.encode()).decode()
+    quoted = shlex.quote(path)
+    return (
+        f'[ "$(sudo cat {quoted} 2> /dev/null | sha256sum | cut -d" " -f1)" = "{checksum}" ] '
+        f'|| {{ echo "{path} was changed meanwhile" >&2; exit 3; }}\n'
+        f"sudo mkdir -p {shlex.quote(posixpath.dirname(path))}\n"
+        f"echo {encoded} | base64 -d | sudo tee {quoted} > /dev/null"
+    )
+
+
+def apply_file_edits(
+    files: list[FileEdit], client: SSHClient, logger: Logger
+) -> FileEditReport:
+    """
+    Applies the edits of all files with two round trips: one reads all files, one writes the
+    changed ones. Files, whose checksum does not change, are not written. The report holds
+    the changed files and the restarts, which they need.
+    """
+    report = FileEditReport()
+    if not files:
+        return report
+
+    # the files are kept whole, their content is not logged
+    lines: list[str] = []
+    exit_status, _, stderr_tail = stream_command(
+        cmd=_read_script(files=files),
+        client=client,
+        logger=logger,
+        on_line=lambda stream, line: lines.append(line) if stream == STDOUT else None,
+    )
+    if exit_status != 0:
+        raise Exception(
+            f"Reading {', '.join(file.path for file in files)} failed: {chr(10).join(stderr_tail)}"
+        )
+    contents = _parse_read_output(lines=lines)
+
+    writes = []
+    for index, file in enumerate(files):
+        current = contents.get((index, "file"), "")
+        base = (
+            contents.get((index, "template"), current) if file.template_cmd else current
+        )
+        content = render_edits(content=base, edits=file.edits)
+        if content == current:
+            logger.info(f"{file.path} is up to date")
+            continue
+        writes.append(_write_step(path=file.path, current=current, content=content))
+        report.changed.append(file.path)
+        if file.restart and file.restart not in report.restarts:
+            report.restarts.append(file.restart)
+
+    if writes:
+        run_command(
+            cmd=f"bash -c {shlex.quote(chr(10).join(['set -e', *writes]))}",
+            client=client,
+            logger=logger,
+            label=f"write {', '.join(report.changed)}",
+        )
+        logger.info(
+            f"Changed {', '.join(report.changed)}, needs: {', '.join(report.restarts) or 'nothing'}"
+        )
+    return report
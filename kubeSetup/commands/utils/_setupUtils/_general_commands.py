@@ -1,28 +1,132 @@
-from time import sleep
+from time import sleep, perf_counter
 from logging import Logger
+from typing import Optional
 from paramiko import SSHClient
+from ._schemas import StepResult
+from ._stream import stream_command
+
+# true, once no apt or dpkg process holds one of the package locks
+APT_LOCKS_FREE = (
+    "! (command -v fuser > /dev/null && sudo fuser /var/lib/dpkg/lock-frontend "
+    "/var/lib/dpkg/lock /var/lib/apt/lists/lock /var/cache/apt/archives/lock > /dev/null 2>&1)"
+)
+
+# true, once containerd is up and running
+CONTAINERD_ACTIVE = "systemctl is-active --quiet containerd"
+
+# true, once cloud-init finished the first boot, e.g. the package upgrades of the image
+CLOUD_INIT_FINISHED = (
+    "! command -v cloud-init > /dev/null || test -f /var/lib/cloud/instance/boot-finished "
+    "|| cloud-init status --wait > /dev/null 2>&1"
+)
+
+
+def run_command(
+    cmd: str,
+    client: SSHClient,
+    logger: Logger,
+    check: bool = True,
+    label: Optional[str] = None,
+) -> StepResult:
+    """
+    Executes a single SSH command, streams its output into the log and waits for its exit
+    status. Raises, if check is set and the command failed. The label replaces the command
+    in the log, e.g. if it carries a whole file.
+    """
+    start = perf_counter()
+    exit_status, stdout_tail, stderr_tail = stream_command(
+        cmd=cmd, client=client, logger=logger
+    )
+    result = StepResult(
+        cmd=cmd,
+        exit_status=exit_status,
+        duration=perf_counter() - start,
+        output=_joined(stdout_tail),
+    )
+    logger.info(
+        f"{label or cmd} -> exit {result.exit_status} in {result.duration:.1f}s"
+    )
+    if check and not result.ok:
+        raise Exception(
+            f"'{label or cmd}' failed with exit status {result.exit_status}: "
+            f"{(_joined(stderr_tail) or result.output).strip()[-2000:]}"
+        )
+    return result
 
 
 def execute_command(cmd: str, client: SSHClient, logger: Logger) -> tuple[str, str]:
-    """Execute a single SSH command and log its output."""
-    stdin, stdout, stderr = client.exec_command(cmd)
-    stdout_str, stderr_str = stdout.read().decode(), stderr.read().decode()
-    logger.info(f"{cmd}: {stdout_str} | {stderr_str}")
-    return stdout_str, stderr_str
+    """
+    Execute a single SSH command and stream its output into the log, without checking the
+    exit status. Returns the tails of stdout and stderr.
+    """
+    exit_status, stdout_tail, stderr_tail = stream_command(
+        cmd=cmd, client=client, logger=logger
+    )
+    logger.info(f"{cmd} -> exit {exit_status}")
+    return _joined(stdout_tail), _joined(stderr_tail)
+
+
+def _joined(lines: list[str]) -> str:
+    return "".join(f"{line}\n" for line in lines)
+
 
+def execute_commands(
+    cmds: list[str], client: SSHClient, logger: Logger
+) -> list[StepResult]:
+    """Execute a list of commands one after the other, stops at the first failed command."""
+    return [run_command(cmd=cmd, client=client, logger=logger) for cmd in cmds]
 
-def execute_commands(cmds: list[str], client: SSHClient, logger: Logger) -> None:
-    """Execute a list of commands with a delay and log output."""
-    for cmd in cmds:
-        sleep(1)
-        execute_command(cmd, client, logger)
-        sleep(1)
+
+def wait_until(
+    condition: str,
+    client: SSHClient,
+    logger: Logger,
+    description: str,
+    timeout: float = 300,
+    interval: float = 2,
+) -> None:
+    """Polls the remote condition until it exits with 0, raises after the timeout."""
+    start = perf_counter()
+    while True:
+        _, stdout, _ = client.exec_command(condition)
+        stdout.read()
+        if stdout.channel.recv_exit_status() == 0:
+            logger.info(f"{description} after {perf_counter() - start:.1f}s")
+            return
+        if perf_counter() - start > timeout:
+            raise TimeoutError(f"Timed out after {timeout}s waiting for: {description}")
+        sleep(interval)
+
+
+def wait_for_first_boot(
+    client: SSHClient, logger: Logger, timeout: float = 600
+) -> None:
+    """Waits, until cloud-init finished the first boot, so nothing is cut off by a shutdown."""
+    wait_until(
+        condition=CLOUD_INIT_FINISHED,
+        client=client,
+        logger=logger,
+        description="cloud-init finished",
+        timeout=timeout,
+    )
+
+
+def wait_for_apt(client: SSHClient, logger: Logger, timeout: float = 600) -> None:
+    """Waits, until e.g. unattended-upgrades released the dpkg and apt locks."""
+    wait_until(
+        condition=APT_LOCKS_FREE,
+        client=client,
+        logger=logger,
+        description="apt locks released",
+        timeout=timeout,
+    )
 
 
 def update_upgrade_cmd(client: SSHClient, upgrade: bool, logger: Logger) -> None:
-    execute_command("sudo apt-get update", client, logger=logger)
+    wait_for_apt(client=client, logger=logger)
+    run_command("sudo apt-get update", client, logger=logger)
     if upgrade:
-        execute_command("sudo apt-get upgrade -y", client, logger=logger)
+        run_command("sudo apt-get upgrade -y", client, logger=logger)
 
 
 def get_pwd(client: SSHClient, logger: Logger) -> str:
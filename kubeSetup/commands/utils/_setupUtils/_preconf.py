@@ -1,15 +1,32 @@
 import logging
+from typing import Optional
 from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ._ssh_connection import SSHConnectionPool
 from .._setup import SimpleVmConf, ComplexVmConf, VmType
-from ._general_commands import update_upgrade_cmd, execute_command
+from .._checkpoint import BuildState, BuildPhase
+from ._general_commands import update_upgrade_cmd, execute_command, run_command
 from ._setup_utils import (
     conf_sysctl,
     turnoff_swap,
     install_containerd,
     configure_containerd,
     install_kube_pkgs,
+    pull_kube_images,
+    preconfigure_phases,
+    PRECONFIGURED_MARKER,
 )
+from ._script import run_script
+from ._facts import gather_facts, satisfied_steps, PHASE_STEPS
+from ._apt_cache import apt_proxy_url, apt_proxy_cmd, setup_apt_cache
+
+# packages, which are installed on every vm before the preconfiguration
+PACKAGE_CMDS = [
+    "sudo apt-get update",
+    "sudo apt-get upgrade -y",
+    "sudo apt-get install nfs-common -y",
+    "sudo apt-get install sshpass -y",
+]
 
 
 class PreconfigureCluster:
@@ -19,78 +36,286 @@ class PreconfigureCluster:
         vm_infos: list[SimpleVmConf | ComplexVmConf],
         logger: logging.Logger,
         kube_version: str,
+        max_parallel: int = 10,
+        bundle_scripts: bool = False,
+        apt_cache: Optional[str] = None,
+        pull_images: bool = True,
+        state: Optional[BuildState] = None,
     ) -> None:
         self.vm_infos = vm_infos
         self.logger = logger
         self.kube_version = kube_version
+        self.max_parallel = max(1, max_parallel)
+        self.bundle_scripts = bundle_scripts
+        self.apt_cache = apt_cache
+        self.pull_images = pull_images
+        # url of the apt cache, once it is prepared
+        self.apt_proxy: Optional[str] = None
+        # the vms, which are already preconfigured, are skipped
+        self.state = state or BuildState(logger=logger)
 
     def preconfigure_vms(
         self, ssh_pool_manager: SSHConnectionPool
     ) -> tuple[dict[str, list[SimpleVmConf | ComplexVmConf]], SSHConnectionPool]:
+        """
+        Preconfigures the vms concurrently, at most max_parallel at a time. A failing vm does not
+        stop the others, all failures are reported together once every vm is done.
+        The vms, which finished their preconfiguration in a previous build, are skipped.
+        """
+        # check if the vm type is of type load balancer, so preconfigure need to happen
+        vms = self.state.pending(
+            vm_infos=[
+                vm
+                for vm in self.vm_infos
+                if not (
+                    isinstance(vm, ComplexVmConf) and vm.vm_type == VmType.LOADBALANCER
+                )
+            ],
+            phase=BuildPhase.PRECONFIGURE,
+        )
 
-        for vm in self.vm_infos:
+        # connect to all vms at once, the load balancers are needed later on
+        ssh_pool_manager.warm_up(vm_infos=self.vm_infos, max_workers=self.max_parallel)
+
+        # the cache is ready, before any vm fetches its packages
+        apt_proxy = self.prepare_apt_cache(ssh_pool_manager=ssh_pool_manager)
 
-            # check if the vm type is of type load balancer, so preconfigure need to happen
-            if isinstance(vm, ComplexVmConf) and vm.vm_type == VmType.LOADBALANCER:
-                continue
+        failed: dict[str, BaseException] = {}
+        if vms:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_parallel, len(vms)),
+                thread_name_prefix="preconfigure",
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        self._preconfigure_vm,
+                        vm=vm,
+                        ssh_pool_manager=ssh_pool_manager,
+                        apt_proxy=apt_proxy,
+                    ): vm
+                    for vm in vms
+                }
+                for future in as_completed(futures):
+                    vm = futures[future]
+                    error = future.exception()
+                    if error is not None:
+                        self.logger.error(
+                            f"Preconfiguration of {vm.vm_name} ({vm.ip_address}) failed: {error}"
+                        )
+                        failed[f"{vm.vm_name} ({vm.ip_address}): {error}"] = error
 
-            self.logger.warning(
-                f"\n\nSetup vm {vm.vm_name} with ip: {vm.ip_address}\n\n"
+        if failed:
+            raise Exception(
+                "The preconfiguration failed on:\n"
+                + "\n".join(f"  - {vm}" for vm in failed.keys())
             )
 
-            # set up the connection and hold it, to avoid multiple open anc close issues
-            client_connection = ssh_pool_manager.get_connection(
-                ip_address=vm.ip_address,
-                user=vm.user,
-                ssh_key=vm.ssh_key,
+        # return the grouped vms
+        return self._group_vms(), ssh_pool_manager
+
+    def prepare_apt_cache(self, ssh_pool_manager: SSHConnectionPool) -> Optional[str]:
+        """Sets up the apt cache on its vm, if it is hosted by one, and returns its url."""
+        if not self.apt_cache:
+            return None
+        cache_vm, apt_proxy = apt_proxy_url(
+            apt_cache=self.apt_cache, vm_infos=self.vm_infos
+        )
+        if cache_vm is not None:
+            self.logger.info(f"Setup the apt cache on {cache_vm.vm_name}")
+            setup_apt_cache(
+                client=ssh_pool_manager.get_connection(
+                    ip_address=cache_vm.ip_address,
+                    user=cache_vm.user,
+                    ssh_key=cache_vm.ssh_key,
+                ),
+                logger=self.host_logger(vm=cache_vm),
             )
+        self.logger.info(f"All vms fetch their packages through {apt_proxy}")
+        self.apt_proxy = apt_proxy
+        return apt_proxy
 
-            # update and upgrade the vm
-            update_upgrade_cmd(
-                client=client_connection, upgrade=True, logger=self.logger
+    def preconfigure_vm(
+        self, vm: SimpleVmConf | ComplexVmConf, ssh_pool_manager: SSHConnectionPool
+    ) -> None:
+        """
+        Preconfigures a single vm in the calling thread, through the apt cache, once it is prepared.
+        Load balancers and the vms, which finished their preconfiguration in a previous build,
+        are skipped.
+        """
+        if (
+            isinstance(vm, ComplexVmConf) and vm.vm_type == VmType.LOADBALANCER
+        ) or self.state.is_done(vm=vm, phase=BuildPhase.PRECONFIGURE):
+            return
+        self._preconfigure_vm(
+            vm=vm, ssh_pool_manager=ssh_pool_manager, apt_proxy=self.apt_proxy
+        )
+
+    def _preconfigure_vm(
+        self,
+        vm: SimpleVmConf | ComplexVmConf,
+        ssh_pool_manager: SSHConnectionPool,
+        apt_proxy: Optional[str] = None,
+    ) -> None:
+        with self.state.track(vm=vm, phase=BuildPhase.PRECONFIGURE):
+            self._preconfigure_steps(
+                vm=vm, ssh_pool_manager=ssh_pool_manager, apt_proxy=apt_proxy
             )
 
+    def _preconfigure_steps(
+        self,
+        vm: SimpleVmConf | ComplexVmConf,
+        ssh_pool_manager: SSHConnectionPool,
+        apt_proxy: Optional[str] = None,
+    ) -> None:
+        logger = self.host_logger(vm=vm)
+        logger.warning(f"Setup vm {vm.vm_name} with ip: {vm.ip_address}")
+
+        # set up the connection and hold it, to avoid multiple open anc close issues
+        client_connection = ssh_pool_manager.get_connection(
+            ip_address=vm.ip_address,
+            user=vm.user,
+            ssh_key=vm.ssh_key,
+        )
+
+        # the steps, whose result is already in place, are skipped
+        satisfied = satisfied_steps(
+            facts=gather_facts(client=client_connection, logger=logger),
+            kube_version=self.kube_version,
+            apt_proxy=apt_proxy,
+            pull_images=self.pull_images,
+        )
+        if satisfied:
+            logger.info(f"Already satisfied: {', '.join(sorted(satisfied))}")
+
+        if self.bundle_scripts:
+            # every phase is a single remote script
+            for phase, cmds in {
+                "packages": [
+                    *([apt_proxy_cmd(apt_proxy)] if apt_proxy else []),
+                    *PACKAGE_CMDS,
+                ],
+                **preconfigure_phases(
+                    kube_version=self.kube_version,
+                    apt_proxy=apt_proxy,
+                    pull_images=self.pull_images,
+                ),
+            }.items():
+                if PHASE_STEPS[phase] <= satisfied:
+                    continue
+                run_script(
+                    name=phase, cmds=cmds, client=client_connection, logger=logger
+                )
+            logger.info(f"Preconfiguration of {vm.vm_name} is done.")
+            return
+
+        # fetch the packages through the apt cache
+        if apt_proxy and "apt_proxy" not in satisfied:
+            run_command(
+                cmd=apt_proxy_cmd(apt_proxy), client=client_connection, logger=logger
+            )
+
+        if "packages" not in satisfied:
+            # update and upgrade the vm
+            update_upgrade_cmd(client=client_connection, upgrade=True, logger=logger)
+
             # install nfs, so it's available for later use
-            execute_command(
+            run_command(
                 cmd="sudo apt-get install nfs-common -y",
                 client=client_connection,
-                logger=self.logger,
+                logger=logger,
             )
 
             # install sshpass for simple ssh password
-            execute_command(
+            run_command(
                 cmd="sudo apt-get install sshpass -y",
                 client=client_connection,
-                logger=self.logger,
+                logger=logger,
             )
 
-            # config sysctl
-            conf_sysctl(client=client_connection, logger=self.logger)
+        # config sysctl
+        if "sysctl" not in satisfied:
+            conf_sysctl(client=client_connection, logger=logger)
 
-            # turn off swap
-            turnoff_swap(client=client_connection, logger=self.logger)
+        # turn off swap
+        if "swap" not in satisfied:
+            turnoff_swap(client=client_connection, logger=logger)
 
+        if "containerd" not in satisfied:
             # update
-            update_upgrade_cmd(
-                client=client_connection, upgrade=False, logger=self.logger
-            )
+            update_upgrade_cmd(client=client_connection, upgrade=False, logger=logger)
 
             # install containerd
-            install_containerd(client=client_connection, logger=self.logger)
+            install_containerd(
+                client=client_connection, logger=logger, apt_proxy=apt_proxy
+            )
 
-            # configure containerd
-            configure_containerd(client=client_connection, logger=self.logger)
+        # configure containerd
+        if "containerd_config" not in satisfied:
+            configure_containerd(client=client_connection, logger=logger)
 
-            # install kubernetes packages
+        # install kubernetes packages
+        if "kubernetes" not in satisfied:
             install_kube_pkgs(
                 client=client_connection,
-                logger=self.logger,
+                logger=logger,
                 kube_version=self.kube_version,
+                apt_proxy=apt_proxy,
+                pull_images=False,
             )
 
-        # return the grouped vms
+        # pull the images of the control plane
+        if "images" not in satisfied:
+            pull_kube_images(client=client_connection, logger=logger)
+        logger.info(f"Preconfiguration of {vm.vm_name} is done.")
+
+    def host_logger(self, vm: SimpleVmConf | ComplexVmConf) -> logging.Logger:
+        """Child logger, so every line of the concurrent vms carries the name of the vm."""
+        return self.logger.getChild(vm.vm_name)
+
+    def preconfigured_by_image(
+        self, ssh_pool_manager: SSHConnectionPool
+    ) -> tuple[dict[str, list[SimpleVmConf | ComplexVmConf]], SSHConnectionPool]:
+        """The vms are cloned from a golden image, so they are already preconfigured."""
+        self.logger.info(
+            "The vms are cloned from a golden image, skip preconfiguration."
+        )
+        ssh_pool_manager.warm_up(vm_infos=self.vm_infos, max_workers=self.max_parallel)
+        for vm in self.vm_infos:
+            self.state.done(vm=vm, phase=BuildPhase.PRECONFIGURE)
         return self._group_vms(), ssh_pool_manager
 
+    def wait_for_cloud_init_vm(
+        self, vm: SimpleVmConf | ComplexVmConf, ssh_pool_manager: SSHConnectionPool
+    ) -> None:
+        """Waits until the single vm finished its preconfiguration via cloud-init."""
+        state = self._cloud_init_state(vm=vm, ssh_pool_manager=ssh_pool_manager)
+        if state != "done":
+            raise Exception(
+                f"The preconfiguration via cloud-init failed on: {vm.vm_name} ({state})!"
+            )
+        self.state.done(vm=vm, phase=BuildPhase.PRECONFIGURE)
+
+    def _cloud_init_state(
+        self, vm: SimpleVmConf | ComplexVmConf, ssh_pool_manager: SSHConnectionPool
+    ) -> str:
+        client_connection = ssh_pool_manager.get_connection(
+            ip_address=vm.ip_address,
+            user=vm.user,
+            ssh_key=vm.ssh_key,
+        )
+        # blocks until cloud-init finished all stages
+        execute_command(
+            cmd="cloud-init status --wait",
+            client=client_connection,
+            logger=self.host_logger(vm=vm),
+        )
+        state, _ = execute_command(
+            cmd=f"sudo cat {PRECONFIGURED_MARKER}",
+            client=client_connection,
+            logger=self.host_logger(vm=vm),
+        )
+        return state.strip() or "no completion marker"
+
     def _group_vms(self) -> dict[str, list[SimpleVmConf | ComplexVmConf]]:
         return {
             vm_type: list(grouped_vm)
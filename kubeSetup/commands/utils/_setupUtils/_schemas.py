@@ -0,0 +1,76 @@
+from typing import Optional
+from dataclasses import dataclass, field
+
+
+@dataclass
+class StepResult:
+    cmd: str
+    # None, if the step never finished, e.g. as a previous step failed
+    exit_status: Optional[int]
+    # seconds
+    duration: float
+    output: str
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_status == 0
+
+
+@dataclass
+class LineEdit:
+    """Replaces every line, which matches the regex pattern, by the line or drops it for None."""
+
+    pattern: str
+    line: Optional[str] = None
+    # appends the line, if no line matches
+    append: bool = False
+
+
+@dataclass
+class KeyEdit:
+    """Sets the value of a key, a commented out key is uncommented."""
+
+    key: str
+    value: str
+    separator: str = "="
+    # appends the key, if the file does not contain it
+    append: bool = True
+
+
+@dataclass
+class FileEdit:
+    path: str
+    edits: list[LineEdit | KeyEdit]
+    # command, which is needed to apply a changed file
+    restart: Optional[str] = None
+    # command, whose output is edited instead of the current file, e.g. a default config
+    template_cmd: Optional[str] = None
+
+
+@dataclass
+class FileEditReport:
+    changed: list[str] = field(default_factory=list)
+    restarts: list[str] = field(default_factory=list)
+
+
+@dataclass
+class HostFacts:
+    """State of a vm, which is gathered in one round trip, before it is preconfigured."""
+
+    # package name -> installed version
+    packages: dict[str, str] = field(default_factory=dict)
+    # sysctl key -> value of the running kernel and of /etc/sysctl.conf
+    sysctl: dict[str, str] = field(default_factory=dict)
+    sysctl_conf: dict[str, str] = field(default_factory=dict)
+    swap_active: bool = False
+    swap_in_fstab: bool = False
+    containerd_active: bool = False
+    # checksum of the containerd config and the one, which was recorded after its configuration
+    containerd_config: Optional[str] = None
+    containerd_configured: Optional[str] = None
+    apt_proxy: str = ""
+    docker_repo: str = ""
+    kube_repo: str = ""
+    # images in containerd and the ones, which kubeadm needs
+    images: list[str] = field(default_factory=list)
+    kube_images: list[str] = field(default_factory=list)
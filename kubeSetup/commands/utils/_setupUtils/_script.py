@@ -0,0 +1,120 @@
+import re
+import shlex
+from logging import Logger
+from collections import deque
+from typing import Optional
+from paramiko import SSHClient
+from ._schemas import StepResult
+from ._stream import TAIL_LINES, STDOUT, stream_command, host_of, log_line
+
+STEP_FUNCTION = "__kube_step"
+STEP_MARKER = "@@kube-step"
+
+# runs one step in its own shell and frames its output with markers, which carry the
+# exit status and the duration in milliseconds
+_STEP_DEFINITION = f"""{STEP_FUNCTION}() {{
+  echo "{STEP_MARKER}-start $1"
+  local start=$(date +%s%N)
+  bash -c "$2" 2>&1 < /dev/null
+  local rc=$?
+  printf '\\n{STEP_MARKER}-end %s %s %s\\n' "$1" "$rc" "$(( ($(date +%s%N) - start) / 1000000 ))"
+  return $rc
+}}
+"""
+
+_MARKER_PATTERN = re.compile(rf"^{STEP_MARKER}-(start|end) (\d+)(?: (\d+) (\d+))?$")
+
+
+def compile_script(cmds: list[str], stop_on_error: bool = True) -> str:
+    """Compiles the commands into one shell script, which is run with a single exec."""
+    lines = [_STEP_DEFINITION]
+    for index, cmd in enumerate(cmds):
+        step = f"{STEP_FUNCTION} {index} {shlex.quote(cmd)}"
+        lines.append(f"{step} || exit $?" if stop_on_error else step)
+    return f"bash -c {shlex.quote(chr(10).join(lines))}"
+
+
+def script_steps(script: str) -> list[str]:
+    """The commands of a compiled script."""
+    steps: list[str] = []
+    for line in shlex.split(script)[-1].splitlines():
+        if line.startswith(f"{STEP_FUNCTION} "):
+            steps.append(shlex.split(line)[2])
+    return steps
+
+
+class ScriptOutput:
+    """Assigns the streamed lines of a compiled script to its steps, by their markers."""
+
+    def __init__(self, cmds: list[str], tail_lines: int = TAIL_LINES) -> None:
+        self.results = [
+            StepResult(cmd=cmd, exit_status=None, duration=0.0, output="")
+            for cmd in cmds
+        ]
+        self.tail_lines = tail_lines
+        self.current: Optional[int] = None
+        self.lines: deque[str] = deque(maxlen=tail_lines)
+
+    def feed(self, line: str) -> Optional[StepResult]:
+        """Returns the result of a step, once its end marker is read."""
+        marker = _MARKER_PATTERN.match(line)
+        if marker is None:
+            if self.current is not None:
+                self.lines.append(line)
+            return None
+        index = int(marker.group(2))
+        if marker.group(1) == "start":
+            self.current, self.lines = index, deque(maxlen=self.tail_lines)
+            return None
+        self.current = None
+        if index >= len(self.results):
+            return None
+        result = self.results[index]
+        result.exit_status = int(marker.group(3))
+        result.duration = int(marker.group(4)) / 1000
+        result.output = "\n".join(self.lines).strip()
+        return result
+
+
+def run_script(
+    name: str,
+    cmds: list[str],
+    client: SSHClient,
+    logger: Logger,
+    stop_on_error: bool = True,
+) -> list[StepResult]:
+    """
+    Runs all commands of a phase as one remote script over a single channel and returns the
+    exit status, duration and output of every step. The output is streamed into the log while
+    the script runs. Raises on the first failed step.
+    """
+    host = host_of(client=client)
+    parser = ScriptOutput(cmds=cmds)
+
+    def on_line(stream: str, line: str) -> None:
+        result = parser.feed(line) if stream == STDOUT else None
+        if result is not None:
+            logger.info(
+                f"{name}: {result.cmd} -> exit {result.exit_status} in {result.duration:.1f}s"
+            )
+        elif line and not line.startswith(STEP_MARKER):
+            log_line(logger=logger, host=host, stream=stream, line=line)
+
+    _, _, stderr_tail = stream_command(
+        cmd=compile_script(cmds=cmds, stop_on_error=stop_on_error),
+        client=client,
+        logger=logger,
+        on_line=on_line,
+    )
+    results = parser.results
+
+    failed = next((result for result in results if not result.ok), None)
+    if failed is not None:
+        raise Exception(
+            f"{name} failed at '{failed.cmd}' with exit status {failed.exit_status}: "
+            f"{(failed.output or chr(10).join(stderr_tail))[-2000:]}"
+        )
+    logger.info(
+        f"{name} finished {len(results)} steps in {sum(r.duration for r in results):.1f}s"
+    )
+    return results
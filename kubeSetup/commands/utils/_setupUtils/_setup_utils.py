@@ -1,118 +1,234 @@
-from time import sleep
+import shlex
 from logging import Logger
 from typing import Optional
 from paramiko.client import SSHClient
-from ._general_commands import execute_command, execute_commands, update_upgrade_cmd
+from ._general_commands import (
+    run_command,
+    execute_commands,
+    update_upgrade_cmd,
+    wait_until,
+    wait_for_apt,
+    APT_LOCKS_FREE,
+    CONTAINERD_ACTIVE,
+)
+from ._apt_cache import cached_repo_cmd
+from ._file_edit import apply_file_edits, file_edit_cmd
+from ._schemas import LineEdit, KeyEdit, FileEdit, FileEditReport
 
+PRECONFIGURED_MARKER = "/var/lib/kube-setup/preconfigured"
 
-def _modify_file(
-    client: SSHClient, file_path: str, settings: list[str], uncomment: bool
-) -> None:
-    """Modify specified settings in a file."""
-    _, stdout, _ = client.exec_command(f"sudo cat {file_path}")
-    file_contents = stdout.readlines()
-
-    new_lines = []
-    for line in file_contents:
-        matched_setting = next(
-            (setting for setting in settings if setting in line), None
-        )
-        if matched_setting:
-            if uncomment:
-                new_lines.append(line.lstrip("#").strip() + "\n")
-            else:
-                if "pause:3.8" in matched_setting:
-                    new_lines.append(line.replace("3.8", "3.9"))
-                else:
-                    new_lines.append(line.replace("false", "true"))
-        else:
-            new_lines.append(line)
-
-    new_file_contents = "".join(new_lines)
-    stdin, _, _ = client.exec_command(f"sudo tee {file_path} > /dev/null")
-    stdin.write(new_file_contents)
-    stdin.flush()
+SYSCTL_SETTINGS = ["net.ipv4.ip_forward=1", "net.ipv6.conf.all.forwarding=1"]
+
+CONTAINERD_REQUIREMENTS_CMD = (
+    "sudo apt-get install apt-transport-https ca-certificates curl jq -y"
+)
+
+DOCKER_LIST = "/etc/apt/sources.list.d/docker.list"
+
+KUBE_LIST = "/etc/apt/sources.list.d/kubernetes.list"
+
+DOCKER_REPO_CMDS = [
+    "sudo install -m 0755 -d /etc/apt/keyrings",
+    "sudo curl -fsSL https://download.docker.com/linux/ubuntu/gpg -o /etc/apt/keyrings/docker.asc",
+    'echo deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.asc] https://download.docker.com/linux/ubuntu $(. /etc/os-release && echo "$VERSION_CODENAME") stable | sudo tee /etc/apt/sources.list.d/docker.list > /dev/null',
+    "cat /etc/apt/sources.list.d/docker.list",
+]
+
+CONTAINERD_INSTALL_CMD = "sudo apt-get install docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin -y"
+
+CONTAINERD_CONFIG = "/etc/containerd/config.toml"
+
+# checksum of the containerd config, which is recorded once it is configured
+CONTAINERD_CONFIG_STAMP = "/var/lib/kube-setup/containerd-config.sha256"
+
+CONTAINERD_STAMP_CMD = (
+    f"sudo mkdir -p /var/lib/kube-setup && "
+    f"sudo sha256sum {CONTAINERD_CONFIG} | sudo tee {CONTAINERD_CONFIG_STAMP} > /dev/null"
+)
+
+CONTAINERD_PAUSE_IMAGE = "registry.k8s.io/pause:3.9"
+
+# waits for the calico pods on every node, the nodes get ready once the cni is up
+CALICO_READY_CMD = (
+    "kubectl -n kube-system rollout status daemonset/calico-node --timeout=300s"
+)
+
+KUBE_INSTALL_CMDS = [
+    "sudo apt-get install kubelet kubeadm kubectl -y",
+]
+
+KUBE_IMAGES_PULL_CMD = "sudo kubeadm config images pull"
+
+
+def poll_cmd(condition: str, timeout: int = 300) -> str:
+    """Shell step, which polls the condition until it holds, for the bundled scripts."""
+    return f"timeout {timeout} bash -c {shlex.quote(f'until {condition}; do sleep 2; done')}"
+
+
+def kube_repo_cmds(kube_version: str) -> list[str]:
+    return [
+        f"sudo curl -fsSL https://pkgs.k8s.io/core:/stable:/v{kube_version}/deb/Release.key | sudo gpg --dearmor -o /etc/apt/keyrings/kubernetes-apt-keyring.gpg",
+        f"echo 'deb [signed-by=/etc/apt/keyrings/kubernetes-apt-keyring.gpg] https://pkgs.k8s.io/core:/stable:/v{kube_version}/deb/ /' | sudo tee /etc/apt/sources.list.d/kubernetes.list",
+        "cat /etc/apt/sources.list.d/kubernetes.list",
+    ]
+
+
+def preconfigure_phases(
+    kube_version: str, apt_proxy: Optional[str] = None, pull_images: bool = True
+) -> dict[str, list[str]]:
+    """
+    All preconfiguration steps of a vm as plain shell commands, grouped by their phase. The files
+    are edited by the same FileEdits as in the step by step preconfiguration. With an apt proxy,
+    the https repos are fetched through the cache too. Without pull_images, the images are
+    distributed later on instead of pulled by every vm.
+    """
+    return {
+        "sysctl": [file_edit_cmd(sysctl_edit())],
+        "swap": ["sudo swapoff -a", file_edit_cmd(fstab_edit())],
+        "containerd": [
+            poll_cmd(APT_LOCKS_FREE, timeout=600),
+            CONTAINERD_REQUIREMENTS_CMD,
+            *DOCKER_REPO_CMDS,
+            *([cached_repo_cmd(DOCKER_LIST)] if apt_proxy else []),
+            "sudo apt-get update",
+            CONTAINERD_INSTALL_CMD,
+            file_edit_cmd(containerd_edit()),
+            poll_cmd(CONTAINERD_ACTIVE),
+            CONTAINERD_STAMP_CMD,
+        ],
+        "kubernetes": [
+            *kube_repo_cmds(kube_version=kube_version),
+            *([cached_repo_cmd(KUBE_LIST)] if apt_proxy else []),
+            poll_cmd(APT_LOCKS_FREE, timeout=600),
+            "sudo apt-get update",
+            *KUBE_INSTALL_CMDS,
+            *([KUBE_IMAGES_PULL_CMD] if pull_images else []),
+        ],
+    }
+
+
+def preconfigure_cmds(kube_version: str) -> list[str]:
+    """All preconfiguration steps of a vm as plain shell commands, e.g. for a cloud-init script."""
+    return [
+        cmd
+        for cmds in preconfigure_phases(kube_version=kube_version).values()
+        for cmd in cmds
+    ]
+
+
+def sysctl_edit() -> FileEdit:
+    return FileEdit(
+        path="/etc/sysctl.conf",
+        edits=[
+            KeyEdit(key=key, value=value)
+            for key, value in (setting.split("=") for setting in SYSCTL_SETTINGS)
+        ],
+        restart="sudo sysctl -p",
+    )
+
+
+def fstab_edit() -> FileEdit:
+    """Drops the swap entries, so swap stays off after a reboot."""
+    return FileEdit(path="/etc/fstab", edits=[LineEdit(pattern="swap")])
+
+
+def containerd_edit() -> FileEdit:
+    """The default config of containerd, with systemd as the cgroup driver."""
+    return FileEdit(
+        path=CONTAINERD_CONFIG,
+        edits=[
+            KeyEdit(
+                key="sandbox_image",
+                value=f'"{CONTAINERD_PAUSE_IMAGE}"',
+                separator=" = ",
+                append=False,
+            ),
+            KeyEdit(key="SystemdCgroup", value="true", separator=" = ", append=False),
+        ],
+        restart="sudo systemctl restart containerd",
+        template_cmd="sudo containerd config default",
+    )
+
+
+def apply_restarts(report: FileEditReport, client: SSHClient, logger: Logger) -> None:
+    """Runs only the restarts, which the changed files need."""
+    for restart in report.restarts:
+        run_command(restart, client, logger)
 
 
 def conf_sysctl(client: SSHClient, logger: Logger) -> None:
     """Configure sysctl settings."""
-    settings = ["net.ipv4.ip_forward=1", "net.ipv6.conf.all.forwarding=1"]
-    _modify_file(
-        client=client, file_path="/etc/sysctl.conf", settings=settings, uncomment=True
-    )
-    execute_command("sudo sysctl -p", client, logger)
+    report = apply_file_edits(files=[sysctl_edit()], client=client, logger=logger)
+    apply_restarts(report=report, client=client, logger=logger)
 
 
 def turnoff_swap(client: SSHClient, logger: Logger) -> None:
-    swap_commands = ["sudo swapoff -a", "sudo sed -i '/swap/d' /etc/fstab"]
-    execute_commands(swap_commands, client, logger)
+    run_command("sudo swapoff -a", client, logger)
+    apply_file_edits(files=[fstab_edit()], client=client, logger=logger)
 
 
-def install_containerd(client: SSHClient, logger: Logger) -> None:
-    execute_command(
-        "sudo apt-get install apt-transport-https ca-certificates curl jq -y",
-        client,
-        logger,
-    )
-    sleep(5)
-    preconf_cmds = [
-        "sudo install -m 0755 -d /etc/apt/keyrings",
-        "sudo curl -fsSL https://download.docker.com/linux/ubuntu/gpg -o /etc/apt/keyrings/docker.asc",
-        'echo deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.asc] https://download.docker.com/linux/ubuntu $(. /etc/os-release && echo "$VERSION_CODENAME") stable | sudo tee /etc/apt/sources.list.d/docker.list > /dev/null',
-        "cat /etc/apt/sources.list.d/docker.list",
-    ]
-    execute_commands(cmds=preconf_cmds, client=client, logger=logger)
+def install_containerd(
+    client: SSHClient, logger: Logger, apt_proxy: Optional[str] = None
+) -> None:
+    wait_for_apt(client=client, logger=logger)
+    run_command(CONTAINERD_REQUIREMENTS_CMD, client, logger)
+    execute_commands(cmds=DOCKER_REPO_CMDS, client=client, logger=logger)
+    if apt_proxy:
+        run_command(cached_repo_cmd(DOCKER_LIST), client, logger)
     update_upgrade_cmd(client=client, upgrade=False, logger=logger)
-    sleep(2)
-    execute_command(
-        "sudo apt-get install docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin -y",
-        client,
-        logger,
+    run_command(CONTAINERD_INSTALL_CMD, client, logger)
+    wait_until(
+        condition=CONTAINERD_ACTIVE,
+        client=client,
+        logger=logger,
+        description="containerd active",
     )
-    sleep(15)
 
 
 def configure_containerd(client: SSHClient, logger: Logger) -> None:
     """Configure containerd to use systemd as the cgroup driver."""
-    execute_command(
-        "sudo containerd config default | sudo tee /etc/containerd/config.toml",
-        client,
-        logger,
-    )
-    _modify_file(
-        client=client,
-        file_path="/etc/containerd/config.toml",
-        settings=["registry.k8s.io/pause:3.8", "SystemdCgroup = false"],
-        uncomment=False,
-    )
-    execute_command("sudo systemctl restart containerd", client, logger)
+    report = apply_file_edits(files=[containerd_edit()], client=client, logger=logger)
+    if report.restarts:
+        apply_restarts(report=report, client=client, logger=logger)
+        wait_until(
+            condition=CONTAINERD_ACTIVE,
+            client=client,
+            logger=logger,
+            description="containerd active",
+        )
+    run_command(CONTAINERD_STAMP_CMD, client, logger)
 
 
-def install_kube_pkgs(client: SSHClient, logger: Logger, kube_version: str) -> None:
-    preconf_cmds = [
-        f"sudo curl -fsSL https://pkgs.k8s.io/core:/stable:/v{kube_version}/deb/Release.key | sudo gpg --dearmor -o /etc/apt/keyrings/kubernetes-apt-keyring.gpg",
-        f"echo 'deb [signed-by=/etc/apt/keyrings/kubernetes-apt-keyring.gpg] https://pkgs.k8s.io/core:/stable:/v{kube_version}/deb/ /' | sudo tee /etc/apt/sources.list.d/kubernetes.list",
-        "cat /etc/apt/sources.list.d/kubernetes.list",
-    ]
-    execute_commands(cmds=preconf_cmds, client=client, logger=logger)
-    sleep(10)
+def install_kube_pkgs(
+    client: SSHClient,
+    logger: Logger,
+    kube_version: str,
+    apt_proxy: Optional[str] = None,
+    pull_images: bool = True,
+) -> None:
+    execute_commands(
+        cmds=kube_repo_cmds(kube_version=kube_version), client=client, logger=logger
+    )
+    if apt_proxy:
+        run_command(cached_repo_cmd(KUBE_LIST), client, logger)
     update_upgrade_cmd(client=client, upgrade=False, logger=logger)
-    sleep(2)
-    install_pull_cmd = [
-        "sudo apt-get install kubelet kubeadm kubectl -y",
-        "sudo kubeadm config images pull",
-    ]
-    execute_commands(cmds=install_pull_cmd, client=client, logger=logger)
-    sleep(15)
+    execute_commands(cmds=KUBE_INSTALL_CMDS, client=client, logger=logger)
+    if pull_images:
+        pull_kube_images(client=client, logger=logger)
+
+
+def pull_kube_images(client: SSHClient, logger: Logger) -> None:
+    run_command(KUBE_IMAGES_PULL_CMD, client, logger)
 
 
 def kubeadm_init(
     client: SSHClient, logger: Logger, complex_type: bool
 ) -> tuple[Optional[str], str]:
     """Initialize Kubernetes master node using kubeadm."""
-    _, stdout, _ = client.exec_command("sudo kubeadm init --config=kubeadm-config.yaml")
-    kubeadm_lines = stdout.readlines()
-    logger.info(f"kubeadm init output: {''.join(kubeadm_lines)}")
+    result = run_command(
+        "sudo kubeadm init --config=kubeadm-config.yaml", client=client, logger=logger
+    )
+    kubeadm_lines = result.output.splitlines(keepends=True)
 
     # Extract kubeadm join command for worker and master
     worker_join_cmd = (
@@ -135,7 +251,38 @@ def kubeadm_init(
     return master_join_cmd, worker_join_cmd
 
 
+def kubeadm_join_cmds(
+    client: SSHClient, logger: Logger, complex_type: bool
+) -> tuple[Optional[str], str]:
+    """Creates new join commands on an initialized master, the token of kubeadm init expires."""
+    result = run_command(
+        "sudo kubeadm token create --print-join-command", client=client, logger=logger
+    )
+    worker_join_cmd = f"sudo {result.output.strip()}"
+
+    # the certs are copied to the masters, before they join
+    master_join_cmd = f"{worker_join_cmd} --control-plane" if complex_type else None
+    return master_join_cmd, worker_join_cmd
+
+
+def kubeadm_reset(client: SSHClient, logger: Logger) -> None:
+    """Removes what a failed kubeadm init or join left behind, so it can run again."""
+    run_command("sudo kubeadm reset -f", client=client, logger=logger)
+
+
 def setup_calico(client: SSHClient, logger: Logger) -> None:
     """Install Calico networking plugin."""
-    execute_command("kubectl apply -f calico.yaml", client, logger)
-    sleep(30)
+    run_command("kubectl apply -f calico.yaml", client, logger)
+    run_command(CALICO_READY_CMD, client, logger)
+
+
+def generalize_vm(client: SSHClient, logger: Logger) -> None:
+    """Resets the machine identity and cloud-init, so every clone of the image boots as a new instance."""
+    generalize_cmds = [
+        "sudo apt-get clean",
+        "sudo cloud-init clean --logs --seed",
+        "sudo rm -f /etc/ssh/ssh_host_*",
+        "sudo truncate -s 0 /etc/machine-id",
+        "sudo rm -f /var/lib/dbus/machine-id",
+    ]
+    execute_commands(cmds=generalize_cmds, client=client, logger=logger)
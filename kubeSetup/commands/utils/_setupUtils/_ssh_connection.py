@@ -1,48 +1,234 @@
 import paramiko
+import logging
 import threading
-from typing import Optional, Any
+from time import sleep
+from contextlib import contextmanager
+from typing import Callable, Optional, Any, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from .._setup import SimpleVmConf, ComplexVmConf
+
+
+class _PooledClient(paramiko.SSHClient):
+    """
+    Client of the pool, which connects once again, if a channel can't be opened, e.g. as the vm
+    dropped the connection, before the transport noticed it. The client is connected in place,
+    so everyone holding it keeps working with it.
+    """
+
+    def __init__(self, reconnect: Callable[[paramiko.SSHClient], None]) -> None:
+        super().__init__()
+        self._reconnect = reconnect
+        self._reconnect_lock = threading.Lock()
+
+    def exec_command(
+        self, command: str, *args: Any, **kwargs: Any
+    ) -> tuple[Any, Any, Any]:
+        transport = self.get_transport()
+        try:
+            return super().exec_command(command, *args, **kwargs)
+        except paramiko.ChannelException:
+            # the server refused the channel, the transport is fine
+            raise
+        except (paramiko.SSHException, EOFError):
+            self._reconnect_once(transport=transport)
+        return super().exec_command(command, *args, **kwargs)
+
+    def open_sftp(self) -> paramiko.SFTPClient:
+        transport = self.get_transport()
+        try:
+            return super().open_sftp()
+        except paramiko.ChannelException:
+            raise
+        except (paramiko.SSHException, EOFError):
+            self._reconnect_once(transport=transport)
+        return super().open_sftp()
+
+    def _reconnect_once(self, transport: Optional[paramiko.Transport]) -> None:
+        with self._reconnect_lock:
+            # another thread already connected again
+            if self.get_transport() is not transport:
+                return
+            self.close()
+            self._reconnect(self)
 
 
 class SSHConnectionPool:
-    """SSH Connection Pool Manager, where the connections are managed, to avoid server issues"""
+    """
+    SSH Connection Pool Manager, where the connections are managed, to avoid server issues.
+    Every host has its own lock, so connecting to one host never blocks the others. Dead
+    transports, e.g. after a reboot, are reconnected transparently with the same credentials.
+    """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        keepalive: int = 30,
+        connect_timeout: float = 10,
+        connect_retries: int = 5,
+        max_channels: int = 8,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
         self.connections: dict[str, paramiko.SSHClient] = (
             {}
-        )  # Dictionary to hold connections by (host, port, username) tuple
+        )  # Dictionary to hold connections by their ip address
+        self.credentials: dict[str, tuple[Optional[str], Optional[str]]] = {}
+        self.sftp_clients: dict[str, tuple[Any, paramiko.SFTPClient]] = {}
+        self.keys: dict[str, paramiko.PKey] = {}
+        self.host_locks: dict[str, threading.Lock] = {}
+        self.channel_slots: dict[str, threading.BoundedSemaphore] = {}
+        # guards the dictionaries above, but is never held while connecting
         self.lock = threading.Lock()
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.connect_retries = max(1, connect_retries)
+        self.max_channels = max_channels
+        self.logger = logger or logging.getLogger(__name__)
 
-    @staticmethod
     def create_connection(
-        ip_address: str, user: Optional[str], ssh_key: Optional[str]
+        self, ip_address: str, user: Optional[str], ssh_key: Optional[str]
     ) -> paramiko.SSHClient:
-        """Creates a new SSH connection using Paramiko."""
-        # set up the client
-        client = paramiko.SSHClient()
+        """Creates a new SSH connection using Paramiko, retries while the host is not up yet."""
+        client = _PooledClient(
+            reconnect=lambda client: self._connect(
+                client=client, ip_address=ip_address, user=user, ssh_key=ssh_key
+            )
+        )
         client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        private_key = paramiko.RSAKey.from_private_key_file(ssh_key)  # type: ignore
-        client.connect(ip_address, 22, user, pkey=private_key)
+        self._connect(client=client, ip_address=ip_address, user=user, ssh_key=ssh_key)
         return client
 
+    def _connect(
+        self,
+        client: paramiko.SSHClient,
+        ip_address: str,
+        user: Optional[str],
+        ssh_key: Optional[str],
+    ) -> None:
+        private_key = self._private_key(ssh_key=ssh_key)  # type: ignore
+        for attempt in range(self.connect_retries):
+            try:
+                client.connect(
+                    ip_address,
+                    22,
+                    user,
+                    pkey=private_key,
+                    timeout=self.connect_timeout,
+                    banner_timeout=self.connect_timeout,
+                    auth_timeout=self.connect_timeout,
+                )
+            except (OSError, paramiko.SSHException) as err:
+                client.close()
+                if attempt == self.connect_retries - 1:
+                    raise
+                self.logger.warning(
+                    f"Connecting to {ip_address} failed ({err}), retry {attempt + 1}..."
+                )
+                sleep(2**attempt)
+                continue
+            # keepalives keep idle connections open, e.g. while waiting for other vms
+            transport = client.get_transport()
+            if transport is not None:
+                transport.set_keepalive(self.keepalive)
+            return
+        raise Exception(f"SSH connection to {ip_address} failed!")
+
     def get_connection(
         self, ip_address: str, user: Optional[str] = None, ssh_key: Optional[str] = None
     ) -> paramiko.SSHClient:
-        """Gets an existing connection or creates a new one if not available."""
-        with self.lock:
-            if ip_address not in self.connections:
-                if not user and not ssh_key:
-                    raise Exception(
-                        "SSH connection failed! USER and SSH KEY are required!"
-                    )
-                self.connections[ip_address] = self.create_connection(
-                    ip_address, user, ssh_key
+        """
+        Gets an existing connection or creates a new one if not available. A connection, whose
+        transport is not active anymore, is replaced by a new one.
+        """
+        with self._host_lock(ip_address=ip_address):
+            with self.lock:
+                client = self.connections.get(ip_address)
+                if user or ssh_key:
+                    self.credentials[ip_address] = (user, ssh_key)
+                credentials = self.credentials.get(ip_address)
+
+            if client is not None and self._is_active(client=client):
+                return client
+            if credentials is None:
+                raise Exception("SSH connection failed! USER and SSH KEY are required!")
+            if client is not None:
+                self.logger.info(
+                    f"The connection to {ip_address} is lost, reconnect..."
                 )
-            return self.connections[ip_address]
+                client.close()
+
+            client = self.create_connection(ip_address, *credentials)
+            with self.lock:
+                self.connections[ip_address] = client
+            return client
+
+    def warm_up(
+        self, vm_infos: list[SimpleVmConf | ComplexVmConf], max_workers: int = 32
+    ) -> dict[str, Exception]:
+        """
+        Connects to all vms in parallel, so the later steps find their connections ready.
+        Returns the errors by ip address, the failed hosts are connected again on first use.
+        """
+        if not vm_infos:
+            return {}
+
+        def connect(vm: SimpleVmConf | ComplexVmConf) -> Optional[Exception]:
+            try:
+                self.get_connection(
+                    ip_address=vm.ip_address, user=vm.user, ssh_key=vm.ssh_key
+                )
+            except Exception as err:
+                self.logger.warning(f"Connecting to {vm.ip_address} failed: {err}")
+                return err
+            return None
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(vm_infos))),
+            thread_name_prefix="ssh-warm-up",
+        ) as executor:
+            errors = dict(
+                zip((vm.ip_address for vm in vm_infos), executor.map(connect, vm_infos))
+            )
+        return {
+            ip_address: err for ip_address, err in errors.items() if err is not None
+        }
+
+    @contextmanager
+    def session(self, ip_address: str) -> Iterator[paramiko.SSHClient]:
+        """
+        Hands out the connection of the host for one concurrent channel. At most max_channels
+        callers of session hold the connection of a host at the same time, as sshd refuses more
+        sessions by default. The limit only covers the callers of session, channels opened via
+        get_connection or get_sftp do not take a slot.
+        """
+        with self.lock:
+            slots = self.channel_slots.setdefault(
+                ip_address, threading.BoundedSemaphore(self.max_channels)
+            )
+        with slots:
+            yield self.get_connection(ip_address=ip_address)
+
+    def get_sftp(
+        self, ip_address: str, user: Optional[str] = None, ssh_key: Optional[str] = None
+    ) -> paramiko.SFTPClient:
+        """Gets the pooled SFTP session of the host, which is reopened with its connection."""
+        client = self.get_connection(ip_address=ip_address, user=user, ssh_key=ssh_key)
+        with self._host_lock(ip_address=ip_address):
+            with self.lock:
+                pooled = self.sftp_clients.get(ip_address)
+            if pooled is not None and pooled[0] is client:
+                channel = pooled[1].get_channel()
+                if channel is not None and not channel.closed:
+                    return pooled[1]
+            sftp = client.open_sftp()
+            with self.lock:
+                self.sftp_clients[ip_address] = (client, sftp)
+            return sftp
 
     def close_connections(self, ip_addresses: list[str]) -> None:
         """Closes a specific connections and remove them from the pool."""
         with self.lock:
             for ip_address in ip_addresses:
+                if ip_address in self.sftp_clients:
+                    self.sftp_clients.pop(ip_address)[1].close()
                 if ip_address in self.connections:
                     self.connections[ip_address].close()
                     del self.connections[ip_address]
@@ -50,6 +236,25 @@ class SSHConnectionPool:
     def close_all_connections(self) -> None:
         """Closes all connections in the pool."""
         with self.lock:
+            for _, sftp in self.sftp_clients.values():
+                sftp.close()
+            self.sftp_clients.clear()
             for client in self.connections.values():
                 client.close()
             self.connections.clear()
+
+    def _host_lock(self, ip_address: str) -> threading.Lock:
+        with self.lock:
+            return self.host_locks.setdefault(ip_address, threading.Lock())
+
+    def _private_key(self, ssh_key: str) -> paramiko.PKey:
+        """Parses every key file only once."""
+        with self.lock:
+            if ssh_key not in self.keys:
+                self.keys[ssh_key] = paramiko.RSAKey.from_private_key_file(ssh_key)
+            return self.keys[ssh_key]
+
+    @staticmethod
+    def _is_active(client: Any) -> bool:
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
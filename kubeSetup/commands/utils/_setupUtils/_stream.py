@@ -0,0 +1,103 @@
+import codecs
+import select
+from logging import Logger
+from collections import deque
+from typing import Any, Callable, Optional
+from paramiko import SSHClient
+
+# lines of stdout and stderr, which are kept per command for the error reports
+TAIL_LINES = 200
+# bytes, which are read from the channel at once
+READ_SIZE = 32768
+# a line without line break, e.g. a progress bar, is cut at this length
+MAX_LINE = 65536
+
+STDOUT = "out"
+STDERR = "err"
+
+
+class _LineBuffer:
+    """Decodes the chunks of one stream incrementally and splits them into lines."""
+
+    def __init__(self) -> None:
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.partial = ""
+
+    def feed(self, data: bytes, final: bool = False) -> list[str]:
+        lines = (self.partial + self.decoder.decode(data, final=final)).splitlines(
+            keepends=True
+        )
+        self.partial = ""
+        if lines and not lines[-1].endswith(("\n", "\r")) and not final:
+            self.partial = lines.pop()
+            if len(self.partial) > MAX_LINE:
+                lines.append(self.partial)
+                self.partial = ""
+        return [line.rstrip("\r\n") for line in lines]
+
+
+def host_of(client: SSHClient) -> str:
+    """The address of the remote host, which prefixes every line of its output."""
+    transport = client.get_transport()
+    return transport.getpeername()[0] if transport is not None else "remote"
+
+
+def log_line(logger: Logger, host: str, stream: str, line: str) -> None:
+    logger.info(f"[{host} {stream}] {line}")
+
+
+def stream_command(
+    cmd: str,
+    client: SSHClient,
+    logger: Logger,
+    on_line: Optional[Callable[[str, str], None]] = None,
+    tail_lines: int = TAIL_LINES,
+) -> tuple[int, list[str], list[str]]:
+    """
+    Executes the command and hands every line of stdout and stderr to on_line, in the order
+    they arrive. By default the lines are logged with the host as prefix. Only the last
+    tail_lines of both streams are kept, so the memory does not grow with the output.
+    Returns the exit status and the tails of stdout and stderr.
+    """
+    host = host_of(client=client)
+    handle = on_line or (
+        lambda stream, line: log_line(
+            logger=logger, host=host, stream=stream, line=line
+        )
+    )
+
+    _, stdout, _ = client.exec_command(cmd)
+    channel = stdout.channel
+    tails: dict[str, deque[str]] = {
+        STDOUT: deque(maxlen=tail_lines),
+        STDERR: deque(maxlen=tail_lines),
+    }
+    buffers = {STDOUT: _LineBuffer(), STDERR: _LineBuffer()}
+    receivers: dict[str, tuple[Callable[[], bool], Callable[[int], Any]]] = {
+        STDOUT: (channel.recv_ready, channel.recv),
+        STDERR: (channel.recv_stderr_ready, channel.recv_stderr),
+    }
+
+    def emit(stream: str, lines: list[str]) -> None:
+        for line in lines:
+            tails[stream].append(line)
+            handle(stream, line)
+
+    while True:
+        received = False
+        for stream, (ready, recv) in receivers.items():
+            if ready():
+                emit(stream, buffers[stream].feed(recv(READ_SIZE)))
+                received = True
+        if received:
+            continue
+        # the exit status is sent after the output, so nothing is left once it is there
+        if channel.exit_status_ready():
+            if not any(ready() for ready, _ in receivers.values()):
+                break
+            continue
+        select.select([channel], [], [], 1.0)
+
+    for stream, buffer in buffers.items():
+        emit(stream, buffer.feed(b"", final=True))
+    return channel.recv_exit_status(), list(tails[STDOUT]), list(tails[STDERR])
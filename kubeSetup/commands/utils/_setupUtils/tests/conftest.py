@@ -0,0 +1,74 @@
+import io
+import os
+import subprocess
+import pytest
+
+
+class _LocalChannel:
+    """Hands out the output of a finished local command in small chunks."""
+
+    def __init__(self, run: subprocess.CompletedProcess) -> None:
+        self.stdout = io.BytesIO(run.stdout)
+        self.stderr = io.BytesIO(run.stderr)
+        self.exit_status = run.returncode
+
+    def recv_ready(self):
+        return self.stdout.tell() < len(self.stdout.getbuffer())
+
+    def recv(self, size):
+        return self.stdout.read(min(size, 7))
+
+    def recv_stderr_ready(self):
+        return self.stderr.tell() < len(self.stderr.getbuffer())
+
+    def recv_stderr(self, size):
+        return self.stderr.read(min(size, 7))
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+
+class _LocalFile(io.BytesIO):
+    def __init__(self, channel: _LocalChannel) -> None:
+        super().__init__(channel.stdout.getvalue())
+        self.channel = channel
+
+
+class _LocalTransport:
+    def getpeername(self):
+        return "127.0.0.1", 22
+
+
+class LocalClient:
+    """Runs the commands in a local shell instead of over ssh, optionally sudo is a no-op."""
+
+    def __init__(self, sudo_dir=None) -> None:
+        self.cmds: list[str] = []
+        self.env = None
+        if sudo_dir is not None:
+            sudo = sudo_dir / "sudo"
+            sudo.write_text('#!/bin/sh\nexec "$@"\n')
+            sudo.chmod(0o755)
+            self.env = {**os.environ, "PATH": f"{sudo_dir}:/usr/bin:/bin"}
+
+    def exec_command(self, cmd):
+        self.cmds.append(cmd)
+        run = subprocess.run(cmd, shell=True, capture_output=True, env=self.env)
+        channel = _LocalChannel(run)
+        return io.BytesIO(), _LocalFile(channel), _LocalFile(channel)
+
+    def get_transport(self):
+        return _LocalTransport()
+
+
+@pytest.fixture
+def local_client(tmp_path_factory):
+    """Builds clients, which run the commands in a local shell, with sudo=True sudo is a no-op."""
+
+    def build(sudo: bool = False) -> LocalClient:
+        return LocalClient(sudo_dir=tmp_path_factory.mktemp("bin") if sudo else None)
+
+    return build
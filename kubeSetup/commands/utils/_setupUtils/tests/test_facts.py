@@ -0,0 +1,132 @@
+import logging
+import pytest
+from kubeSetup.commands.utils import (
+    ExecutionPlan,
+    PreconfigureCluster,
+    SimpleVmConf,
+    VmType,
+)
+from kubeSetup.commands.utils._dryRun._fake_ssh import (
+    FakeSSHClient,
+    FakeSSHConnectionPool,
+)
+from kubeSetup.commands.utils._setupUtils._facts import (
+    FACT_MARKER,
+    parse_facts,
+    satisfied_steps,
+)
+
+logger = logging.getLogger("test")
+
+CHECKSUM = "a" * 64
+
+# facts of a vm, which is fully preconfigured for kubernetes 1.32
+CONVERGED = f"""{FACT_MARKER} packages
+nfs-common\t1:2.6.4-3ubuntu5\tii 
+sshpass\t1.09-1\tii 
+docker-ce\t5:27.3.1-1~ubuntu.24.04~noble\tii 
+containerd.io\t1.7.22-1\tii 
+kubelet\t1.32.0-1.1\tii 
+kubeadm\t1.32.0-1.1\tii 
+kubectl\t1.32.0-1.1\tii 
+{FACT_MARKER} sysctl
+net.ipv4.ip_forward = 1
+net.ipv6.conf.all.forwarding = 1
+{FACT_MARKER} sysctl_conf
+net.ipv4.ip_forward=1
+net.ipv6.conf.all.forwarding=1
+{FACT_MARKER} swap
+{FACT_MARKER} fstab_swap
+{FACT_MARKER} containerd_active
+active
+{FACT_MARKER} containerd_config
+{CHECKSUM}  /etc/containerd/config.toml
+{FACT_MARKER} containerd_configured
+{CHECKSUM}  /etc/containerd/config.toml
+{FACT_MARKER} apt_proxy
+{FACT_MARKER} docker_repo
+deb [arch=amd64 signed-by=/etc/apt/keyrings/docker.asc] https://download.docker.com/linux/ubuntu noble stable
+{FACT_MARKER} kube_repo
+deb [signed-by=/etc/apt/keyrings/kubernetes-apt-keyring.gpg] https://pkgs.k8s.io/core:/stable:/v1.32/deb/ /
+{FACT_MARKER} images
+registry.k8s.io/kube-apiserver:v1.32.0
+registry.k8s.io/pause:3.10
+{FACT_MARKER} kube_images
+registry.k8s.io/kube-apiserver:v1.32.0
+registry.k8s.io/pause:3.10
+"""
+
+ALL_STEPS = {
+    "apt_proxy",
+    "packages",
+    "sysctl",
+    "swap",
+    "containerd",
+    "containerd_config",
+    "kubernetes",
+    "images",
+}
+
+
+class _ConvergedClient(FakeSSHClient):
+    def _output(self, command):
+        if FACT_MARKER in command:
+            return CONVERGED
+        return super()._output(command=command)
+
+
+class _ConvergedPool(FakeSSHConnectionPool):
+    def create_connection(self, ip_address, user, ssh_key):
+        return _ConvergedClient(
+            plan=self.plan, ip_address=ip_address, user=user, vm=ip_address
+        )
+
+
+def test_a_converged_vm_satisfies_every_step():
+    facts = parse_facts(lines=CONVERGED.splitlines())
+    assert facts.packages["kubeadm"] == "1.32.0-1.1"
+    assert satisfied_steps(facts=facts, kube_version="1.32") == ALL_STEPS
+
+
+def test_only_the_drifted_steps_are_not_satisfied():
+    facts = parse_facts(lines=CONVERGED.splitlines())
+    facts.sysctl["net.ipv4.ip_forward"] = "0"
+    facts.containerd_config = "b" * 64
+    facts.images = []
+    # another kubernetes version and an apt cache need other repos
+    assert satisfied_steps(facts=facts, kube_version="1.32") == ALL_STEPS - {
+        "sysctl",
+        "containerd_config",
+        "images",
+    }
+    assert satisfied_steps(
+        facts=facts, kube_version="1.33", apt_proxy="http://10.0.0.5:3142"
+    ) == {"packages", "swap"}
+
+
+@pytest.mark.parametrize("bundle_scripts", [False, True])
+def test_a_converged_vm_only_gathers_its_facts(bundle_scripts):
+    vm = SimpleVmConf(
+        vm_name="vm-101",
+        vm_type=VmType.WORKER,
+        target_name="pve",
+        vm_id=101,
+        tags="kubernetes",
+        clone_type=1,
+        ip_address="10.10.10.11",
+        ip_gw="10.10.10.1",
+        user="tom",
+        ssh_key="/not/needed",
+        pw="secret",
+    )
+    plan = ExecutionPlan(logger=logger)
+    with plan.phase("preconfigure"):
+        PreconfigureCluster(
+            vm_infos=[vm],
+            logger=logger,
+            kube_version="1.32",
+            bundle_scripts=bundle_scripts,
+        ).preconfigure_vms(ssh_pool_manager=_ConvergedPool(plan=plan, hosts={}))
+
+    entries = plan.phases[0].entries
+    assert len(entries) == 1 and FACT_MARKER in entries[0].action
@@ -0,0 +1,108 @@
+import logging
+from kubeSetup.commands.utils._setupUtils._file_edit import (
+    apply_file_edits,
+    file_edit_cmd,
+    render_edits,
+)
+from kubeSetup.commands.utils._setupUtils._setup_utils import (
+    containerd_edit,
+    sysctl_edit,
+)
+from kubeSetup.commands.utils._setupUtils._schemas import FileEdit, LineEdit
+
+logger = logging.getLogger("test")
+
+SYSCTL = "# comment\n#net.ipv4.ip_forward=1\n#net.ipv6.conf.all.forwarding=1\n"
+
+CONTAINERD = (
+    '[plugins."io.containerd.grpc.v1.cri"]\n'
+    '  sandbox_image = "registry.k8s.io/pause:3.8"\n'
+    "    SystemdCgroup = false\n"
+)
+
+
+def test_key_edits_uncomment_and_keep_the_indentation():
+    assert render_edits(SYSCTL, sysctl_edit().edits) == (
+        "# comment\nnet.ipv4.ip_forward=1\nnet.ipv6.conf.all.forwarding=1\n"
+    )
+    assert render_edits(CONTAINERD, containerd_edit().edits) == (
+        '[plugins."io.containerd.grpc.v1.cri"]\n'
+        '  sandbox_image = "registry.k8s.io/pause:3.9"\n'
+        "    SystemdCgroup = true\n"
+    )
+
+
+def test_edits_are_idempotent():
+    for content, edit in ((SYSCTL, sysctl_edit()), (CONTAINERD, containerd_edit())):
+        once = render_edits(content, edit.edits)
+        assert render_edits(once, edit.edits) == once
+
+
+def test_line_edits_drop_or_append_lines():
+    fstab = "UUID=1 / ext4 defaults 0 1\n/swap.img none swap sw 0 0\n"
+    assert render_edits(fstab, [LineEdit(pattern="swap")]) == (
+        "UUID=1 / ext4 defaults 0 1\n"
+    )
+    assert render_edits("", [LineEdit(pattern="^a", line="a", append=True)]) == "a\n"
+
+
+def test_only_changed_files_are_written_and_restarted(tmp_path, local_client):
+    sysctl, fstab = tmp_path / "sysctl.conf", tmp_path / "fstab"
+    sysctl.write_text(SYSCTL)
+    fstab.write_text("UUID=1 / ext4 defaults 0 1\n")
+    files = [
+        FileEdit(path=str(sysctl), edits=sysctl_edit().edits, restart="sudo sysctl -p"),
+        FileEdit(path=str(fstab), edits=[LineEdit(pattern="swap")]),
+    ]
+    client = local_client(sudo=True)
+
+    report = apply_file_edits(files=files, client=client, logger=logger)
+    assert report.changed == [str(sysctl)]
+    assert report.restarts == ["sudo sysctl -p"]
+    assert "net.ipv4.ip_forward=1\n" in sysctl.read_text()
+    assert len(client.cmds) == 2
+
+    # nothing changes anymore, so the files are only read
+    report = apply_file_edits(files=files, client=client, logger=logger)
+    assert (report.changed, report.restarts) == ([], [])
+    assert len(client.cmds) == 3
+
+
+def _run_edit_cmd(client, file):
+    _, stdout, _ = client.exec_command(file_edit_cmd(file))
+    return stdout.channel.recv_exit_status(), stdout.read().decode()
+
+
+def test_the_edit_cmd_renders_like_the_edits(tmp_path, local_client):
+    client = local_client(sudo=True)
+    fstab = "UUID=1 / ext4 defaults 0 1\n/swap.img none swap sw 0 0\n"
+    for content, edit in (
+        ("# comment\n#net.ipv4.ip_forward=1\n", sysctl_edit()),
+        (fstab, FileEdit(path="", edits=[LineEdit(pattern="swap")])),
+        ("", FileEdit(path="", edits=[LineEdit(pattern="^a", line="a", append=True)])),
+    ):
+        target = tmp_path / "file"
+        target.write_text(content)
+        exit_status, _ = _run_edit_cmd(
+            client, FileEdit(path=str(target), edits=edit.edits)
+        )
+        assert exit_status == 0
+        assert target.read_text() == render_edits(content, edit.edits)
+
+
+def test_the_edit_cmd_edits_the_template(tmp_path, local_client):
+    client = local_client(sudo=True)
+    config = tmp_path / "containerd" / "config.toml"
+    file = containerd_edit()
+    file.path = str(config)
+    file.template_cmd = f"printf {CONTAINERD!r}"
+    file.restart = "echo restarted"
+
+    _, output = _run_edit_cmd(client, file)
+    assert config.read_text() == render_edits(CONTAINERD, file.edits)
+    assert "restarted" in output
+
+    # an unchanged file is neither written nor restarted
+    exit_status, output = _run_edit_cmd(client, file)
+    assert (exit_status, "restarted" in output) == (0, False)
+    assert "is up to date" in output
@@ -0,0 +1,67 @@
+import logging
+import pytest
+from kubeSetup.commands.utils._setupUtils import _general_commands
+from kubeSetup.commands.utils._setupUtils._general_commands import (
+    run_command,
+    wait_until,
+)
+from kubeSetup.commands.utils._setupUtils._stream import stream_command
+
+logger = logging.getLogger("test")
+
+
+def test_failed_command_raises_with_its_exit_status(local_client):
+    with pytest.raises(Exception, match="exit status 3: broken"):
+        run_command("echo broken >&2; exit 3", client=local_client(), logger=logger)
+
+
+def test_unchecked_command_returns_its_result(local_client):
+    result = run_command("echo out; exit 3", local_client(), logger, check=False)
+    assert (result.ok, result.exit_status, result.output) == (False, 3, "out\n")
+
+
+def test_wait_until_polls_the_condition(tmp_path, monkeypatch, local_client):
+    monkeypatch.setattr(_general_commands, "sleep", lambda _: None)
+    client = local_client()
+    counter = tmp_path / "polls"
+    wait_until(
+        condition=f"echo x >> {counter}; [ $(wc -l < {counter}) -ge 3 ]",
+        client=client,
+        logger=logger,
+        description="third poll",
+    )
+    assert len(client.cmds) == 3
+
+
+def test_wait_until_times_out(monkeypatch, local_client):
+    monkeypatch.setattr(_general_commands, "sleep", lambda _: None)
+    with pytest.raises(TimeoutError):
+        wait_until(
+            condition="false",
+            client=local_client(),
+            logger=logger,
+            description="never",
+            timeout=0,
+        )
+
+
+def test_stream_keeps_only_the_tail_of_the_output(local_client):
+    lines = []
+    exit_status, stdout_tail, stderr_tail = stream_command(
+        cmd="seq 1 1000; echo oops >&2; printf 'no newline'",
+        client=local_client(),
+        logger=logger,
+        on_line=lambda stream, line: lines.append((stream, line)),
+        tail_lines=3,
+    )
+    assert exit_status == 0
+    assert stdout_tail == ["999", "1000", "no newline"]
+    assert stderr_tail == ["oops"]
+    assert lines[:2] == [("out", "1"), ("out", "2")]
+    assert len(lines) == 1002
+
+
+def test_stream_prefixes_the_lines_with_the_host(caplog, local_client):
+    with caplog.at_level(logging.INFO):
+        run_command("echo hello", client=local_client(), logger=logger)
+    assert "[127.0.0.1 out] hello" in caplog.text
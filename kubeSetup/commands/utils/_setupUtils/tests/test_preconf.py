@@ -0,0 +1,110 @@
+import logging
+import pytest
+from kubeSetup.commands.utils import (
+    BuildPhase,
+    BuildState,
+    DryRun,
+    ExecutionPlan,
+    PreconfigureCluster,
+    ProxmoxConnection,
+    SimpleVmConf,
+    VmType,
+)
+from kubeSetup.commands.utils._dryRun._fake_ssh import FakeSSHConnectionPool
+
+logger = logging.getLogger("test")
+
+
+class _UnreachablePool(FakeSSHConnectionPool):
+    def create_connection(self, ip_address, user, ssh_key):
+        if ip_address == "10.10.10.13":
+            raise TimeoutError("timed out")
+        return super().create_connection(ip_address, user, ssh_key)
+
+
+def _vm(vm_id, ip_address):
+    return SimpleVmConf(
+        vm_name=f"vm-{vm_id}",
+        vm_type=VmType.WORKER,
+        target_name="pve",
+        vm_id=vm_id,
+        tags="kubernetes",
+        clone_type=1,
+        ip_address=ip_address,
+        ip_gw="10.10.10.1",
+        user="tom",
+        ssh_key="/not/needed",
+        pw="secret",
+    )
+
+
+def _dry_run(vms):
+    plan = ExecutionPlan(logger=logger)
+    dry = DryRun(
+        proxmox_conf=ProxmoxConnection(
+            proxmox_user="root@pam",
+            url="pve.local",
+            token_name="kube",
+            token="secret",
+            ssl_verify=False,
+            template_id=900,
+        ),
+        vm_infos=vms,
+        plan=plan,
+    )
+    return plan, dry
+
+
+def test_failures_are_reported_per_vm_after_all_are_done():
+    vms = [_vm(101, "10.10.10.11"), _vm(102, "10.10.10.12"), _vm(103, "10.10.10.13")]
+    plan, dry = _dry_run(vms)
+    preconf = PreconfigureCluster(
+        vm_infos=vms, logger=logger, kube_version="1.32", max_parallel=2
+    )
+
+    with dry.simulate(), pytest.raises(Exception) as err:
+        preconf.preconfigure_vms(ssh_pool_manager=_UnreachablePool(plan=plan, hosts={}))
+
+    assert "vm-103 (10.10.10.13): timed out" in str(err.value)
+    configured = {entry.target for phase in plan.phases for entry in phase.entries}
+    assert {"10.10.10.11", "10.10.10.12"} <= configured
+
+
+def test_the_apt_cache_is_ready_before_the_vms_fetch_packages():
+    vms = [_vm(101, "10.10.10.11"), _vm(102, "10.10.10.12")]
+    plan, dry = _dry_run(vms)
+    preconf = PreconfigureCluster(
+        vm_infos=vms,
+        logger=logger,
+        kube_version="1.32",
+        bundle_scripts=True,
+        apt_cache="vm-101",
+    )
+
+    with dry.simulate():
+        preconf.preconfigure_vms(ssh_pool_manager=dry.ssh_pool())
+
+    actions = [entry.action for phase in plan.phases for entry in phase.entries]
+    cache_ready = actions.index("systemctl is-active --quiet apt-cacher-ng")
+    proxies = [
+        index for index, action in enumerate(actions) if "10.10.10.11:3142" in action
+    ]
+    assert len(proxies) == 2 and min(proxies) > cache_ready
+    assert any("http://HTTPS///" in action for action in actions)
+
+
+def test_a_vm_is_preconfigured_once_cloud_init_wrote_its_marker():
+    vm = _vm(101, "10.10.10.11")
+    state = BuildState(logger=logger)
+    preconf = PreconfigureCluster(
+        vm_infos=[vm], logger=logger, kube_version="1.32", state=state
+    )
+    plan = ExecutionPlan(logger=logger)
+    with plan.phase("preconfigure"):
+        preconf.wait_for_cloud_init_vm(
+            vm=vm, ssh_pool_manager=FakeSSHConnectionPool(plan=plan, hosts={})
+        )
+
+    actions = [entry.action for entry in plan.phases[0].entries]
+    assert actions.index("cloud-init status --wait") < len(actions) - 1
+    assert state.is_done(vm=vm, phase=BuildPhase.PRECONFIGURE)
@@ -0,0 +1,53 @@
+import logging
+import pytest
+from kubeSetup.commands.utils._setupUtils._script import (
+    compile_script,
+    run_script,
+    script_steps,
+)
+
+logger = logging.getLogger("test")
+
+
+def _cmds(tmp_path):
+    return [
+        "echo hi; echo err >&2",
+        "printf 'no newline'",
+        "false",
+        f"touch {tmp_path / 'after-failure'}",
+    ]
+
+
+def test_script_reports_every_step(tmp_path, local_client):
+    results = run_script(
+        name="test", cmds=_cmds(tmp_path)[:2], client=local_client(), logger=logger
+    )
+
+    assert [result.exit_status for result in results] == [0, 0]
+    assert results[0].output == "hi\nerr"
+    assert results[1].output == "no newline"
+    assert all(result.duration >= 0 for result in results)
+
+
+def test_script_stops_at_the_failure(tmp_path, local_client):
+    client = local_client()
+    with pytest.raises(Exception, match="test failed at 'false' with exit status 1"):
+        run_script(name="test", cmds=_cmds(tmp_path), client=client, logger=logger)
+    assert not (tmp_path / "after-failure").exists()
+    assert len(client.cmds) == 1
+
+
+def test_script_can_continue_after_a_failure(tmp_path, local_client):
+    with pytest.raises(Exception, match="failed at 'false'"):
+        run_script(
+            name="test",
+            cmds=_cmds(tmp_path),
+            client=local_client(),
+            logger=logger,
+            stop_on_error=False,
+        )
+    assert (tmp_path / "after-failure").exists()
+
+
+def test_steps_can_be_read_back_from_the_script(tmp_path):
+    assert script_steps(compile_script(cmds=_cmds(tmp_path))) == _cmds(tmp_path)
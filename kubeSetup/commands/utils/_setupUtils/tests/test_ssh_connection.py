@@ -0,0 +1,128 @@
+import threading
+import paramiko
+import pytest
+from kubeSetup.commands.utils._setupUtils import SSHConnectionPool
+from kubeSetup.commands.utils._setupUtils._ssh_connection import _PooledClient
+
+
+class _Transport:
+    def __init__(self) -> None:
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class _Channel:
+    closed = False
+
+
+class _SFTP:
+    def get_channel(self):
+        return _Channel()
+
+    def close(self):
+        pass
+
+
+class _Client:
+    def __init__(self) -> None:
+        self.transport = _Transport()
+
+    def get_transport(self):
+        return self.transport
+
+    def open_sftp(self):
+        return _SFTP()
+
+    def close(self):
+        self.transport.active = False
+
+
+class _Pool(SSHConnectionPool):
+    def __init__(self, blocked=None) -> None:
+        super().__init__()
+        self.connects: list[str] = []
+        self.blocked = blocked or {}
+
+    def create_connection(self, ip_address, user, ssh_key):
+        if ip_address in self.blocked:
+            self.blocked[ip_address].wait(timeout=5)
+        self.connects.append(ip_address)
+        return _Client()
+
+
+def test_lost_connections_are_reconnected():
+    pool = _Pool()
+    client = pool.get_connection("10.0.0.1", user="u", ssh_key="key")
+    assert pool.get_connection("10.0.0.1") is client
+
+    # e.g. the vm was rebooted
+    client.transport.active = False
+    assert pool.get_connection("10.0.0.1") is not client
+    assert pool.connects == ["10.0.0.1", "10.0.0.1"]
+
+
+def test_a_slow_host_does_not_block_the_others():
+    release = threading.Event()
+    pool = _Pool(blocked={"10.0.0.1": release})
+    slow = threading.Thread(
+        target=pool.get_connection, args=("10.0.0.1", "u", "key"), daemon=True
+    )
+    slow.start()
+
+    pool.get_connection("10.0.0.2", user="u", ssh_key="key")
+    assert pool.connects == ["10.0.0.2"]
+    release.set()
+    slow.join()
+
+
+def test_sftp_sessions_are_pooled_per_connection():
+    pool = _Pool()
+    sftp = pool.get_sftp("10.0.0.1", user="u", ssh_key="key")
+    assert pool.get_sftp("10.0.0.1") is sftp
+
+    pool.connections["10.0.0.1"].close()
+    assert pool.get_sftp("10.0.0.1") is not sftp
+
+
+def test_keys_are_parsed_once(monkeypatch):
+    loads = []
+    monkeypatch.setattr(
+        paramiko.RSAKey, "from_private_key_file", lambda path: loads.append(path)
+    )
+    pool = SSHConnectionPool()
+    pool._private_key(ssh_key="key")
+    pool._private_key(ssh_key="key")
+    assert loads == ["key"]
+
+
+def test_a_failed_channel_open_reconnects_once(monkeypatch):
+    opened = []
+
+    def exec_command(client, command):
+        opened.append(command)
+        if len(opened) == 1:
+            raise EOFError()
+        return None, command, None
+
+    monkeypatch.setattr(paramiko.SSHClient, "exec_command", exec_command)
+    reconnects = []
+    client = _PooledClient(reconnect=reconnects.append)
+
+    assert client.exec_command("uptime")[1] == "uptime"
+    assert reconnects == [client]
+    assert opened == ["uptime", "uptime"]
+
+
+def test_a_refused_channel_does_not_reconnect(monkeypatch):
+    def exec_command(client, command):
+        raise paramiko.ChannelException(1, "administratively prohibited")
+
+    monkeypatch.setattr(paramiko.SSHClient, "exec_command", exec_command)
+    reconnects = []
+    client = _PooledClient(reconnect=reconnects.append)
+
+    with pytest.raises(paramiko.ChannelException):
+        client.exec_command("uptime")
+    assert reconnects == []